@@ -8,27 +8,96 @@ PyLogBeat is a simple, incomplete implementation of the Beats protocol
 used by Elastic Beats and Logstash.
 """
 
+# the library is distributed as this single module (see `py_modules` in setup.py),
+# so unlike the tests it is exempt from pylint's module size limit
+# pylint: disable=too-many-lines
+
+from bisect import bisect_left
+from collections import deque, namedtuple
 from collections.abc import Mapping, Sequence, Set
+from concurrent.futures import Future
 from datetime import datetime
-from struct import pack, unpack
+from functools import partial
+from itertools import islice
+from struct import Struct
+import asyncio
+import copy
+import errno
 import json
 import logging
+import mmap
+import os
+import queue
+import random
+import selectors
 import socket
 import ssl
 import sys
+import threading
+import time
 import zlib
 
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
 __version__ = '2.1.0'
 
 FRAME_TYPE_ACK = 0x41               # 'A'
 FRAME_TYPE_COMPRESSED_FRAME = 0x43  # 'C'
 FRAME_TYPE_JSON_FRAME = 0x4A        # 'J'
 FRAME_TYPE_WINDOW_SIZE = 0x57       # 'W'
+COMPRESSION_LEVEL_DEFAULT = zlib.Z_DEFAULT_COMPRESSION
+COMPRESSION_THRESHOLD_DEFAULT = 1024  # bytes of JSON frames, smaller windows are not compressed
 PAYLOAD_CHARSET = 'utf-8'           # encoding used for the payload / input message
 PROTOCOL_VERSION = 0x32             # version = 2
-SEQUENCE_MAX = 0x3FFFFFFFFFFFFFFF   #
+SEQUENCE_MAX = 0xFFFFFFFF           # sequence numbers are 32 bit, 0 is skipped on wrap
 TIMEOUT = 60
+WINDOW_SIZE_INITIAL = 10            # like Filebeat, start small and grow on fast ACKs
+WINDOW_SIZE_MAX = 2048
+WINDOW_SLOW_ACK_THRESHOLD = 5       # seconds, slower ACKs shrink the window size
+# upper bounds in seconds of the histogram buckets, like the Prometheus client defaults
+METRICS_HISTOGRAM_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0)
+SERIALIZER_JSON = 'json'
+SERIALIZER_MSGSPEC = 'msgspec'
+SERIALIZER_ORJSON = 'orjson'
+SPOOL_SEGMENT_SIZE = 64 * 1024 * 1024
+POOL_STRATEGY_ROUND_ROBIN = 'round_robin'
+POOL_STRATEGY_LEAST_PENDING = 'least_pending'
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_REJECT = 'reject'
+ECS_VERSION = '8.11.0'
+
+_JSON_FRAME_HEADER = Struct('>BBII')  # version, frame type, sequence, payload length
+_JSON_FRAME_HEADER_PLACEHOLDER = bytes(_JSON_FRAME_HEADER.size)
+_FRAME_HEADER = Struct('>BBI')  # version, frame type, window size or payload length
+_FRAME_HEADER_PLACEHOLDER = bytes(_FRAME_HEADER.size)
+_COMPRESSION_CHUNK_SIZE = 64 * 1024  # feed the compressor in chunks of encoded frames
+_TLS_RECORD_SIZE = 16 * 1024  # maximum plaintext size of a TLS record
+_ACK_READER_BUFFER_SIZE = 4096
+_FRAME_TYPE_HEADER = Struct('>BB')  # version, frame type
+_JSON_SEPARATOR = ord(',')
+_SERVER_READ_SIZE = 64 * 1024
+_SPOOL_RECORD_HEADER = Struct('>I')  # payload length
+_SPOOL_STATE = Struct('>QQ')  # segment and offset of the first not acknowledged record
+_SPOOL_STATE_FILENAME = 'spool.state'
+_SPOOL_SEGMENT_SUFFIX = '.segment'
+_DEFAULT_FORMATTER = logging.Formatter()
+# attributes of every LogRecord, all others have been passed as "extra"
+_LOG_RECORD_ATTRIBUTES = frozenset(
+    (*vars(logging.LogRecord('', 0, '', 0, '', (), None)), 'asctime', 'message'))
 
 LOGGER = logging.getLogger('pylogbeat')
 LOGGER.setLevel(logging.WARNING)   # disable log messages by default
@@ -38,234 +107,2986 @@ class ConnectionException(Exception):
     pass
 
 
-class PyLogBeatClient(object):  # pylint: disable=bad-option-value,useless-object-inheritance
+class BudgetExceededException(Exception):
+    pass
 
-    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
-            self,
-            host,
-            port,
-            timeout=None,
-            ssl_enable=False,
-            ssl_verify=True,
-            ssl_verify_flags=None,
-            keyfile=None,
-            certfile=None,
-            ca_certs=None,
-            use_logging=False):
-        self._host = host
-        self._port = port
-        self._timeout = timeout
-        self._ssl_enable = ssl_enable
-        self._ssl_verify = ssl_verify
-        self._ssl_verify_flags = ssl_verify_flags
-        self._keyfile = keyfile
-        self._certfile = certfile
-        self._ca_certs = ca_certs
-        self._socket = None
-        self._window_size = 0
-        self._sequence = 0
-        self._last_ack = 0
-        self._use_logging = use_logging
 
-    def _log(self, level, format_, *args, **kwargs):
-        if self._use_logging:
-            LOGGER.log(level, format_, *args, **kwargs)
-        elif level >= logging.WARNING:  # print warnings to stderr
-            message = format_.format(*args, **kwargs)
-            message_format = f'{datetime.now()} {logging.getLevelName(level)} {message}'
-            print(message_format, *args, file=sys.stderr, **kwargs)
+class SpoolFullException(Exception):
+    pass
 
-    def __enter__(self):
-        self.connect()
-        return self
 
-    def __exit__(self, type_, value, traceback):
-        self.close()
+class SendTotals(namedtuple('SendTotals', ('events', 'windows', 'bytes'))):
+    """Number of events, windows and bytes sent by `send_iter()`"""
 
-    def connect(self):
-        if self._socket is not None:
-            return  # already connected
+    __slots__ = ()
 
-        self._create_and_connect_socket()
 
-        if self._ssl_enable:
-            self._setup_ssl_socket()
+def factor_serializer(default=None, library=None):
+    """
+    Return a function serializing a mapping to JSON bytes
 
-    def _create_and_connect_socket(self):
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if self._timeout is not None:
-            self._socket.settimeout(self._timeout)
-        self._socket.connect((self._host, self._port))
+    By default, the fastest installed library is used: orjson, msgspec or the standard
+    library's json module. `default` is called for objects the library cannot serialize
+    and, except for msgspec, for datetime objects. msgspec encodes them natively and is
+    therefore not chosen automatically if `default` is given.
+    """
+    if library is None:
+        if orjson is not None:
+            library = SERIALIZER_ORJSON
+        elif msgspec is not None and default is None:
+            library = SERIALIZER_MSGSPEC
+        else:
+            library = SERIALIZER_JSON
 
-    def _setup_ssl_socket(self):
-        if self._ssl_verify:
-            cert_reqs = ssl.CERT_REQUIRED
-        elif self._ca_certs:
-            cert_reqs = ssl.CERT_OPTIONAL
+    # serializers are partial objects to be picklable for process pool executors
+    if library == SERIALIZER_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS  # pylint: disable=no-member
+        if default is not None:
+            # like json, let default format datetime objects instead of using RFC 3339
+            option |= orjson.OPT_PASSTHROUGH_DATETIME  # pylint: disable=no-member
+        return partial(_serialize_orjson, default=default, option=option)
+
+    if library == SERIALIZER_MSGSPEC:
+        return partial(_serialize_msgspec, default=default)
+
+    if library == SERIALIZER_JSON:
+        return partial(_serialize_json, default=default)
+
+    raise ValueError(f'Unknown serializer "{library}"')
+
+
+def _serialize_orjson(element, default=None, option=None):
+    # orjson matches keyword names by identity which unpickled partial objects don't keep
+    # pylint: disable-next=no-member
+    return orjson.dumps(element, default=default, option=option)
+
+
+def _serialize_msgspec(element, default=None):
+    return msgspec.json.encode(element, enc_hook=default)
+
+
+def _serialize_json(element, default=None):
+    return json.dumps(element, default=default).encode(PAYLOAD_CHARSET)
+
+
+def factor_deserializer(library=None):
+    """
+    Return a function deserializing JSON from a bytes-like object
+
+    Like for `factor_serializer()`, the fastest installed library is used by default.
+    """
+    if library is None:
+        if orjson is not None:
+            library = SERIALIZER_ORJSON
+        elif msgspec is not None:
+            library = SERIALIZER_MSGSPEC
         else:
-            cert_reqs = ssl.CERT_NONE
+            library = SERIALIZER_JSON
 
-        ssl_context = ssl.create_default_context(cafile=self._ca_certs)
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = cert_reqs
-        if self._ssl_verify_flags is not None:
-            ssl_context.verify_flags = self._ssl_verify_flags
-        if self._certfile and self._keyfile:
-            ssl_context.load_cert_chain(self._certfile, self._keyfile)
-        self._socket = ssl_context.wrap_socket(self._socket, server_side=False)
+    if library == SERIALIZER_ORJSON:
+        return orjson.loads  # pylint: disable=no-member
 
-    def close(self):
-        if self._socket is None:
-            return  # nothing to do
+    if library == SERIALIZER_MSGSPEC:
+        return msgspec.json.Decoder().decode
 
-        try:
-            self._socket.shutdown(socket.SHUT_WR)
-        except Exception as exc:
-            self._log(logging.ERROR, f'Error on shutting down the transport socket: {exc}')
+    if library == SERIALIZER_JSON:
+        return _deserialize_json
 
-        try:
-            self._socket.close()
-        except OSError as exc:
-            self._log(logging.ERROR, f'Error closing socket: {exc}', exc_info=True)
-        finally:
-            self._socket = None
+    raise ValueError(f'Unknown serializer "{library}"')
 
-    def send(self, elements):
-        self._validate_elements_sequence(elements)
 
-        self.connect()  # lazy init
+def _deserialize_json(data):
+    # json.loads() does not accept memoryviews
+    return json.loads(bytes(data))
 
-        self._reinit_last_ack()
 
-        self._window_size = self._factor_window_size(elements)
-        payload = self._factor_payload(elements)
-        compressed_payload = self._compress_payload(payload)
+def factor_ssl_context(
+        ssl_verify=True, ssl_verify_flags=None, keyfile=None, certfile=None, ca_certs=None):
+    """
+    Create a client SSL context like the clients do for their `ssl_*` arguments
 
-        self._send_window_size()
-        self._send_payload(compressed_payload)
+    Building a context loads the CA bundle and the certificate chain, so create it once
+    and pass it to all clients connecting to the same servers with `ssl_context`.
+    """
+    if ssl_verify:
+        cert_reqs = ssl.CERT_REQUIRED
+    elif ca_certs:
+        cert_reqs = ssl.CERT_OPTIONAL
+    else:
+        cert_reqs = ssl.CERT_NONE
 
-        while not self._expected_ack_received():
-            self._read_ack()
+    ssl_context = ssl.create_default_context(cafile=ca_certs)
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = cert_reqs
+    if ssl_verify_flags is not None:
+        ssl_context.verify_flags = ssl_verify_flags
+    if certfile and keyfile:
+        ssl_context.load_cert_chain(certfile, keyfile)
+    return ssl_context
 
-    def _validate_elements_sequence(self, elements):
-        # exclude strings to not detect them below as sequence
-        valid_string_types = (str, bytes)
-        if isinstance(elements, valid_string_types):
-            raise TypeError(f'Passed value has type "{type(elements)}" but a sequence is expected')
 
-        sequence_types = (Sequence, Set)
-        if not isinstance(elements, sequence_types):
-            raise TypeError(f'Passed value has type "{type(elements)}" but a sequence is expected')
+class EventTemplate:
+    """
+    Static fields shared by many events, serialized only once
 
-        if not elements:
-            return  # an empty sequence doesn't make much sense but is ok
+    `event()` returns an event which can be passed to `send()` like a dict. When it is
+    encoded, only its dynamic fields are serialized and appended to the pre-encoded
+    static fields. The dynamic fields must not repeat the names of static fields.
+    Pass the client's `serializer` to encode the static fields like all others.
+    """
 
-        # check the elements to be a dict or string
-        for element in elements:
-            if isinstance(element, valid_string_types):
-                continue
-            if isinstance(element, Mapping):
-                continue
+    __slots__ = ('static_fields', 'encoded', 'prefix')
 
-            element_index = elements.index(element)
-            raise TypeError(
-                f'Element {element_index} has type "{type(element)}" but a mapping, '
-                'bytes or string object is expected')
+    def __init__(self, static_fields, serializer):
+        self.static_fields = dict(static_fields)
+        self.encoded = bytes(serializer(self.static_fields)).strip()
+        if not self.encoded.endswith(b'}'):
+            raise ValueError('The serializer must encode mappings as JSON objects')
+        # '{"a": 1}' becomes '{"a": 1' to be followed by the dynamic fields with ',' for '{'
+        self.prefix = self.encoded[:-1] if self.static_fields else b''
 
-    def _reinit_last_ack(self):
-        self._last_ack = 0
+    def event(self, fields):
+        if not isinstance(fields, Mapping):
+            raise TypeError(f'Fields have type "{type(fields)}" but a mapping is expected')
+        return TemplateEvent(self, fields)
 
-    def _factor_window_size(self, elements):
-        return len(elements)
 
-    def _factor_payload(self, elements):
-        payload_elements = []
+class TemplateEvent(namedtuple('TemplateEvent', ('template', 'fields'))):
+    __slots__ = ()
+
+    def encode(self, serializer):
+        if not self.fields:
+            return self.template.encoded
+        encoded = bytearray(self.template.prefix)
+        offset = len(encoded)
+        encoded += serializer(self.fields)
+        if offset:
+            encoded[offset] = _JSON_SEPARATOR
+        return encoded
+
+
+def _encode_element(element, serializer):  # pylint: disable=too-many-return-statements
+    # exact type checks first, the ABC checks are only needed for subclasses and other types
+    element_type = type(element)
+    if element_type is dict:
+        return serializer(element)
+    if element_type is str:
+        return element.encode(PAYLOAD_CHARSET)
+    if element_type is bytes:
+        return element
+    if element_type is TemplateEvent:
+        return element.encode(serializer)
+    if isinstance(element, Mapping):
+        return serializer(element)
+    if isinstance(element, str):
+        return element.encode(PAYLOAD_CHARSET)
+    if isinstance(element, (bytes, bytearray, memoryview)):
+        return element
+    raise TypeError(
+        f'Element has type "{type(element)}" but a mapping, bytes or string object is expected')
+
+
+def _factor_element_error(exc, element, index):
+    # add the index of the element within the passed elements to an encoding error
+    if isinstance(element, (Mapping, str, bytes, bytearray, memoryview, TemplateEvent)):
+        return TypeError(f'Element {index} cannot be serialized: {exc}')
+    return TypeError(
+        f'Element {index} has type "{type(element)}" but a mapping, '
+        'bytes or string object is expected')
+
+
+def _check_elements_sequence(elements):
+    # the elements itself are checked while encoding them
+    # exclude strings to not detect them below as sequence
+    valid_string_types = (str, bytes)
+    if isinstance(elements, valid_string_types):
+        raise TypeError(f'Passed value has type "{type(elements)}" but a sequence is expected')
+
+    sequence_types = (Sequence, Set)
+    if not isinstance(elements, sequence_types):
+        raise TypeError(f'Passed value has type "{type(elements)}" but a sequence is expected')
+
+
+def encode_window(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+        elements,
+        first_sequence,
+        serializer,
+        compression_enable=True,
+        compression_level=COMPRESSION_LEVEL_DEFAULT,
+        first_index=0,
+        compression_threshold=0):
+    """
+    Encode a complete window with sequence numbers starting at `first_sequence`
+
+    This is a module level function to be usable as task for process pool executors.
+    `first_index` is the index of the first element used in error messages.
+    """
+    return _encode_window_measured(
+        elements, first_sequence, serializer, compression_enable, compression_level,
+        first_index, compression_threshold)[0]
+
+
+def _encode_window_measured(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+        elements,
+        first_sequence,
+        serializer,
+        compression_enable,
+        compression_level,
+        first_index,
+        compression_threshold):
+    # the encoded window with its uncompressed size and compress time for the metrics
+    frame_encoder = FrameEncoder(
+        serializer, compression_enable, compression_level, compression_threshold)
+    sequence = first_sequence
+    try:
         for element in elements:
-            self._increment_sequence()
-            encoded_element = self._encode_json(element)
-            payload_elements.append(encoded_element)
+            frame_encoder.add(sequence, element)
+            sequence = _next_sequence(sequence)
+    except TypeError as exc:
+        index = frame_encoder.window_size
+        raise _factor_element_error(exc, elements[index], first_index + index) from exc
+    payload = frame_encoder.take()
+    return payload, frame_encoder.encoded_bytes, frame_encoder.compress_time
 
-        return b''.join(payload_elements)
 
-    def _increment_sequence(self):
-        self._sequence += 1
-        if self._sequence > SEQUENCE_MAX:
-            self._sequence = 0
+def _next_sequence(sequence, count=1):
+    # 1, 2, ..., SEQUENCE_MAX, 1, ...: 0 is left out as servers use it for keep alive ACKs
+    return (sequence - 1 + count) % SEQUENCE_MAX + 1
+
+
+class FrameEncoder:
+    """
+    Encode events into a window: the window size frame followed by the JSON frames,
+    optionally compressed incrementally into a compressed frame
+    """
+
+    __slots__ = (
+        '_serializer', '_compression_enable', 'compression_level', 'compression_threshold',
+        '_window', '_buffer', '_window_size', '_raw_size', '_compressor', 'encoded_bytes',
+        'compress_time')
+
+    def __init__(
+            self,
+            serializer=None,
+            compression_enable=True,
+            compression_level=COMPRESSION_LEVEL_DEFAULT,
+            compression_threshold=0):
+        self._serializer = serializer or factor_serializer()
+        self._compression_enable = compression_enable
+        # changes of the level and threshold apply from the next window on
+        self.compression_level = compression_level
+        self.compression_threshold = compression_threshold
+        # totals of all windows for metrics
+        self.encoded_bytes = 0
+        self.compress_time = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._window_size = 0
+        self._raw_size = 0
+        # reserve the headers, the window size and payload length are known only at the end
+        # the compressor is created with the first chunk, when the window has been started
+        self._compressor = None
+        if self._compression_enable:
+            self._window = bytearray(_FRAME_HEADER_PLACEHOLDER * 2)
+            self._buffer = bytearray()
+        else:
+            self._window = self._buffer = bytearray(_FRAME_HEADER_PLACEHOLDER)
 
-    def _encode_json(self, element):
-        if isinstance(element, Mapping):
-            element = json.dumps(element)
+    def __len__(self):
+        # uncompressed size of the JSON frames encoded since the last take()
+        return self._raw_size
 
-        if isinstance(element, str):
+    @property
+    def window_size(self):
+        return self._window_size
+
+    def add(self, sequence, element):
+        # inline the checks for the common types, the others are handled by _encode_element()
+        element_type = type(element)
+        if element_type is dict:
+            element = self._serializer(element)
+        elif element_type is str:
             element = element.encode(PAYLOAD_CHARSET)
+        elif element_type is TemplateEvent and element.fields:
+            self._add_template_event(sequence, element)
+            return
+        elif element_type is not bytes:
+            element = _encode_element(element, self._serializer)
 
-        json_length = len(element)
-        frame = [PROTOCOL_VERSION, FRAME_TYPE_JSON_FRAME, self._sequence, json_length, element]
-        pack_param = f'>BBII{json_length}s'
+        buffer = self._buffer
+        offset = len(buffer)
+        # reserve the header, pack it in place and append the payload without a temporary frame
+        buffer += _JSON_FRAME_HEADER_PLACEHOLDER
+        _JSON_FRAME_HEADER.pack_into(
+            buffer, offset, PROTOCOL_VERSION, FRAME_TYPE_JSON_FRAME, sequence, len(element))
+        buffer += element
+        self._raw_size += len(buffer) - offset
+        self._window_size += 1
 
-        payload = pack(pack_param, *frame)
-        return payload
+        if self._compression_enable and len(buffer) >= _COMPRESSION_CHUNK_SIZE:
+            self._compress_buffer()
 
-    def _compress_payload(self, payload):
-        compressed_payload = zlib.compress(payload)
-        compressed_payload_bytes = len(compressed_payload)
-        pack_format = f'>BBI{compressed_payload_bytes}s'
-        compress = pack(
-            pack_format,
-            PROTOCOL_VERSION,
-            FRAME_TYPE_COMPRESSED_FRAME,
-            compressed_payload_bytes,
-            compressed_payload)
-        return compress
-
-    def _send_window_size(self):
-        packed_window_size = pack(
-            '>BBI',
-            PROTOCOL_VERSION,
-            FRAME_TYPE_WINDOW_SIZE,
-            self._window_size)
-        self._socket.send(packed_window_size)
-        self._log(logging.DEBUG, f'Sent window size: {self._window_size}')
+    def _add_template_event(self, sequence, event):
+        # splice the pre-encoded static fields and the serialized dynamic fields into the frame,
+        # the '{' of the dynamic fields is overwritten in place by the separating ','
+        prefix = event.template.prefix
+        fields = self._serializer(event.fields)
+        buffer = self._buffer
+        offset = len(buffer)
+        buffer += _JSON_FRAME_HEADER_PLACEHOLDER
+        _JSON_FRAME_HEADER.pack_into(
+            buffer, offset, PROTOCOL_VERSION, FRAME_TYPE_JSON_FRAME, sequence,
+            len(prefix) + len(fields))
+        buffer += prefix
+        fields_offset = len(buffer)
+        buffer += fields
+        if prefix:
+            buffer[fields_offset] = _JSON_SEPARATOR
+        self._raw_size += len(buffer) - offset
+        self._window_size += 1
 
-    def _send_payload(self, compressed_payload):
-        def chunker(chunk, size):
-            for i in range(0, len(chunk), size):
-                start = i
-                end = start + size
-                yield chunk[start:end]
+        if self._compression_enable and len(buffer) >= _COMPRESSION_CHUNK_SIZE:
+            self._compress_buffer()
 
-        written_bytes = 0
-        # SSL and TLS channels must be segmented into records of no more than 16Kb
-        for segment in chunker(compressed_payload, size=8192):
-            written_bytes += self._socket.send(segment)
-        self._log(
-            logging.DEBUG,
-            f'Sent payload bytes: {written_bytes}, waiting for ACK: {self._sequence}')
+    def _compress_buffer(self):
+        start = time.perf_counter()
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(self.compression_level)
+        self._window += self._compressor.compress(self._buffer)
+        self._buffer.clear()
+        self.compress_time += time.perf_counter() - start
 
-    def _expected_ack_received(self):
-        return self._last_ack == self._sequence
+    def discard(self):
+        # drop the events added since the last take()
+        self._reset()
 
-    def _read_ack(self):
-        # first byte: read the version
-        self._socket.recv(1)
-        # second byte: frame type
-        frame_type_packed = self._socket.recv(1)
-        self._assert_frame_type_is_ack(frame_type_packed)
-
-        received_ack = self._socket.recv(4)
-        self._last_ack = unpack('>I', received_ack)[0]
-        self._log(logging.DEBUG, f'Received ACK: {self._last_ack}')
+    def take(self):
+        # hand over the encoded window and start over for the next window
+        window = self._window
+        # windows below the threshold are too small to benefit from compression
+        compress = self._compression_enable and (
+            self._compressor is not None or self._raw_size >= self.compression_threshold)
+        if compress:
+            self._compress_buffer()
+            start = time.perf_counter()
+            window += self._compressor.flush()
+            self.compress_time += time.perf_counter() - start
+            _FRAME_HEADER.pack_into(
+                window,
+                _FRAME_HEADER.size,
+                PROTOCOL_VERSION,
+                FRAME_TYPE_COMPRESSED_FRAME,
+                len(window) - 2 * _FRAME_HEADER.size)
+        elif self._compression_enable:
+            # send the JSON frames as they are
+            del window[_FRAME_HEADER.size:]
+            window += self._buffer
+        _FRAME_HEADER.pack_into(
+            window, 0, PROTOCOL_VERSION, FRAME_TYPE_WINDOW_SIZE, self._window_size)
+
+        self.encoded_bytes += self._raw_size
+        self._reset()
+        return window
+
+
+class AckReader:
+    """Collect received data in a preallocated buffer and parse the complete frames from it"""
+
+    __slots__ = ('_buffer', '_view', '_start', '_end')
 
-    def _assert_frame_type_is_ack(self, frame_type_packed):
-        if frame_type_packed:
-            frame_type = unpack('B', frame_type_packed)[0]
-            if frame_type == FRAME_TYPE_ACK:
+    def __init__(self, size=_ACK_READER_BUFFER_SIZE):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        # number of buffered bytes not yet parsed
+        return self._end - self._start
+
+    def _make_room(self, required=1):
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif len(self._buffer) - self._end < required:
+            # move an incomplete frame to the front of the buffer
+            pending = self._end - self._start
+            self._buffer[:pending] = self._view[self._start:self._end]
+            self._start, self._end = 0, pending
+
+    def clear(self):
+        # drop data of a previous connection
+        self._start = self._end = 0
+
+    def read(self, sock):
+        # read as much as is available, return 0 if the connection has been closed
+        self._make_room()
+        received_bytes = sock.recv_into(self._view[self._end:])
+        self._end += received_bytes
+        return received_bytes
+
+    def feed(self, data):
+        self._make_room(len(data))
+        end = self._end + len(data)
+        if end > len(self._buffer):
+            raise ValueError('Data exceeds the free space of the buffer')
+        self._buffer[self._end:end] = data
+        self._end = end
+
+    def frames(self):
+        # yield (frame type, sequence) for each completely received frame
+        while self._end - self._start >= 2:
+            frame_type = self._buffer[self._start + 1]
+            if frame_type != FRAME_TYPE_ACK:
+                # fail early on unexpected frames without waiting for the rest of the frame
+                yield frame_type, None
                 return
+            if self._end - self._start < _FRAME_HEADER.size:
+                return
+            _, frame_type, sequence = _FRAME_HEADER.unpack_from(self._buffer, self._start)
+            self._start += _FRAME_HEADER.size
+            yield frame_type, sequence
+
+
+class FrameDecoder:
+    """
+    Incrementally decode a stream of window, compressed and JSON frames into events
+
+    Received data is passed to `feed()`, `decode()` then yields the events of all complete
+    JSON frames. Compressed frames are inflated as their data arrives.
+    """
+
+    __slots__ = (
+        '_deserializer', '_buffer', '_offset', '_inflated', '_inflated_offset',
+        '_decompressor', '_compressed_remaining', '_window_remaining')
+
+    def __init__(self, deserializer=None):
+        self._deserializer = deserializer or factor_deserializer()
+        self._buffer = bytearray()
+        self._offset = 0
+        self._inflated = bytearray()
+        self._inflated_offset = 0
+        self._decompressor = None
+        self._compressed_remaining = 0
+        self._window_remaining = 0
+
+    def __len__(self):
+        # number of buffered bytes not yet decoded
+        return len(self._buffer) - self._offset + len(self._inflated) - self._inflated_offset
+
+    @property
+    def window_remaining(self):
+        # number of events of the current window which have not been decoded yet
+        return self._window_remaining
+
+    def feed(self, data):
+        self._buffer += data
+
+    def decode(self):
+        # yield (sequence, event) for each complete JSON frame
+        try:
+            while True:
+                if self._decompressor is not None:
+                    self._inflate()
+
+                if self._inflated_offset < len(self._inflated):
+                    decoded = self._decode_json_frame(inflated=True)
+                    if decoded is not None:
+                        yield decoded
+                        continue
+                    if self._decompressor is None:
+                        raise ValueError('Compressed frame ends within a frame')
+                    break  # wait for more compressed data
+                if self._decompressor is not None:
+                    break  # wait for more compressed data
+
+                decoded = self._decode_frame()
+                if decoded is None:
+                    break
+                if decoded is not True:
+                    yield decoded
+        finally:
+            self._compact()
+
+    def _inflate(self):
+        available = min(len(self._buffer) - self._offset, self._compressed_remaining)
+        if available:
+            end = self._offset + available
+            with memoryview(self._buffer) as view, view[self._offset:end] as chunk:
+                self._inflated += self._decompressor.decompress(chunk)
+            self._offset = end
+            self._compressed_remaining -= available
+
+        if not self._compressed_remaining:
+            self._inflated += self._decompressor.flush()
+            if not self._decompressor.eof:
+                raise ValueError('Compressed frame ends within the compressed stream')
+            self._decompressor = None
+
+    def _decode_frame(self):
+        # return the decoded event, True for a consumed control frame or None if incomplete
+        if len(self._buffer) - self._offset < _FRAME_TYPE_HEADER.size:
+            return None
+
+        frame_type = self._unpack_frame_type(self._buffer, self._offset)
+        if frame_type == FRAME_TYPE_JSON_FRAME:
+            return self._decode_json_frame(inflated=False)
+        if frame_type not in (FRAME_TYPE_WINDOW_SIZE, FRAME_TYPE_COMPRESSED_FRAME):
+            raise ValueError(f'Unexpected frame type "0x{frame_type:02X}"')
+
+        if len(self._buffer) - self._offset < _FRAME_HEADER.size:
+            return None
+        _, _, value = _FRAME_HEADER.unpack_from(self._buffer, self._offset)
+        self._offset += _FRAME_HEADER.size
+        if frame_type == FRAME_TYPE_WINDOW_SIZE:
+            self._window_remaining = value
         else:
-            frame_type = 0
+            self._decompressor = zlib.decompressobj()
+            self._compressed_remaining = value
+        return True
 
-        self._log(
-            logging.WARNING,
-            'Waited for ACK from server but received an unexpected frame: '
-            f'"0x{frame_type:02X}". Aborting.')
-        raise ConnectionException(f'No ACK received or wrong frame type "0x{frame_type:02X}"')
+    def _decode_json_frame(self, inflated):
+        if inflated:
+            buffer, offset = self._inflated, self._inflated_offset
+        else:
+            buffer, offset = self._buffer, self._offset
+
+        if len(buffer) - offset < _JSON_FRAME_HEADER.size:
+            return None
+        frame_type = self._unpack_frame_type(buffer, offset)
+        if frame_type != FRAME_TYPE_JSON_FRAME:
+            raise ValueError(f'Unexpected frame type "0x{frame_type:02X}" in compressed frame')
+        _, _, sequence, length = _JSON_FRAME_HEADER.unpack_from(buffer, offset)
+        start = offset + _JSON_FRAME_HEADER.size
+        end = start + length
+        if len(buffer) < end:
+            return None
+        if not self._window_remaining:
+            raise ValueError('Received a JSON frame outside of a window')
+
+        # the deserializer must not keep a reference to the passed view
+        with memoryview(buffer) as view, view[start:end] as payload:
+            event = self._deserializer(payload)
+
+        if inflated:
+            self._inflated_offset = end
+        else:
+            self._offset = end
+        self._window_remaining -= 1
+        return sequence, event
+
+    def _unpack_frame_type(self, buffer, offset):
+        version, frame_type = _FRAME_TYPE_HEADER.unpack_from(buffer, offset)
+        if version != PROTOCOL_VERSION:
+            raise ValueError(f'Unsupported protocol version "0x{version:02X}"')
+        return frame_type
+
+    def _compact(self):
+        # drop decoded data, keeping only incomplete frames
+        if self._offset:
+            del self._buffer[:self._offset]
+            self._offset = 0
+        if self._inflated_offset:
+            del self._inflated[:self._inflated_offset]
+            self._inflated_offset = 0
+
+
+class _Window:
+    """Accounting of a sent window which still awaits its final ACK"""
+
+    __slots__ = (
+        'last_sequence', 'size', 'acked', 'partially_acked', 'sent_at', 'elements', 'encoding',
+        'reserved_bytes')
+
+    def __init__(self, last_sequence, size, elements=None, encoding=None):
+        self.last_sequence = last_sequence
+        self.size = size
+        self.acked = 0
+        self.partially_acked = False
+        self.sent_at = time.monotonic()
+        # kept to resend the not acknowledged events after reconnecting
+        self.elements = elements
+        # raw bytes, window bytes and compress time for the compression policy
+        self.encoding = encoding
+        # encoded size charged to the memory budget until the window is acknowledged
+        self.reserved_bytes = 0
+
+    def contains(self, sequence):
+        return (self.last_sequence - sequence) % SEQUENCE_MAX < self.size
+
+    def acknowledge(self, sequence):
+        # number of events of this window the server confirmed so far
+        self.acked = self.size - (self.last_sequence - sequence) % SEQUENCE_MAX
+        if self.acked == self.size:
+            return True
+        self.partially_acked = True
+        return False
+
+
+class _AdaptiveWindowSize:
+    """Window size which grows on fast ACKs and shrinks on slow or partial ACKs"""
+
+    __slots__ = ('minimum', 'maximum', 'slow_ack_threshold', 'current')
+
+    def __init__(self, minimum, maximum, slow_ack_threshold):
+        if minimum < 1 or maximum < minimum:
+            raise ValueError('Window sizes must satisfy 1 <= window_size_min <= window_size_max')
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.slow_ack_threshold = slow_ack_threshold
+        self.current = min(max(WINDOW_SIZE_INITIAL, minimum), maximum)
+
+    def update(self, window, ack_duration):
+        if window.partially_acked or ack_duration > self.slow_ack_threshold:
+            self.current = max(self.current // 2, self.minimum)
+        elif window.size >= self.current:
+            # grow only if the window has been used completely, as Filebeat does
+            self.current = min(self.current + max(self.current // 2, 1), self.maximum)
+
+
+class CompressionPolicy:
+    """
+    Decide per window whether to compress it and adapt the zlib level to the bottleneck
+
+    Windows with less than `threshold` bytes of JSON frames are sent uncompressed.
+    After each acknowledged window, the time spent compressing it is compared with the time
+    from writing it until its ACK, smoothed over the recent windows. If compressing takes more
+    than `cpu_share_high` of the total or saves less than `min_savings` of the bytes, the
+    level is lowered to save CPU time. If it takes less than `cpu_share_low`, the connection is
+    the bottleneck and the level is raised to save bandwidth. The level starts at `level` and
+    stays between `min_level` and `max_level`.
+    A policy keeps the state of one client, it must not be shared between clients.
+    """
+
+    __slots__ = (
+        'threshold', 'level', 'min_level', 'max_level', 'cpu_share_low', 'cpu_share_high',
+        'min_savings', 'smoothing', 'cpu_share', 'ratio')
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self,
+            threshold=COMPRESSION_THRESHOLD_DEFAULT,
+            level=1,
+            min_level=1,
+            max_level=9,
+            cpu_share_low=0.05,
+            cpu_share_high=0.25,
+            min_savings=0.1,
+            smoothing=0.3):
+        if not 0 <= min_level <= level <= max_level <= 9:
+            raise ValueError('Levels must satisfy 0 <= min_level <= level <= max_level <= 9')
+
+        self.threshold = threshold
+        self.level = level
+        self.min_level = min_level
+        self.max_level = max_level
+        self.cpu_share_low = cpu_share_low
+        self.cpu_share_high = cpu_share_high
+        self.min_savings = min_savings
+        self.smoothing = smoothing
+        # exponential moving averages of the compressed windows, None until the first one
+        self.cpu_share = None
+        self.ratio = None
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    def update(self, raw_bytes, window_bytes, compress_time, ack_duration):
+        """Take the measurements of an acknowledged window into account, return the new level"""
+        if raw_bytes < self.threshold or not raw_bytes:
+            return self.level  # the window was not compressed
+
+        total_time = compress_time + ack_duration
+        cpu_share = compress_time / total_time if total_time else 0
+        self.cpu_share = self._smooth(self.cpu_share, cpu_share)
+        self.ratio = self._smooth(self.ratio, window_bytes / raw_bytes)
+
+        level = self.level
+        if self.cpu_share > self.cpu_share_high or self.ratio > 1 - self.min_savings:
+            level = max(level - 1, self.min_level)
+        elif self.cpu_share < self.cpu_share_low:
+            level = min(level + 1, self.max_level)
+        if level != self.level:
+            self.level = level
+            self.cpu_share = None  # measure the effect of the new level from scratch
+        return level
+
+
+class RetryPolicy:
+    """
+    Reconnect after connection failures and resend the events not acknowledged yet
+
+    Before each attempt, wait a random delay between zero and an exponentially growing
+    backoff ("full jitter"). Give up after `max_attempts` attempts or once `deadline` seconds
+    passed since the first failure. Both are reset as soon as the server acknowledges events.
+    """
+
+    __slots__ = ('max_attempts', 'backoff', 'max_backoff', 'deadline', 'jitter')
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self, max_attempts=5, backoff=0.1, max_backoff=10.0, deadline=None, jitter=True):
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1')
+
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        # delay before the given attempt, starting at 0
+        delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def give_up(self, attempt, elapsed, delay):
+        if attempt >= self.max_attempts:
+            return True
+        return self.deadline is not None and elapsed + delay > self.deadline
+
+
+class MemoryBudget:
+    """
+    Limit the bytes of buffered and in-flight events, shared by any number of clients
+
+    If a reservation does not fit, the policy decides: OVERFLOW_BLOCK waits up to `timeout`
+    seconds (forever if None) for reservations to be released and raises
+    BudgetExceededException then, OVERFLOW_REJECT raises it immediately and
+    OVERFLOW_DROP_NEWEST refuses the reservation and counts it as dropped.
+    A reservation larger than the whole budget fits only while nothing else is reserved.
+    """
+
+    __slots__ = (
+        'max_bytes', 'policy', 'timeout', 'dropped_reservations', 'dropped_bytes',
+        '_used_bytes', '_condition')
+
+    def __init__(self, max_bytes, policy=OVERFLOW_BLOCK, timeout=None):
+        if max_bytes < 1:
+            raise ValueError('max_bytes must be at least 1')
+        if policy not in (OVERFLOW_BLOCK, OVERFLOW_REJECT, OVERFLOW_DROP_NEWEST):
+            raise ValueError(f'Unknown memory budget policy "{policy}"')
+
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.timeout = timeout
+        self.dropped_reservations = 0
+        self.dropped_bytes = 0
+        self._used_bytes = 0
+        self._condition = threading.Condition()
+
+    @property
+    def used_bytes(self):
+        return self._used_bytes
+
+    @property
+    def exhausted(self):
+        return self._used_bytes >= self.max_bytes
+
+    def _fits(self, size):
+        return not self._used_bytes or self._used_bytes + size <= self.max_bytes
+
+    def reserve(self, size, force=False):
+        # return whether the bytes have been reserved, with force regardless of the budget
+        deadline = None
+        with self._condition:
+            while not force and not self._fits(size):
+                if self.policy == OVERFLOW_DROP_NEWEST:
+                    self.dropped_reservations += 1
+                    self.dropped_bytes += size
+                    return False
+                if self.policy == OVERFLOW_BLOCK:
+                    if deadline is None and self.timeout is not None:
+                        deadline = time.monotonic() + self.timeout
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is None or remaining > 0:
+                        self._condition.wait(remaining)
+                        continue
+                raise BudgetExceededException(
+                    f'Memory budget exceeded: {self._used_bytes} of {self.max_bytes} bytes '
+                    f'in use, {size} bytes requested')
+            self._used_bytes += size
+            return True
+
+    def release(self, size):
+        with self._condition:
+            self._used_bytes -= size
+            self._condition.notify_all()
+
+
+class SocketOptions:
+    """
+    Options for the TCP connections of a client
+
+    `tcp_nodelay` disables Nagle's algorithm so small windows are sent without delay.
+    `send_buffer_size` and `receive_buffer_size` set SO_SNDBUF and SO_RCVBUF.
+    With `keepalive`, TCP keepalive probes are sent after `keepalive_idle` seconds without
+    traffic and then every `keepalive_interval` seconds, the connection is considered dead
+    after `keepalive_count` unanswered probes (the system defaults are used for unset values).
+    The host name is resolved for `family`, by default to IPv4 and IPv6 addresses which are
+    tried alternately; if connecting takes longer than `happy_eyeballs_delay` seconds the next
+    address is tried in parallel (RFC 8305).
+    Connections without traffic for more than `idle_timeout` seconds are reopened before
+    sending, as firewalls and load balancers may have dropped them silently.
+    """
+
+    __slots__ = (
+        'tcp_nodelay', 'send_buffer_size', 'receive_buffer_size', 'keepalive', 'keepalive_idle',
+        'keepalive_interval', 'keepalive_count', 'family', 'happy_eyeballs_delay',
+        'idle_timeout')
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self,
+            tcp_nodelay=True,
+            send_buffer_size=None,
+            receive_buffer_size=None,
+            keepalive=False,
+            keepalive_idle=None,
+            keepalive_interval=None,
+            keepalive_count=None,
+            family=socket.AF_UNSPEC,
+            happy_eyeballs_delay=0.25,
+            idle_timeout=None):
+        self.tcp_nodelay = tcp_nodelay
+        self.send_buffer_size = send_buffer_size
+        self.receive_buffer_size = receive_buffer_size
+        self.keepalive = keepalive
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+        self.family = family
+        self.happy_eyeballs_delay = happy_eyeballs_delay
+        self.idle_timeout = idle_timeout
+
+    def apply(self, sock):
+        # buffer sizes must be set before connecting to affect the TCP window scaling
+        if self.send_buffer_size is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer_size)
+        if self.receive_buffer_size is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer_size)
+        if sock.family not in (socket.AF_INET, socket.AF_INET6):
+            return
+        if self.tcp_nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.keepalive:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # TCP_KEEPIDLE is called TCP_KEEPALIVE on macOS, the options are missing on some systems
+            keepalive_idle = getattr(socket, 'TCP_KEEPIDLE', getattr(socket, 'TCP_KEEPALIVE', None))
+            for option, value in (
+                    (keepalive_idle, self.keepalive_idle),
+                    (getattr(socket, 'TCP_KEEPINTVL', None), self.keepalive_interval),
+                    (getattr(socket, 'TCP_KEEPCNT', None), self.keepalive_count)):
+                if option is not None and value is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, option, value)
+
+
+def _interleave_address_families(addresses):
+    # alternate between the address families, starting with the first resolved one (RFC 8305)
+    by_family = {}
+    for address in addresses:
+        by_family.setdefault(address[0], deque()).append(address)
+    queues = deque(by_family.values())
+    while queues:
+        family_addresses = queues.popleft()
+        yield family_addresses.popleft()
+        if family_addresses:
+            queues.append(family_addresses)
+
+
+def _connect_happy_eyeballs(addresses, socket_options, timeout):
+    """
+    Connect to the first of `addresses` (as returned by getaddrinfo()) which accepts the
+    connection, starting the next attempt after `socket_options.happy_eyeballs_delay` seconds
+    or as soon as the previous attempt failed
+    """
+    addresses = deque(_interleave_address_families(addresses))
+    deadline = None if timeout is None else time.monotonic() + timeout
+    attempts = {}
+    error = OSError(f'No addresses to connect to: {addresses}')
+    with selectors.DefaultSelector() as selector:
+        try:
+            while addresses or attempts:
+                if addresses:
+                    family, type_, proto, _, address = addresses.popleft()
+                    sock = socket.socket(family, type_, proto)
+                    socket_options.apply(sock)
+                    sock.setblocking(False)
+                    result = sock.connect_ex(address)
+                    if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                        sock.close()
+                        error = OSError(result, f'{os.strerror(result)}: {address}')
+                        continue
+                    attempts[sock] = address
+                    selector.register(sock, selectors.EVENT_WRITE)
+
+                wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+                if addresses:
+                    wait = socket_options.happy_eyeballs_delay if wait is None else min(
+                        wait, socket_options.happy_eyeballs_delay)
+                for key, _ in selector.select(wait):
+                    sock = key.fileobj
+                    selector.unregister(sock)
+                    address = attempts.pop(sock)
+                    result = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if result == 0:
+                        sock.setblocking(True)
+                        return sock
+                    sock.close()
+                    error = OSError(result, f'{os.strerror(result)}: {address}')
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError('Connecting timed out')
+        finally:
+            for sock in attempts:
+                sock.close()
+    raise error
+
+
+class _Histogram:
+    """Count observed values in buckets with fixed upper bounds"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self):
+        # cumulative bucket counts like Prometheus' "le" buckets
+        buckets = {}
+        cumulative_count = 0
+        for bound, count in zip((*self.bounds, float('inf')), self.counts):
+            cumulative_count += count
+            buckets[bound] = cumulative_count
+        return {'count': self.count, 'sum': self.sum, 'max': self.max, 'buckets': buckets}
+
+
+class Metrics:
+    """
+    Counters and duration histograms describing the work of a client
+
+    Counters: events_sent, windows_sent, raw_bytes (uncompressed JSON frames), sent_bytes
+    (written to the socket), events_acked, reconnects, ack_failures, tls_resumptions,
+    events_resent (not acknowledged events sent again after reconnecting), windows_compressed
+    and windows_uncompressed (windows sent as plain JSON frames despite enabled compression).
+    Histograms in seconds: ack_rtt (per window from writing to its final ACK), validate,
+    encode, compress, write, ack_wait (time blocked waiting for ACKs), connect and handshake
+    (the TLS handshake, included in connect for the async client).
+    Gauges with the latest value: compression_level and compression_ratio, set by a
+    compression policy.
+
+    Hooks added with `add_hook()` are called with the name and value of each counter
+    increment and histogram observation, e.g. to forward them to StatsD.
+    """
+
+    COUNTERS = (
+        'events_sent', 'windows_sent', 'raw_bytes', 'sent_bytes', 'events_acked', 'reconnects',
+        'ack_failures', 'tls_resumptions', 'events_resent', 'windows_compressed',
+        'windows_uncompressed')
+    HISTOGRAMS = (
+        'ack_rtt', 'validate', 'encode', 'compress', 'write', 'ack_wait', 'connect', 'handshake')
+    GAUGES = ('compression_level', 'compression_ratio')
+
+    def __init__(self, buckets=METRICS_HISTOGRAM_BUCKETS):
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+        self._histograms = {name: _Histogram(tuple(buckets)) for name in self.HISTOGRAMS}
+        self._gauges = dict.fromkeys(self.GAUGES)
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+        for hook in self._hooks:
+            hook(name, value)
+
+    def observe(self, name, value):
+        with self._lock:
+            self._histograms[name].observe(value)
+        for hook in self._hooks:
+            hook(name, value)
+
+    def set(self, name, value):
+        if name not in self._gauges:
+            raise KeyError(name)
+        with self._lock:
+            self._gauges[name] = value
+        for hook in self._hooks:
+            hook(name, value)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot.update(self._gauges)
+            for name, histogram in self._histograms.items():
+                snapshot[name] = histogram.snapshot()
+        return snapshot
+
+
+class _LoggingMixin:
+
+    _use_logging = False
+
+    def _log(self, level, format_, *args, **kwargs):
+        if self._use_logging:
+            LOGGER.log(level, format_, *args, **kwargs)
+        elif level >= logging.WARNING:  # print warnings to stderr
+            message = format_.format(*args, **kwargs)
+            message_format = f'{datetime.now()} {logging.getLevelName(level)} {message}'
+            print(message_format, *args, file=sys.stderr, **kwargs)
+
+
+class _PyLogBeatClientBase(_LoggingMixin):
+    # pylint: disable=too-many-instance-attributes,too-many-locals
+    """Configuration, framing and ACK accounting shared by the synchronous and async clients"""
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self,
+            host,
+            port,
+            timeout=None,
+            ssl_enable=False,
+            ssl_verify=True,
+            ssl_verify_flags=None,
+            keyfile=None,
+            certfile=None,
+            ca_certs=None,
+            use_logging=False,
+            serializer=None,
+            json_default=None,
+            compression_enable=True,
+            compression_level=COMPRESSION_LEVEL_DEFAULT,
+            max_windows_in_flight=1,
+            window_size_min=1,
+            window_size_max=WINDOW_SIZE_MAX,
+            window_slow_ack_threshold=WINDOW_SLOW_ACK_THRESHOLD,
+            executor=None,
+            encode_prefetch=None,
+            metrics=None,
+            validate=True,
+            ssl_context=None,
+            socket_options=None,
+            compression_policy=None):
+        if max_windows_in_flight < 1:
+            raise ValueError('max_windows_in_flight must be at least 1')
+        if encode_prefetch is not None and encode_prefetch < 1:
+            raise ValueError('encode_prefetch must be at least 1')
+        if compression_policy is not None and not compression_enable:
+            raise ValueError('compression_policy requires compression_enable')
+
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._ssl_enable = ssl_enable
+        self._ssl_verify = ssl_verify
+        self._ssl_verify_flags = ssl_verify_flags
+        self._keyfile = keyfile
+        self._certfile = certfile
+        self._ca_certs = ca_certs
+        self._ssl_context = ssl_context
+        self._ssl_session = None
+        self._socket_options = socket_options
+        self._last_activity = 0
+        self._window_size = 0
+        self._window_last_sequence = 0
+        self._window_elements = None
+        self._window_encoding = None
+        self._keep_window_elements = False
+        self._sequence = 0
+        self._last_ack = 0
+        self._use_logging = use_logging
+        self._max_windows_in_flight = max_windows_in_flight
+        self._windows_in_flight = deque()
+        self._adaptive_window_size = _AdaptiveWindowSize(
+            window_size_min, window_size_max, window_slow_ack_threshold)
+        self._serializer = serializer or factor_serializer(json_default)
+        self._compression_enable = compression_enable
+        self._compression_policy = compression_policy
+        compression_threshold = 0
+        if compression_policy is not None:
+            compression_level = compression_policy.level
+            compression_threshold = compression_policy.threshold
+        self._frame_encoder = FrameEncoder(
+            self._serializer, compression_enable, compression_level, compression_threshold)
+        self._executor = executor
+        self._encode_prefetch = encode_prefetch or os.cpu_count() or 1
+        self._metrics = metrics if metrics is not None else Metrics()
+        if compression_policy is not None:
+            self._metrics.set('compression_level', compression_policy.level)
+        self._validate = validate
+        self._connected_before = False
+        self._ack_reader = AckReader()
+        self._acked_events = 0
+        self._memory_budget = None
+
+    def _factor_ssl_context(self):
+        # created on the first connect and reused for all reconnects
+        if self._ssl_context is None:
+            self._ssl_context = factor_ssl_context(
+                self._ssl_verify, self._ssl_verify_flags, self._keyfile, self._certfile,
+                self._ca_certs)
+        return self._ssl_context
+
+    def _discard_windows_in_flight(self):
+        if self._windows_in_flight:
+            self._log(
+                logging.WARNING,
+                f'Connection closed with {self.unacked_events} events '
+                'not acknowledged by the server')
+            for window in self._windows_in_flight:
+                self._release_window_memory(window)
+            self._windows_in_flight.clear()
+
+    @property
+    def windows_in_flight(self):
+        return len(self._windows_in_flight)
+
+    @property
+    def window_size(self):
+        return self._adaptive_window_size.current
+
+    @property
+    def serializer(self):
+        return self._serializer
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def acked_events(self):
+        # total number of events acknowledged by the server, including partial ACKs
+        return self._acked_events
+
+    @property
+    def unacked_events(self):
+        # events sent but not acknowledged yet
+        return sum(window.size - window.acked for window in self._windows_in_flight)
+
+    def _current_window_size(self, window_size=None):
+        # a fixed window size or the adaptive one, re-evaluated for each window as ACKs adjust it
+        return window_size or self._adaptive_window_size.current
+
+    def _iter_windows(self, elements, window_size=None):
+        # yield the index of the first element and the elements of each window
+        iterator = iter(elements)
+        first_index = 0
+        while window_elements := list(islice(iterator, self._current_window_size(window_size))):
+            yield first_index, window_elements
+            first_index += len(window_elements)
+
+    def _iter_stream_windows(self, elements, window_size, window_bytes):
+        if window_size is not None and window_size < 1:
+            raise ValueError('window_size must be at least 1')
+        if window_bytes is None:
+            return self._iter_encoded_windows(elements, window_size)
+        if window_bytes < 1:
+            raise ValueError('window_bytes must be at least 1')
+        return self._iter_encoded_windows_by_bytes(elements, window_size, window_bytes)
+
+    def _iter_encoded_windows_by_bytes(self, elements, window_size, window_bytes):
+        # encode message by message to cut windows once they reach window_bytes,
+        # the encode duration therefore includes the time to produce the messages
+        frame_encoder = self._frame_encoder
+        window_elements = [] if self._keep_window_elements else None
+        window_sequence = self._sequence  # last sequence before the current window
+        try:
+            measurement = self._start_window_measurement()
+            for index, element in enumerate(elements):
+                try:
+                    frame_encoder.add(_next_sequence(self._sequence), element)
+                except TypeError as exc:
+                    raise _factor_element_error(exc, element, index) from exc
+                self._increment_sequence()
+                if window_elements is not None:
+                    window_elements.append(element)
+
+                window_full = frame_encoder.window_size >= self._current_window_size(window_size)
+                if window_full or len(frame_encoder) >= window_bytes:
+                    yield self._take_stream_window(measurement, window_elements)
+                    measurement = self._start_window_measurement()
+                    window_elements = [] if self._keep_window_elements else None
+                    window_sequence = self._sequence
+
+            if frame_encoder.window_size:
+                yield self._take_stream_window(measurement, window_elements)
+        finally:
+            # drop the messages of an incomplete window if sending has been aborted
+            if frame_encoder.window_size:
+                self._sequence = window_sequence
+                frame_encoder.discard()
+
+    def _start_window_measurement(self):
+        frame_encoder = self._frame_encoder
+        return time.perf_counter(), frame_encoder.encoded_bytes, frame_encoder.compress_time
+
+    def _take_stream_window(self, measurement, elements):
+        window_size = self._frame_encoder.window_size
+        payload = self._frame_encoder.take()
+        encoding = self._record_window_encoded(payload, *measurement)
+        self._prepare_window(window_size, self._sequence, elements, encoding)
+        return payload
+
+    def _iter_encoded_windows(self, elements, window_size=None):
+        # yield the encoded windows in order, as futures when encoding is done by an executor
+        if self._executor is None:
+            for first_index, window_elements in self._iter_windows(elements, window_size):
+                yield self._factor_window(window_elements, first_index)
+            return
+
+        pending = deque()
+        try:
+            for first_index, window_elements in self._iter_windows(elements, window_size):
+                # sequence numbers are assigned here, the workers only encode
+                first_sequence = _next_sequence(self._sequence)
+                self._sequence = _next_sequence(self._sequence, len(window_elements))
+                future = self._executor.submit(
+                    _encode_window_measured, window_elements, first_sequence, self._serializer,
+                    self._compression_enable, self._frame_encoder.compression_level,
+                    first_index, self._frame_encoder.compression_threshold)
+                pending.append((future, window_elements, self._sequence))
+                if len(pending) >= self._encode_prefetch:
+                    yield self._take_encoded_window(*pending.popleft())
+            while pending:
+                yield self._take_encoded_window(*pending.popleft())
+        finally:
+            for future, _, _ in pending:
+                future.cancel()
+
+    def _take_encoded_window(self, future, elements, last_sequence):
+        self._prepare_window(len(elements), last_sequence, elements)
+        return future
+
+    def _record_encoded_window_result(self, result, wait_duration):
+        # with an executor, the time the sender is blocked by encoding is recorded
+        payload, raw_bytes, compress_time = result
+        self._metrics.observe('encode', wait_duration)
+        self._metrics.observe('compress', compress_time)
+        self._metrics.increment('raw_bytes', raw_bytes)
+        self._window_encoding = (raw_bytes, len(payload), compress_time)
+        return payload
+
+    def _factor_window(self, elements, first_index=0):
+        measurement = self._start_window_measurement()
+        payload = self._factor_payload(elements, first_index)
+        encoding = self._record_window_encoded(payload, *measurement)
+
+        self._prepare_window(
+            self._factor_window_size(elements), self._sequence, elements, encoding)
+        return payload
+
+    def _record_window_encoded(self, payload, start, encoded_bytes, compress_time):
+        # the encoder interleaves compression with encoding, so separate the durations
+        frame_encoder = self._frame_encoder
+        duration = time.perf_counter() - start
+        compress_time = frame_encoder.compress_time - compress_time
+        raw_bytes = frame_encoder.encoded_bytes - encoded_bytes
+        self._metrics.observe('encode', duration - compress_time)
+        self._metrics.observe('compress', compress_time)
+        self._metrics.increment('raw_bytes', raw_bytes)
+        return raw_bytes, len(payload), compress_time
+
+    def _prepare_window(self, window_size, last_sequence, elements=None, encoding=None):
+        if not self._windows_in_flight:
+            self._reinit_last_ack()
+
+        self._window_size = window_size
+        self._window_last_sequence = last_sequence
+        self._window_elements = elements if self._keep_window_elements else None
+        self._window_encoding = encoding
+
+    def _record_window_sent(self, window, written_bytes, write_duration):
+        if self._compression_enable:
+            compressed = window[_FRAME_HEADER.size + 1] == FRAME_TYPE_COMPRESSED_FRAME
+            self._metrics.increment(
+                'windows_compressed' if compressed else 'windows_uncompressed')
+        self._metrics.increment('windows_sent')
+        self._metrics.increment('events_sent', self._window_size)
+        self._metrics.increment('sent_bytes', written_bytes)
+        self._metrics.observe('write', write_duration)
+        self._record_activity()
+
+    def _record_connected(self):
+        if self._connected_before:
+            self._metrics.increment('reconnects')
+        self._connected_before = True
+        self._record_activity()
+
+    def _record_activity(self):
+        if self._socket_options is not None and self._socket_options.idle_timeout is not None:
+            self._last_activity = time.monotonic()
+
+    def _connection_idle(self):
+        # only reconnect if nothing is waiting for ACKs on the connection
+        options = self._socket_options
+        if options is None or options.idle_timeout is None or self._windows_in_flight:
+            return False
+        return time.monotonic() - self._last_activity > options.idle_timeout
+
+    def _register_window_in_flight(self):
+        if self._window_size:
+            self._windows_in_flight.append(_Window(
+                self._window_last_sequence, self._window_size, self._window_elements,
+                self._window_encoding))
+            self._window_elements = self._window_encoding = None
+
+    def window_slot_available(self):
+        # whether another window may be sent without waiting for ACKs
+        if not self._windows_in_flight:
+            return True  # one window is always allowed, so the connection makes progress
+        if self._memory_budget is not None and self._memory_budget.exhausted:
+            return False
+        return len(self._windows_in_flight) < self._max_windows_in_flight
+
+    def _reserve_window_memory(self, size):
+        if self._memory_budget is not None and self._windows_in_flight:
+            self._memory_budget.reserve(size, force=True)
+            self._windows_in_flight[-1].reserved_bytes = size
+
+    def _release_window_memory(self, window):
+        if window.reserved_bytes:
+            self._memory_budget.release(window.reserved_bytes)
+            window.reserved_bytes = 0
+
+    def _validate_elements_sequence(self, elements):
+        start = time.perf_counter()
+        try:
+            _check_elements_sequence(elements)
+        finally:
+            self._metrics.observe('validate', time.perf_counter() - start)
+
+    def _reinit_last_ack(self):
+        self._last_ack = 0
+
+    def _factor_window_size(self, elements):
+        return len(elements)
+
+    def _factor_payload(self, elements, first_index=0):
+        frame_encoder = self._frame_encoder
+        sequence = self._sequence
+        try:
+            for element in elements:
+                self._increment_sequence()
+                frame_encoder.add(self._sequence, element)
+        except TypeError as exc:
+            # nothing of this window has been sent yet, so drop it
+            index = frame_encoder.window_size
+            frame_encoder.discard()
+            self._sequence = sequence
+            raise _factor_element_error(exc, elements[index], first_index + index) from exc
+
+        return frame_encoder.take()
+
+    def _increment_sequence(self):
+        self._sequence = _next_sequence(self._sequence)
+
+    def _expected_ack_received(self):
+        return not self._windows_in_flight
+
+    def _process_ack_frames(self):
+        processed_frames = 0
+        for frame_type, sequence in self._ack_reader.frames():
+            self._assert_frame_type_is_ack(frame_type)
+            self._process_ack(sequence)
+            processed_frames += 1
+        return processed_frames
+
+    def _process_ack(self, sequence):
+        if sequence == 0:
+            # Logstash sends ACKs for sequence 0 as keep alive while processing a window
+            self._log(logging.DEBUG, 'Received keep alive ACK')
+            return
+
+        self._last_ack = sequence
+        self._record_activity()
+        self._log(logging.DEBUG, f'Received ACK: {self._last_ack}')
+        self._release_acknowledged_windows(self._last_ack)
+
+    def _release_acknowledged_windows(self, ack):
+        for index, window in enumerate(self._windows_in_flight):
+            if window.contains(ack):
+                break
+        else:
+            self._log(logging.DEBUG, f'Ignoring ACK {ack} not matching any window in flight')
+            return
+
+        # the server processes windows in order, so all preceding windows are complete
+        now = time.monotonic()
+        for _ in range(index):
+            self._complete_window(self._windows_in_flight.popleft(), now)
+
+        if ack == window.last_sequence:
+            self._complete_window(self._windows_in_flight.popleft(), now)
+        else:
+            acked_before = window.acked
+            window.acknowledge(ack)
+            self._acked_events += window.acked - acked_before
+            self._metrics.increment('events_acked', window.acked - acked_before)
+            self._log(
+                logging.DEBUG,
+                f'Received partial ACK: {window.acked} of {window.size} events')
+
+    def _complete_window(self, window, now):
+        self._acked_events += window.size - window.acked
+        self._metrics.increment('events_acked', window.size - window.acked)
+        self._metrics.observe('ack_rtt', now - window.sent_at)
+        window.acked = window.size
+        self._release_window_memory(window)
+        self._adaptive_window_size.update(window, now - window.sent_at)
+        if self._compression_policy is not None and window.encoding is not None:
+            self._update_compression_level(window.encoding, now - window.sent_at)
+
+    def _update_compression_level(self, encoding, ack_duration):
+        policy = self._compression_policy
+        level = policy.update(*encoding, ack_duration)
+        if level != self._frame_encoder.compression_level:
+            self._log(logging.DEBUG, f'Changing the compression level to {level}')
+            self._frame_encoder.compression_level = level
+            self._metrics.set('compression_level', level)
+        if policy.ratio is not None:
+            self._metrics.set('compression_ratio', policy.ratio)
+
+    def _assert_frame_type_is_ack(self, frame_type):
+        if frame_type == FRAME_TYPE_ACK:
+            return
+        if frame_type is None:
+            frame_type = 0  # connection closed
+
+        self._log(
+            logging.WARNING,
+            'Waited for ACK from server but received an unexpected frame: '
+            f'"0x{frame_type:02X}". Aborting.')
+        raise ConnectionException(f'No ACK received or wrong frame type "0x{frame_type:02X}"')
+
+
+class PyLogBeatClient(_PyLogBeatClientBase):
+
+    def __init__(self, *args, retry_policy=None, memory_budget=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._socket = None
+        self._memory_budget = memory_budget
+        self._retry_policy = retry_policy
+        self._keep_window_elements = retry_policy is not None
+        self._retry_attempt = 0
+        self._retry_started = 0
+        self._retry_acked_events = 0
+
+    def __enter__(self):
+        self._connect_with_retry()
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        try:
+            if type_ is None:
+                self.wait_for_acks()
+        finally:
+            self.close()
+
+    def connect(self):
+        if self._socket is not None:
+            return  # already connected
+
+        start = time.perf_counter()
+        self._create_and_connect_socket()
+        self._metrics.observe('connect', time.perf_counter() - start)
+
+        if self._ssl_enable:
+            start = time.perf_counter()
+            try:
+                self._setup_ssl_socket()
+            except Exception:
+                # do not keep the plain socket, the next connect() starts over
+                self._close_socket()
+                raise
+            self._metrics.observe('handshake', time.perf_counter() - start)
+        self._record_connected()
+
+    def _create_and_connect_socket(self):
+        if self._socket_options is not None:
+            addresses = socket.getaddrinfo(
+                self._host, self._port, self._socket_options.family, socket.SOCK_STREAM)
+            self._socket = _connect_happy_eyeballs(
+                addresses, self._socket_options, self._timeout)
+            self._socket.settimeout(self._timeout)
+            return
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            if self._timeout is not None:
+                sock.settimeout(self._timeout)
+            sock.connect((self._host, self._port))
+        except OSError:
+            # do not keep the unconnected socket, the next connect() starts over
+            sock.close()
+            raise
+        self._socket = sock
+
+    def _reconnect_if_idle(self):
+        if self._socket is not None and self._connection_idle():
+            self._log(logging.DEBUG, 'Reopening idle connection')
+            self.close()
+
+    def _setup_ssl_socket(self):
+        ssl_context = self._factor_ssl_context()
+        # resume the session of the previous connection to skip the full handshake
+        self._socket = ssl_context.wrap_socket(
+            self._socket, server_side=False, session=self._ssl_session)
+        if self._socket.session_reused:
+            self._metrics.increment('tls_resumptions')
+        self._ssl_session = self._socket.session
+
+    def close(self):
+        if self._socket is None:
+            return  # nothing to do
+
+        try:
+            self._close_socket()
+        finally:
+            self._discard_windows_in_flight()
+
+    def _close_socket(self):
+        if self._socket is None:
+            return  # closed after a failed connect or handshake
+
+        if self._ssl_enable:
+            # TLS 1.3 servers send session tickets after the handshake, take the latest one,
+            # the socket is a plain one if the handshake failed
+            self._ssl_session = getattr(self._socket, 'session', None) or self._ssl_session
+
+        try:
+            self._socket.shutdown(socket.SHUT_WR)
+        except Exception as exc:
+            self._log(logging.ERROR, f'Error on shutting down the transport socket: {exc}')
+
+        try:
+            self._socket.close()
+        except OSError as exc:
+            self._log(logging.ERROR, f'Error closing socket: {exc}', exc_info=True)
+        finally:
+            self._socket = None
+            self._ack_reader.clear()
+
+    def send(self, elements):
+        if self._validate:
+            self._validate_elements_sequence(elements)
+
+        self._reconnect_if_idle()
+        self._connect_with_retry()  # lazy init
+
+        self._send_windows(self._iter_encoded_windows(elements))
+
+    def send_iter(self, elements, window_size=None, window_bytes=None):
+        """
+        Send the messages of any iterable, consuming it lazily window by window
+
+        Windows are cut after `window_size` messages (by default the adaptive window size)
+        or once the encoded messages reach `window_bytes` bytes.
+        Return the number of sent events, windows and bytes.
+        """
+        windows = self._iter_stream_windows(elements, window_size, window_bytes)
+
+        self._reconnect_if_idle()
+        self._connect_with_retry()  # lazy init
+
+        return self._send_windows(windows)
+
+    def send_window(self, elements, first_index=0):
+        """
+        Send the messages of the sequence `elements` as one window without waiting for ACKs
+
+        This lets callers like `PyLogBeatMultiClient` distribute windows over several clients,
+        see `window_slot_available()`, `receive_acks()` and `wait_for_acks()`.
+        `first_index` is the index of the first message in error messages.
+        Return the number of sent events, windows and bytes.
+        """
+        self._reconnect_if_idle()
+        self._connect_with_retry()  # lazy init
+
+        return self._send_windows(
+            (self._factor_window(elements, first_index),), wait_for_slot=False)
+
+    def _connect_with_retry(self):
+        # a failing first connect is retried with the same backoff as a failing connection
+        try:
+            self.connect()
+        except (OSError, ConnectionException) as exc:
+            if self._retry_policy is None:
+                raise
+            self._reconnect_and_resend(exc)
+
+    def fileno(self):
+        # lets selectors wait for ACKs on the connection
+        return self._socket.fileno()
+
+    def pending(self):
+        # decrypted data buffered by the SSL layer does not make the socket readable
+        if isinstance(self._socket, ssl.SSLSocket):
+            return self._socket.pending()
+        return 0
+
+    def _send_windows(self, windows, wait_for_slot=True):
+        events = sent_windows = sent_bytes = 0
+        for window in windows:
+            if isinstance(window, Future):
+                window = self._wait_for_encoded_window(window)
+
+            window_size = self._window_size
+            # registered before writing, so a failed write is resent after reconnecting
+            self._register_window_in_flight()
+            self._reserve_window_memory(len(window))
+            try:
+                self._send_window(window)
+            except OSError as exc:
+                if self._retry_policy is None:
+                    raise
+                self._reconnect_and_resend(exc)
+            events += window_size
+            sent_windows += 1
+            sent_bytes += len(window)
+
+            # with pipelining, continue as soon as there is room for another window
+            if wait_for_slot:
+                self._wait_for_acks_until(self.window_slot_available)
+        return SendTotals(events, sent_windows, sent_bytes)
+
+    def wait_for_acks(self):
+        self._wait_for_acks_until(self._expected_ack_received)
+
+    def _wait_for_encoded_window(self, future):
+        start = time.perf_counter()
+        result = future.result()
+        return self._record_encoded_window_result(result, time.perf_counter() - start)
+
+    def _wait_for_acks_until(self, predicate):
+        if predicate():
+            return
+
+        start = time.perf_counter()
+        try:
+            while not predicate():
+                self.receive_acks()
+        finally:
+            self._metrics.observe('ack_wait', time.perf_counter() - start)
+
+    def receive_acks(self):
+        # read at least one ACK frame, reconnecting and resending with a retry policy
+        try:
+            self._read_ack()
+        except (OSError, ConnectionException) as exc:
+            self._metrics.increment('ack_failures')
+            if self._retry_policy is None:
+                raise
+            self._reconnect_and_resend(exc)
+
+    def _reconnect_and_resend(self, exc):
+        if self._acked_events != self._retry_acked_events:
+            # the server made progress since the last failure, start counting anew
+            self._retry_attempt = 0
+            self._retry_acked_events = self._acked_events
+        if self._retry_attempt == 0:
+            self._retry_started = time.monotonic()
+
+        self._close_socket()
+        while True:
+            delay = self._retry_policy.delay(self._retry_attempt)
+            elapsed = time.monotonic() - self._retry_started
+            if self._retry_policy.give_up(self._retry_attempt, elapsed, delay):
+                self._discard_windows_in_flight()
+                raise exc
+            self._retry_attempt += 1
+            self._log(
+                logging.WARNING,
+                f'Connection failed: {exc}, reconnecting in {delay:.2f} seconds '
+                f'(attempt {self._retry_attempt} of {self._retry_policy.max_attempts})')
+            time.sleep(delay)
+
+            try:
+                self.connect()
+                self._resend_windows_in_flight()
+                return
+            except (OSError, ConnectionException) as retry_exc:
+                self._close_socket()
+                exc = retry_exc
+
+    def _resend_windows_in_flight(self):
+        # the server discarded the windows with the connection, send all events it did not
+        # acknowledge again using their original sequence numbers
+        windows = list(self._windows_in_flight)
+        self._windows_in_flight.clear()
+        self._reinit_last_ack()
+        for window in windows:
+            elements = window.elements[window.acked:]
+            first_sequence = _next_sequence(window.last_sequence, 1 - len(elements))
+            payload = encode_window(
+                elements, first_sequence, self._serializer, self._compression_enable,
+                self._frame_encoder.compression_level,
+                compression_threshold=self._frame_encoder.compression_threshold)
+            resent_window = _Window(window.last_sequence, len(elements), elements)
+            resent_window.reserved_bytes = window.reserved_bytes
+            self._windows_in_flight.append(resent_window)
+            self._window_size = len(elements)
+            self._window_last_sequence = window.last_sequence
+            self._send_window(payload)
+            self._metrics.increment('events_resent', len(elements))
+
+    def _send_window(self, window):
+        # the window size and payload frames are encoded into one buffer and written together
+        start = time.perf_counter()
+        written_bytes = self._send_buffer(window)
+        self._record_window_sent(window, written_bytes, time.perf_counter() - start)
+        self._log(logging.DEBUG, f'Sent window size: {self._window_size}')
+        self._log(
+            logging.DEBUG,
+            f'Sent payload bytes: {written_bytes}, '
+            f'waiting for ACK: {self._window_last_sequence}')
+
+    def _send_buffer(self, buffer):
+        if isinstance(self._socket, ssl.SSLSocket):
+            return self._send_buffer_ssl(buffer)
+        # sendall() retries partial writes itself
+        self._socket.sendall(buffer)
+        return len(buffer)
+
+    def _send_buffer_ssl(self, buffer):
+        written_bytes = 0
+        # SSL and TLS channels must be segmented into records of no more than 16Kb
+        view = memoryview(buffer)
+        for offset in range(0, len(view), _TLS_RECORD_SIZE):
+            segment = view[offset:offset + _TLS_RECORD_SIZE]
+            self._socket.sendall(segment)
+            written_bytes += len(segment)
+        return written_bytes
+
+    def _read_ack(self):
+        # read until at least one complete frame arrived, then process all buffered frames
+        while not self._process_ack_frames():
+            if not self._ack_reader.read(self._socket):
+                self._assert_frame_type_is_ack(None)
+
+
+class AsyncPyLogBeatClient(_PyLogBeatClientBase):
+
+    def __init__(self, *args, receive_acks_concurrently=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._receive_acks_concurrently = receive_acks_concurrently
+        self._reader = None
+        self._writer = None
+        self._ack_receiver = None
+        self._ack_receiver_exception = None
+        self._ack_condition = asyncio.Condition()
+        # tasks sharing the client send and read ACKs one after another
+        self._send_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, type_, value, traceback):
+        try:
+            if type_ is None:
+                await self.wait_for_acks()
+        finally:
+            await self.close()
+
+    async def connect(self):
+        if self._writer is not None:
+            return  # already connected
+
+        ssl_context = self._factor_ssl_context() if self._ssl_enable else None
+        start = time.perf_counter()
+        if self._socket_options is None:
+            connection = asyncio.open_connection(self._host, self._port, ssl=ssl_context)
+        else:
+            sock = await self._create_and_connect_socket()
+            connection = asyncio.open_connection(
+                sock=sock, ssl=ssl_context,
+                server_hostname=self._host if ssl_context is not None else None)
+        self._reader, self._writer = await asyncio.wait_for(connection, self._timeout)
+        # asyncio performs the TLS handshake as part of the connection
+        self._metrics.observe('connect', time.perf_counter() - start)
+        self._record_connected()
+
+        self._ack_receiver_exception = None
+        if self._receive_acks_concurrently:
+            self._ack_receiver = asyncio.create_task(self._receive_acks())
+
+    async def _create_and_connect_socket(self):
+        # the options are applied before connecting as buffer sizes affect the TCP handshake,
+        # the blocking connect of the synchronous client runs in the default executor
+        loop = asyncio.get_running_loop()
+        addresses = await loop.getaddrinfo(
+            self._host, self._port, family=self._socket_options.family, type=socket.SOCK_STREAM)
+        return await loop.run_in_executor(
+            None, _connect_happy_eyeballs, addresses, self._socket_options, self._timeout)
+
+    async def _reconnect_if_idle(self):
+        if self._writer is not None and self._connection_idle():
+            self._log(logging.DEBUG, 'Reopening idle connection')
+            await self.close()
+
+    async def close(self):
+        if self._writer is None:
+            return  # nothing to do
+
+        if self._ack_receiver is not None:
+            self._ack_receiver.cancel()
+            try:
+                await self._ack_receiver
+            except asyncio.CancelledError:
+                pass
+            self._ack_receiver = None
+
+        writer = self._writer
+        self._reader = self._writer = None
+        try:
+            if writer.can_write_eof():
+                writer.write_eof()
+            writer.close()
+            await writer.wait_closed()
+        except (OSError, ssl.SSLError) as exc:
+            self._log(logging.ERROR, f'Error closing socket: {exc}', exc_info=True)
+        finally:
+            self._discard_windows_in_flight()
+
+    async def send(self, elements):
+        if self._validate:
+            self._validate_elements_sequence(elements)
+
+        async with self._send_lock:
+            await self._reconnect_if_idle()
+            await self.connect()  # lazy init
+
+            await self._send_windows(self._iter_encoded_windows(elements))
+
+    async def send_iter(self, elements, window_size=None, window_bytes=None):
+        # see PyLogBeatClient.send_iter(), `elements` must not be an asynchronous iterable
+        windows = self._iter_stream_windows(elements, window_size, window_bytes)
+
+        async with self._send_lock:
+            await self._reconnect_if_idle()
+            await self.connect()  # lazy init
+
+            return await self._send_windows(windows)
+
+    async def _send_windows(self, windows):
+        events = sent_windows = sent_bytes = 0
+        for window in windows:
+            if isinstance(window, Future):
+                start = time.perf_counter()
+                result = await asyncio.wrap_future(window)
+                window = self._record_encoded_window_result(result, time.perf_counter() - start)
+
+            window_size = self._window_size
+            # registered before writing, the concurrent receiver may get the ACK before drain()
+            self._register_window_in_flight()
+            start = time.perf_counter()
+            self._writer.write(window)
+            await asyncio.wait_for(self._writer.drain(), self._timeout)
+            self._record_window_sent(window, len(window), time.perf_counter() - start)
+            self._log(
+                logging.DEBUG,
+                f'Sent window size: {window_size}, '
+                f'payload bytes: {len(window)}, waiting for ACK: {self._window_last_sequence}')
+            events += window_size
+            sent_windows += 1
+            sent_bytes += len(window)
+
+            # with pipelining, continue as soon as there is room for another window
+            await self._wait_for_acks_until(self.window_slot_available)
+        return SendTotals(events, sent_windows, sent_bytes)
+
+    async def wait_for_acks(self):
+        async with self._send_lock:
+            await self._wait_for_acks_until(self._expected_ack_received)
+
+    async def _wait_for_acks_until(self, predicate):
+        if predicate():
+            return
+
+        start = time.perf_counter()
+        try:
+            await self._wait_for_acks_until_predicate(predicate)
+        except (OSError, ConnectionException):
+            self._metrics.increment('ack_failures')
+            raise
+        finally:
+            self._metrics.observe('ack_wait', time.perf_counter() - start)
+
+    async def _wait_for_acks_until_predicate(self, predicate):
+        if self._ack_receiver is None:
+            while not predicate():
+                await self._read_ack()
+            return
+
+        async with self._ack_condition:
+            await asyncio.wait_for(
+                self._ack_condition.wait_for(
+                    lambda: predicate() or self._ack_receiver_exception is not None),
+                self._timeout)
+        if not predicate():
+            raise self._ack_receiver_exception
+
+    async def _receive_acks(self):
+        try:
+            while True:
+                await self._read_ack()
+                async with self._ack_condition:
+                    self._ack_condition.notify_all()
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            # hand the error over to the waiting senders
+            self._ack_receiver_exception = exc
+            async with self._ack_condition:
+                self._ack_condition.notify_all()
+
+    async def _read_ack(self):
+        # read until at least one complete frame arrived, then process all buffered frames
+        while not self._process_ack_frames():
+            # leave room for an incomplete frame still in the buffer
+            data = await asyncio.wait_for(
+                self._reader.read(_ACK_READER_BUFFER_SIZE - _FRAME_HEADER.size), self._timeout)
+            if not data:
+                self._assert_frame_type_is_ack(None)
+            self._ack_reader.feed(data)
+
+
+def _share_ssl_context(kwargs):
+    if kwargs.get('ssl_enable') and kwargs.get('ssl_context') is None:
+        # share one context between all connections instead of loading the certificates for each
+        kwargs['ssl_context'] = factor_ssl_context(**{
+            name: kwargs[name] for name in (
+                'ssl_verify', 'ssl_verify_flags', 'keyfile', 'certfile', 'ca_certs')
+            if name in kwargs})
+
+
+def _select_clients_with_acks(clients, timeout):
+    # wait until any of the clients with windows in flight received data
+    waiting_clients = [client for client in clients if client.windows_in_flight]
+    pending_clients = [client for client in waiting_clients if client.pending()]
+    if pending_clients:
+        return pending_clients
+
+    with selectors.DefaultSelector() as selector:
+        for client in waiting_clients:
+            selector.register(client, selectors.EVENT_READ)
+        ready = selector.select(timeout)
+    if not ready:
+        # let the socket timeout and retry policy of a waiting connection handle it
+        return waiting_clients[:1]
+    return [key.fileobj for key, _ in ready]
+
+
+def _factor_connection(host, port, kwargs):
+    if kwargs.get('compression_policy') is not None:
+        # each connection adapts its own compression level
+        kwargs = dict(kwargs, compression_policy=copy.copy(kwargs['compression_policy']))
+    return PyLogBeatClient(host, port, **kwargs)
+
+
+class _PoolWindow:
+
+    __slots__ = ('elements', 'first_index', 'acked_offset', 'sent_at')
+
+    def __init__(self, elements, first_index, acked_offset):
+        self.elements = elements
+        self.first_index = first_index
+        # the window is complete once the client acknowledged this many events plus its size
+        self.acked_offset = acked_offset
+        self.sent_at = time.monotonic()
+
+    def acked(self, acked_events):
+        return min(max(acked_events - self.acked_offset, 0), len(self.elements))
+
+    def is_complete(self, acked_events):
+        return self.acked(acked_events) == len(self.elements)
+
+
+class _PoolNode:
+
+    __slots__ = ('client', 'endpoint', 'failures', 'available_at', 'windows')
+
+    def __init__(self, client, endpoint):
+        self.client = client
+        self.endpoint = endpoint
+        self.failures = 0
+        self.available_at = 0
+        self.windows = deque()  # windows of the current send() awaiting their ACK
+
+    def is_available(self, now):
+        return self.available_at <= now
+
+
+class PyLogBeatPoolClient(_LoggingMixin):
+    """Spread windows over multiple Beats servers with one connection per server"""
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self,
+            endpoints,
+            strategy=POOL_STRATEGY_ROUND_ROBIN,
+            failure_backoff=1.0,
+            max_failure_backoff=60.0,
+            slow_threshold=None,
+            **kwargs):
+        if not endpoints:
+            raise ValueError('At least one endpoint is required')
+        if strategy not in (POOL_STRATEGY_ROUND_ROBIN, POOL_STRATEGY_LEAST_PENDING):
+            raise ValueError(f'Unknown pool strategy "{strategy}"')
+
+        self._strategy = strategy
+        self._failure_backoff = failure_backoff
+        self._max_failure_backoff = max_failure_backoff
+        self._slow_threshold = slow_threshold
+        self._timeout = kwargs.get('timeout')
+        self._validate = kwargs.get('validate', True)
+        self._use_logging = kwargs.get('use_logging', False)
+        _share_ssl_context(kwargs)
+        self._nodes = [
+            _PoolNode(_factor_connection(host, port, kwargs), (host, port))
+            for host, port in endpoints]
+        self._next_node_index = 0
+        self._failed_windows = deque()
+        self._last_exception = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        try:
+            if type_ is None:
+                self.wait_for_acks()
+        finally:
+            self.close()
+
+    def connect(self):
+        # connect all nodes which are not in backoff, failures take the node out of rotation
+        now = time.monotonic()
+        for node in self._nodes:
+            if node.is_available(now):
+                try:
+                    node.client.connect()
+                except (OSError, ConnectionException) as exc:
+                    self._mark_node_failed(node, exc)
+
+    def close(self):
+        for node in self._nodes:
+            node.client.close()
+
+    def wait_for_acks(self):
+        for node in self._nodes:
+            try:
+                node.client.wait_for_acks()
+            except (OSError, ConnectionException) as exc:
+                self._mark_node_failed(node, exc)
+
+    @property
+    def serializer(self):
+        return self._nodes[0].client.serializer
+
+    @property
+    def available_endpoints(self):
+        now = time.monotonic()
+        return [node.endpoint for node in self._nodes if node.is_available(now)]
+
+    def send(self, elements):
+        if self._validate:
+            _check_elements_sequence(elements)
+        if not isinstance(elements, Sequence):
+            elements = list(elements)  # windows are cut by slicing
+
+        self._failed_windows.clear()
+        self._last_exception = None
+        for node in self._nodes:
+            node.windows.clear()
+
+        # each window goes to the next node with room for it, the events of failed windows
+        # which have not been acknowledged are sent again to other nodes
+        next_index = 0
+        while next_index < len(elements) or self._failed_windows or self._windows_pending():
+            node = None
+            if next_index < len(elements) or self._failed_windows:
+                node = self._select_node()
+                if node is None and not self._windows_pending():
+                    raise ConnectionException(
+                        'Sending failed, no endpoint available '
+                        f'(last error: {self._last_exception})')
+            if node is None:
+                self._receive_acks()
+            elif self._failed_windows:
+                self._send_window(node, *self._failed_windows.popleft())
+            else:
+                window_elements = elements[next_index:next_index + node.client.window_size]
+                self._send_window(node, window_elements, next_index)
+                next_index += len(window_elements)
+
+    def _windows_pending(self):
+        return any(node.windows for node in self._nodes)
+
+    def _select_node(self):
+        now = time.monotonic()
+        node_count = len(self._nodes)
+        # start after the last used node for round robin and as tie breaker for the least
+        # pending ACKs
+        nodes = [
+            self._nodes[(self._next_node_index + offset) % node_count]
+            for offset in range(node_count)]
+        nodes = [
+            node for node in nodes
+            if node.is_available(now) and node.client.window_slot_available()]
+        if not nodes:
+            return None
+        if self._strategy == POOL_STRATEGY_LEAST_PENDING:
+            nodes.sort(key=lambda node: node.client.windows_in_flight)
+        self._next_node_index = (self._nodes.index(nodes[0]) + 1) % node_count
+        return nodes[0]
+
+    def _send_window(self, node, elements, first_index):
+        # events of earlier windows still in flight are acknowledged first
+        client = node.client
+        node.windows.append(
+            _PoolWindow(elements, first_index, client.acked_events + client.unacked_events))
+        try:
+            client.send_window(elements, first_index)
+        except (OSError, ConnectionException) as exc:
+            self._mark_node_failed(node, exc)
+
+    def _receive_acks(self):
+        nodes = {node.client: node for node in self._nodes if node.windows}
+        for client in _select_clients_with_acks(list(nodes), self._timeout):
+            node = nodes[client]
+            try:
+                client.receive_acks()
+            except (OSError, ConnectionException) as exc:
+                self._mark_node_failed(node, exc)
+                continue
+
+            now = time.monotonic()
+            while node.windows and node.windows[0].is_complete(client.acked_events):
+                self._mark_node_succeeded(node, now - node.windows.popleft().sent_at)
+
+    def _mark_node_failed(self, node, exc):
+        # the node acknowledged the leading events of its windows, the rest goes to other nodes
+        for window in node.windows:
+            acked = window.acked(node.client.acked_events)
+            if acked < len(window.elements):
+                self._failed_windows.append(
+                    (window.elements[acked:], window.first_index + acked))
+        node.windows.clear()
+        self._last_exception = exc
+
+        node.client.close()
+        node.failures += 1
+        self._take_node_out_of_rotation(node, f'failed ({exc})')
+
+    def _mark_node_succeeded(self, node, duration):
+        node.failures = 0
+        if self._slow_threshold is not None and duration > self._slow_threshold:
+            node.failures += 1
+            self._take_node_out_of_rotation(node, f'is slow ({duration:.3f}s)')
+
+    def _take_node_out_of_rotation(self, node, reason):
+        backoff = min(
+            self._failure_backoff * 2 ** (node.failures - 1),
+            self._max_failure_backoff)
+        node.available_at = time.monotonic() + backoff
+        host, port = node.endpoint
+        self._log(
+            logging.WARNING,
+            f'Endpoint {host}:{port} {reason}, taking it out of rotation for {backoff:.1f}s')
+
+
+class PyLogBeatMultiClient(_LoggingMixin):
+    """
+    Send windows over multiple connections to the same Beats server in parallel
+
+    Each window is sent on the next connection with room for another window, so the
+    server can process the windows of all connections at the same time.
+    Every connection keeps its own sequence numbers and windows in flight.
+    """
+
+    def __init__(self, host, port, connections=2, **kwargs):
+        if connections < 1:
+            raise ValueError('connections must be at least 1')
+        if kwargs.get('executor') is not None:
+            raise ValueError('executor is not supported with multiple connections')
+
+        self._timeout = kwargs.get('timeout')
+        self._validate = kwargs.get('validate', True)
+        self._use_logging = kwargs.get('use_logging', False)
+        _share_ssl_context(kwargs)
+        self._clients = [_factor_connection(host, port, kwargs) for _ in range(connections)]
+        self._next_client_index = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        try:
+            if type_ is None:
+                self.wait_for_acks()
+        finally:
+            self.close()
+
+    def connect(self):
+        for client in self._clients:
+            client.connect()
+
+    def close(self):
+        for client in self._clients:
+            client.close()
+
+    def wait_for_acks(self):
+        for client in self._clients:
+            client.wait_for_acks()
+
+    @property
+    def serializer(self):
+        return self._clients[0].serializer
+
+    @property
+    def windows_in_flight(self):
+        return sum(client.windows_in_flight for client in self._clients)
+
+    @property
+    def acked_events(self):
+        return sum(client.acked_events for client in self._clients)
+
+    def send(self, elements):
+        if self._validate:
+            _check_elements_sequence(elements)
+
+        self.connect()  # lazy init
+
+        iterator = iter(elements)
+        first_index = 0
+        while True:
+            client = self._wait_for_idle_client()
+            window_elements = list(islice(iterator, client.window_size))
+            if not window_elements:
+                break
+            client.send_window(window_elements, first_index)
+            first_index += len(window_elements)
+
+        # like PyLogBeatClient.send(), return once each connection has room for another window,
+        # i.e. after all windows have been acknowledged without pipelining
+        while busy_clients := [
+                client for client in self._clients if not client.window_slot_available()]:
+            for client in _select_clients_with_acks(busy_clients, self._timeout):
+                client.receive_acks()
+
+    def _wait_for_idle_client(self):
+        client_count = len(self._clients)
+        while True:
+            # start after the last used connection to spread the windows if several are idle
+            for offset in range(client_count):
+                index = (self._next_client_index + offset) % client_count
+                client = self._clients[index]
+                if client.window_slot_available():
+                    self._next_client_index = (index + 1) % client_count
+                    return client
+            for client in _select_clients_with_acks(self._clients, self._timeout):
+                client.receive_acks()
+
+
+class _FlushRequest:
+
+    __slots__ = ('done', 'stop')
+
+    def __init__(self, stop=False):
+        self.done = threading.Event()
+        self.stop = stop
+
+
+class _EventQueue(queue.Queue):
+    """Queue which can make room for a new event by dropping the oldest queued event"""
+
+    def __init__(self, maxsize=0, on_drop=None):
+        super().__init__(maxsize)
+        self.dropped_items = 0
+        self._on_drop = on_drop
+
+    def put_dropping_oldest(self, item):
+        # return whether the item has been queued, it is dropped if only flush requests are queued
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                for index, queued_item in enumerate(self.queue):
+                    if not isinstance(queued_item, _FlushRequest):
+                        del self.queue[index]
+                        self.dropped_items += 1
+                        if self._on_drop is not None:
+                            self._on_drop(queued_item)
+                        break
+                else:
+                    return False
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+            return True
+
+
+class BufferedPyLogBeatClient(_LoggingMixin):
+    """Collect single events in a bounded queue and send them in batches from a background thread"""
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self,
+            client,
+            max_batch_size=1000,
+            max_batch_bytes=1024 * 1024,
+            max_latency=1.0,
+            queue_size=10000,
+            use_logging=False,
+            overflow_policy=OVERFLOW_DROP_NEWEST,
+            memory_budget=None):
+        if overflow_policy not in (OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST):
+            raise ValueError(f'Unknown overflow policy "{overflow_policy}"')
+
+        self._client = client
+        self._serializer = client.serializer
+        self._max_batch_size = max_batch_size
+        self._max_batch_bytes = max_batch_bytes
+        self._max_latency = max_latency
+        self._use_logging = use_logging
+        self._overflow_policy = overflow_policy
+        self._memory_budget = memory_budget
+        self._queue = _EventQueue(maxsize=queue_size, on_drop=self._release_event_memory)
+        self._dropped_events = 0
+        self._failed_events = 0
+        self._closed = False
+        self._sender = threading.Thread(
+            target=self._run_sender, name='pylogbeat-sender', daemon=True)
+        self._sender.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    @property
+    def dropped_events(self):
+        # total of the events dropped because the queue was full
+        return self._dropped_events + self._queue.dropped_items
+
+    @property
+    def dropped_oldest_events(self):
+        # queued events dropped to make room for newer ones
+        return self._queue.dropped_items
+
+    @property
+    def failed_events(self):
+        return self._failed_events
+
+    def emit(self, event):
+        # return whether the event has been queued
+        if not isinstance(event, (str, bytes, Mapping, TemplateEvent)):
+            raise TypeError(
+                f'Passed value has type "{type(event)}" but a mapping, '
+                'bytes or string object is expected')
+        if self._closed:
+            raise ConnectionException('Client has been closed')
+
+        if self._memory_budget is not None:
+            # the size is known only once encoded, so encode here instead of in the sender
+            event = self._encode_event(event)
+            if not self._memory_budget.reserve(len(event)):
+                self._dropped_events += 1
+                return False
+
+        if self._queue_event(event):
+            return True
+        self._release_event_memory(event)
+        self._dropped_events += 1
+        return False
+
+    def _queue_event(self, event):
+        if self._overflow_policy == OVERFLOW_BLOCK:
+            self._queue.put(event)
+            return True
+
+        if self._overflow_policy == OVERFLOW_DROP_OLDEST:
+            return self._queue.put_dropping_oldest(event)
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+    def _release_event_memory(self, event):
+        # queued events are charged until the sender takes them, then their windows are
+        if self._memory_budget is not None:
+            self._memory_budget.release(len(event))
+
+    def flush(self, timeout=None):
+        if self._closed:
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout=None):
+        if self._closed:
+            return
+        self._closed = True
+
+        self._queue.put(_FlushRequest(stop=True))
+        self._sender.join(timeout)
+        if self._sender.is_alive():
+            # the client must not be used concurrently, the sender closes it once done
+            self._log(
+                logging.WARNING,
+                f'Sending queued events did not finish within {timeout} seconds, '
+                'continuing in the background')
+
+    def _run_sender(self):
+        stop = False
+        while not stop:
+            batch, request = self._collect_batch()
+            if batch:
+                self._send_batch(batch)
+            if request is not None:
+                stop = request.stop
+                request.done.set()
+        self._close_client()
+
+    def _close_client(self):
+        try:
+            self._client.wait_for_acks()
+        except (OSError, ConnectionException) as exc:
+            self._log(logging.ERROR, f'Error waiting for outstanding ACKs: {exc}')
+        finally:
+            self._client.close()
+
+    def _collect_batch(self):
+        item = self._queue.get()
+        batch = []
+        batch_bytes = 0
+        deadline = time.monotonic() + self._max_latency
+        while True:
+            if isinstance(item, _FlushRequest):
+                return batch, item
+
+            self._release_event_memory(item)
+            try:
+                encoded_event = self._encode_event(item)
+            except (TypeError, ValueError) as exc:
+                # skip the event, the sender thread must keep running for all other events
+                self._failed_events += 1
+                self._log(logging.ERROR, f'Error encoding event: {exc}')
+            else:
+                batch.append(encoded_event)
+                batch_bytes += len(encoded_event)
+                if len(batch) >= self._max_batch_size or batch_bytes >= self._max_batch_bytes:
+                    return batch, None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return batch, None
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, None
+
+    def _encode_event(self, event):
+        # encode in the sender thread once, the client passes bytes through unchanged
+        return _encode_element(event, self._serializer)
+
+    def _send_batch(self, batch):
+        try:
+            self._client.send(batch)
+        except (OSError, ConnectionException) as exc:
+            self._failed_events += len(batch)
+            self._log(logging.ERROR, f'Error sending {len(batch)} events: {exc}')
+            self._client.close()  # reconnect on the next batch
+
+
+class PyLogBeatHandler(logging.Handler):
+    """
+    Logging handler queuing records as ECS-style events to send them from a background thread
+
+    `emit()` never waits for the network, the records are passed to a
+    `BufferedPyLogBeatClient` which sends them in batches through `client`.
+    """
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self,
+            client,
+            level=logging.NOTSET,
+            service_name=None,
+            static_fields=None,
+            overflow_policy=OVERFLOW_DROP_NEWEST,
+            flush_timeout=5.0,
+            **kwargs):
+        super().__init__(level)
+        self._flush_timeout = flush_timeout
+        self._template = self._factor_template(service_name, static_fields)
+        self._timestamp_cache = (None, None)  # second and its formatted date and time
+        self._buffered_client = BufferedPyLogBeatClient(
+            client, overflow_policy=overflow_policy, **kwargs)
+
+    @staticmethod
+    def _factor_template(service_name, static_fields):
+        # fields which are the same for all events are computed once
+        template = {
+            'ecs': {'version': ECS_VERSION},
+            'host': {'hostname': socket.gethostname()},
+        }
+        if service_name is not None:
+            template['service'] = {'name': service_name}
+        if static_fields:
+            template.update(static_fields)
+        return template
+
+    @property
+    def dropped_events(self):
+        return self._buffered_client.dropped_events
+
+    @property
+    def failed_events(self):
+        return self._buffered_client.failed_events
+
+    def emit(self, record):
+        try:
+            self._buffered_client.emit(self.format_event(record))
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+
+    def format_event(self, record):
+        """Convert a log record into an ECS-style dict"""
+        event = self._template.copy()
+        event['@timestamp'] = self._format_timestamp(record)
+        event['message'] = record.getMessage()
+        event['log'] = {
+            'level': record.levelname,
+            'logger': record.name,
+            'origin': {
+                'file': {'name': record.filename, 'line': record.lineno},
+                'function': record.funcName,
+            },
+        }
+        event['process'] = {
+            'pid': record.process,
+            'name': record.processName,
+            'thread': {'id': record.thread, 'name': record.threadName},
+        }
+        # exc_info=True outside of an exception handler results in (None, None, None)
+        if record.exc_info and record.exc_info[0] is not None:
+            exc_type, exc_value = record.exc_info[:2]
+            if not record.exc_text:
+                formatter = self.formatter or _DEFAULT_FORMATTER
+                record.exc_text = formatter.formatException(record.exc_info)
+            event['error'] = {
+                'type': exc_type.__name__,
+                'message': str(exc_value),
+                'stack_trace': record.exc_text,
+            }
+        labels = {
+            key: value if isinstance(value, (str, int, float, bool)) else str(value)
+            for key, value in vars(record).items()
+            if key not in _LOG_RECORD_ATTRIBUTES}
+        if labels:
+            event['labels'] = labels
+        return event
+
+    def _format_timestamp(self, record):
+        # consecutive records are mostly logged within the same second
+        second = int(record.created)
+        cached_second, prefix = self._timestamp_cache
+        if second != cached_second:
+            prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            self._timestamp_cache = (second, prefix)
+        return f'{prefix}.{int(record.msecs):03d}Z'
+
+    def flush(self):
+        self._buffered_client.flush(self._flush_timeout)
+
+    def close(self):
+        try:
+            self._buffered_client.close(self._flush_timeout)
+        finally:
+            super().close()
+
+
+class DiskSpool:
+    """
+    Append-only queue of encoded events stored in segment files
+
+    Records are read back through memory maps and the position of the first not acknowledged
+    record is persisted, so pending events survive restarts. Segments which have been
+    acknowledged completely are deleted.
+    With `max_bytes`, `append()` raises `SpoolFullException` instead of letting the pending
+    records grow beyond that size.
+    """
+
+    def __init__(self, directory, segment_size=SPOOL_SEGMENT_SIZE, fsync=False, max_bytes=None):
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError('max_bytes must be at least 1')
+
+        self._directory = directory
+        self._segment_size = segment_size
+        self._fsync = fsync
+        self._max_bytes = max_bytes
+        self._segments = []
+        self._read_segment = 0
+        self._read_offset = 0
+        self._peeked_ends = []
+        self._pending_events = 0
+        self._pending_bytes = 0
+        self._append_file = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def pending_events(self):
+        return self._pending_events
+
+    @property
+    def pending_bytes(self):
+        # bytes of the records not acknowledged yet, including their headers
+        return self._pending_bytes
+
+    def _segment_path(self, segment):
+        return os.path.join(self._directory, f'{segment:016x}{_SPOOL_SEGMENT_SUFFIX}')
+
+    def _load(self):
+        self._segments = sorted(
+            int(filename[:-len(_SPOOL_SEGMENT_SUFFIX)], 16)
+            for filename in os.listdir(self._directory)
+            if filename.endswith(_SPOOL_SEGMENT_SUFFIX))
+
+        state_path = os.path.join(self._directory, _SPOOL_STATE_FILENAME)
+        if os.path.exists(state_path):
+            with open(state_path, 'rb') as state_file:
+                self._read_segment, self._read_offset = _SPOOL_STATE.unpack(state_file.read())
+        elif self._segments:
+            self._read_segment, self._read_offset = self._segments[0], 0
+
+        # drop segments acknowledged before a crash prevented their removal
+        while self._segments and self._segments[0] < self._read_segment:
+            os.remove(self._segment_path(self._segments.pop(0)))
+        if not self._segments:
+            self._segments.append(self._read_segment)
+        if self._segments[0] != self._read_segment:
+            self._read_segment, self._read_offset = self._segments[0], 0
+
+        for segment in self._segments:
+            offset = self._read_offset if segment == self._read_segment else 0
+            records, size = self._count_records(segment, offset)
+            self._pending_events += records
+            self._pending_bytes += size
+
+        self._open_append_file()
+
+    def _open_append_file(self):
+        # kept open for appending until the segment is rotated or the spool is closed
+        # pylint: disable-next=consider-using-with
+        self._append_file = open(self._segment_path(self._segments[-1]), 'ab')
+
+    def _count_records(self, segment, offset):
+        # return the number and size of the complete records from `offset` on
+        path = self._segment_path(segment)
+        if not os.path.exists(path):
+            return 0, 0
+
+        start = offset
+        records = 0
+        with open(path, 'r+b') as segment_file:
+            size = os.fstat(segment_file.fileno()).st_size
+            if size > 0:
+                with mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                    while offset + _SPOOL_RECORD_HEADER.size <= size:
+                        length = _SPOOL_RECORD_HEADER.unpack_from(mapping, offset)[0]
+                        if offset + _SPOOL_RECORD_HEADER.size + length > size:
+                            break
+                        offset += _SPOOL_RECORD_HEADER.size + length
+                        records += 1
+            if offset < size:
+                # cut off a record which was only partially written before a crash
+                segment_file.truncate(offset)
+        return records, offset - start
+
+    def append(self, payloads):
+        size = sum(_SPOOL_RECORD_HEADER.size + len(payload) for payload in payloads)
+        if self._max_bytes is not None and self._pending_bytes + size > self._max_bytes:
+            raise SpoolFullException(
+                f'Storing {len(payloads)} events ({size} bytes) would exceed the spool limit '
+                f'of {self._max_bytes} bytes, {self._pending_bytes} bytes are pending')
+
+        append_file = self._append_file
+        for payload in payloads:
+            append_file.write(_SPOOL_RECORD_HEADER.pack(len(payload)))
+            append_file.write(payload)
+        append_file.flush()
+        if self._fsync:
+            os.fsync(append_file.fileno())
+        self._pending_events += len(payloads)
+        self._pending_bytes += size
+
+        if append_file.tell() >= self._segment_size:
+            self._rotate()
+
+    def _rotate(self):
+        self._append_file.close()
+        self._segments.append(self._segments[-1] + 1)
+        self._open_append_file()
+
+    def peek(self, max_records):
+        """Return up to `max_records` pending records of the current segment as memoryviews"""
+        self._peeked_ends = []
+        while True:
+            path = self._segment_path(self._read_segment)
+            size = os.path.getsize(path)
+            if size > self._read_offset:
+                break
+            if not self._advance_segment():
+                return []
+
+        with open(path, 'rb') as segment_file:
+            mapping = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapping)
+        records = []
+        offset = self._read_offset
+        while len(records) < max_records and offset + _SPOOL_RECORD_HEADER.size <= size:
+            start = offset + _SPOOL_RECORD_HEADER.size
+            end = start + _SPOOL_RECORD_HEADER.unpack_from(view, offset)[0]
+            records.append(view[start:end])
+            self._peeked_ends.append(end)
+            offset = end
+        # the memory map is closed once the caller released all records
+        return records
+
+    def commit(self, records):
+        """Mark the first `records` records of the last peek() as acknowledged"""
+        if records:
+            read_offset = self._peeked_ends[records - 1]
+            self._pending_bytes -= read_offset - self._read_offset
+            self._read_offset = read_offset
+            self._pending_events -= records
+        self._peeked_ends = []
+
+        if self._read_offset >= os.path.getsize(self._segment_path(self._read_segment)):
+            self._advance_segment()
+        self._save_state()
+
+    def _advance_segment(self):
+        # continue with the next segment once the current one is complete, except the active one
+        if self._read_segment == self._segments[-1]:
+            return False
+
+        os.remove(self._segment_path(self._read_segment))
+        self._segments.pop(0)
+        self._read_segment, self._read_offset = self._segments[0], 0
+        return True
+
+    def _save_state(self):
+        state_path = os.path.join(self._directory, _SPOOL_STATE_FILENAME)
+        temporary_path = f'{state_path}.tmp'
+        with open(temporary_path, 'wb') as state_file:
+            state_file.write(_SPOOL_STATE.pack(self._read_segment, self._read_offset))
+            if self._fsync:
+                state_file.flush()
+                os.fsync(state_file.fileno())
+        os.replace(temporary_path, state_path)
+
+    def close(self):
+        if self._append_file is not None:
+            self._append_file.close()
+            self._append_file = None
+
+
+class SpooledPyLogBeatClient(_LoggingMixin):
+    """Store events in a DiskSpool before sending them, for at-least-once delivery"""
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self,
+            client,
+            directory,
+            segment_size=SPOOL_SEGMENT_SIZE,
+            fsync=False,
+            replay_batch_size=WINDOW_SIZE_MAX * 4,
+            use_logging=False,
+            max_bytes=None):
+        self._client = client
+        self._serializer = client.serializer
+        self._spool = DiskSpool(directory, segment_size, fsync, max_bytes)
+        self._replay_batch_size = replay_batch_size
+        self._use_logging = use_logging
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    @property
+    def pending_events(self):
+        return self._spool.pending_events
+
+    def send(self, elements):
+        # encode and check all events before anything is stored
+        payloads = [self._encode_event(index, element) for index, element in enumerate(elements)]
+        try:
+            self._spool.append(payloads)
+        except SpoolFullException:
+            # sending the pending events makes room, unless the server is not reachable
+            self.flush()
+            self._spool.append(payloads)
+        return self.flush()
+
+    def _encode_event(self, index, event):
+        try:
+            return _encode_element(event, self._serializer)
+        except TypeError as exc:
+            raise _factor_element_error(exc, event, index) from exc
+
+    def flush(self):
+        """Send pending events, return whether all of them have been acknowledged"""
+        while self._spool.pending_events:
+            records = self._spool.peek(self._replay_batch_size)
+            if not records:
+                break
+
+            acked_events_before = self._client.acked_events
+            try:
+                self._client.send(records)
+                self._client.wait_for_acks()
+            except (OSError, ConnectionException) as exc:
+                acked_records = self._client.acked_events - acked_events_before
+                del records
+                self._spool.commit(acked_records)
+                self._log(
+                    logging.WARNING,
+                    f'Sending spooled events failed, {self.pending_events} events remain '
+                    f'in the spool: {exc}')
+                self._client.close()
+                return False
+
+            acked_records = len(records)
+            del records
+            self._spool.commit(acked_records)
+        return True
+
+    def close(self):
+        self._spool.close()
+        self._client.close()
+
+
+class PyLogBeatServer(_LoggingMixin):
+    """
+    Receive events from Beats protocol clients and pass them in batches to `callback`
+
+    The callback is called with a list of decoded events for each window, or for each
+    `batch_size` events of larger windows. Once it returned, the events are acknowledged.
+    The callback can also be a coroutine function. If it raises an exception,
+    the connection is closed without acknowledging the events, so the client resends them.
+    """
+
+    def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
+            self,
+            host,
+            port,
+            callback,
+            batch_size=None,
+            ssl_context=None,
+            deserializer=None,
+            use_logging=False):
+        if batch_size is not None and batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+
+        self._host = host
+        self._port = port
+        self._callback = callback
+        self._batch_size = batch_size
+        self._ssl_context = ssl_context
+        self._deserializer = deserializer or factor_deserializer()
+        self._use_logging = use_logging
+        self._server = None
+        self._connections = {}  # handler task of each open connection and its writer
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, type_, value, traceback):
+        await self.close()
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server is not None else ()
+
+    async def start(self):
+        if self._server is not None:
+            return  # already started
+
+        self._server = await asyncio.start_server(
+            self._handle_connection, self._host, self._port, ssl=self._ssl_context)
+
+    async def serve_forever(self):
+        await self.start()
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is None:
+            return  # nothing to do
+
+        server = self._server
+        self._server = None
+        server.close()
+        # Server.wait_closed() does not wait for the connection handlers before Python 3.12,
+        # closing the connections lets the handlers finish
+        tasks = list(self._connections)
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        decoder = FrameDecoder(self._deserializer)
+        batch = []
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while data := await reader.read(_SERVER_READ_SIZE):
+                decoder.feed(data)
+                for sequence, event in decoder.decode():
+                    batch.append(event)
+                    if decoder.window_remaining and len(batch) != self._batch_size:
+                        continue
+                    await self._dispatch_batch(batch)
+                    # a partial ACK unless the window is complete
+                    writer.write(_FRAME_HEADER.pack(PROTOCOL_VERSION, FRAME_TYPE_ACK, sequence))
+                    batch = []
+                await writer.drain()
+        except (OSError, ValueError, zlib.error) as exc:
+            self._log(logging.WARNING, f'Closing connection from {peer}: {exc}')
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            self._log(
+                logging.ERROR, f'Closing connection from {peer}, processing events failed: {exc}')
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+            finally:
+                del self._connections[task]
+
+    async def _dispatch_batch(self, batch):
+        result = self._callback(batch)
+        if asyncio.iscoroutine(result):
+            await result
@@ -15,3 +15,13 @@ class BaseTestCase(unittest.TestCase):
 
         # provide a mocked logger for easy use
         self._mocked_logger = mock.MagicMock(spec=logging)
+
+    def _mock_recv_into(self, mocked_socket, responses):
+        # each recv_into() call returns the next response, an empty one once all are consumed
+        responses = iter(responses)
+
+        def recv_into(buffer, *_args):
+            data = next(responses, None) or b''
+            buffer[:len(data)] = data
+            return len(data)
+        mocked_socket.recv_into.side_effect = recv_into
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+"""
+Compare the frame encoder against the previous per-event pack() and b''.join() encoding
+and serializing complete events against events based on an EventTemplate.
+Templates are faster with the json module only, with orjson they are slower than dicts.
+
+Run with: python -m tests.benchmark.encoder_benchmark
+"""
+
+from functools import partial
+from struct import pack
+import argparse
+import json
+import timeit
+
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+# the fields of MESSAGE which are the same for all events of a program
+STATIC_FIELDS = ('@version', 'host', 'logsource', 'pid', 'program', 'type')
+
+
+def encode_legacy(elements):
+    payload_elements = []
+    for sequence, element in enumerate(elements, start=1):
+        if isinstance(element, dict):
+            element = json.dumps(element).encode(pylogbeat.PAYLOAD_CHARSET)
+        elif isinstance(element, str):
+            element = element.encode(pylogbeat.PAYLOAD_CHARSET)
+        json_length = len(element)
+        frame = [
+            pylogbeat.PROTOCOL_VERSION, pylogbeat.FRAME_TYPE_JSON_FRAME,
+            sequence, json_length, element]
+        payload_elements.append(pack(f'>BBII{json_length}s', *frame))
+    return b''.join(payload_elements)
+
+
+def encode_frame_encoder(elements, serializer=None):
+    encoder = pylogbeat.FrameEncoder(serializer, compression_enable=False)
+    for sequence, element in enumerate(elements, start=1):
+        encoder.add(sequence, element)
+    return encoder.take()
+
+
+def measure(name, function, elements, repeat):
+    duration = min(timeit.repeat(
+        lambda: function(elements), number=1, repeat=repeat))
+    print(f'{name:>14}: {len(elements) / duration:12,.0f} events/s')
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--serializer', help='JSON library for the template comparison, by default the fastest')
+    arguments = parser.parse_args()
+
+    # pre-serialized events isolate the framing cost from json.dumps()
+    elements = [json.dumps(MESSAGE).encode(pylogbeat.PAYLOAD_CHARSET)] * arguments.events
+    # the frame encoder additionally prepends the window size frame
+    assert encode_legacy(elements) == encode_frame_encoder(elements)[6:]
+
+    legacy = measure('legacy', encode_legacy, elements, arguments.repeat)
+    frame_encoder = measure('frame_encoder', encode_frame_encoder, elements, arguments.repeat)
+    print(f'{"speedup":>14}: {legacy / frame_encoder:12.2f}x')
+
+    serializer = pylogbeat.factor_serializer(library=arguments.serializer)
+    encode = partial(encode_frame_encoder, serializer=serializer)
+    template = pylogbeat.EventTemplate(
+        {name: MESSAGE[name] for name in STATIC_FIELDS}, serializer)
+    fields = {name: value for name, value in MESSAGE.items() if name not in STATIC_FIELDS}
+    dicts = measure('dict', encode, [MESSAGE] * arguments.events, arguments.repeat)
+    templates = measure(
+        'template', encode, [template.event(fields)] * arguments.events, arguments.repeat)
+    print(f'{"speedup":>14}: {dicts / templates:12.2f}x')
+
+
+if __name__ == '__main__':
+    main()
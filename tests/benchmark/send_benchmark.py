@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+"""
+Measure PyLogBeatClient.send() end to end against a local Lumberjack v2 receiver.
+
+Each scenario is a combination of event size, window size, compression level and TLS.
+Results can be written as JSON and compared against the results of another commit.
+
+Run with: python -m tests.benchmark.send_benchmark --output results.json
+Compare:  python -m tests.benchmark.send_benchmark --compare baseline.json
+"""
+
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from itertools import product
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from tests.benchmark.server import LumberjackServer, SelfSignedCertificate
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+RESULTS_FORMAT_VERSION = 1
+# metrics where a lower value is better, used to mark regressions when comparing
+LOWER_IS_BETTER = ('latency_p50_ms', 'latency_p99_ms', 'alloc_bytes_per_event')
+
+
+def factor_event(size):
+    # pad the message to get a serialized event of roughly the requested size
+    event = dict(MESSAGE)
+    padding = size - len(json.dumps(event))
+    event['message'] = 'x' * max(padding, 0)
+    return event
+
+
+class Scenario(namedtuple('Scenario', 'event_size window_size compression_level tls')):
+
+    @property
+    def name(self):
+        compression = 'off' if self.compression_level is None else self.compression_level
+        return (
+            f'event_size={self.event_size},window_size={self.window_size},'
+            f'compression={compression},tls={"on" if self.tls else "off"}')
+
+
+def percentile(values, percent):
+    # nearest-rank percentile
+    ordered = sorted(values)
+    index = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def factor_client(server, scenario):
+    return pylogbeat.PyLogBeatClient(
+        server.host,
+        server.port,
+        timeout=pylogbeat.TIMEOUT,
+        ssl_enable=scenario.tls,
+        ssl_verify=False,
+        compression_enable=scenario.compression_level is not None,
+        compression_level=scenario.compression_level or pylogbeat.COMPRESSION_LEVEL_DEFAULT,
+        window_size_min=scenario.window_size,
+        window_size_max=scenario.window_size)
+
+
+def send_batches(client, batches):
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        client.send(batch)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def measure_allocated_bytes(server, scenario, batches):
+    # a separate run as tracemalloc slows down the allocations considerably
+    with factor_client(server, scenario) as client:
+        tracemalloc.start()
+        try:
+            send_batches(client, batches)
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return peak_bytes
+
+
+def run_scenario(server, events, scenario):
+    event = factor_event(scenario.event_size)
+    # one send() per window, so each latency covers encoding, writing and the ACK
+    batches = [[event] * scenario.window_size
+               for _ in range(max(events // scenario.window_size, 1))]
+    event_count = len(batches) * scenario.window_size
+
+    received_bytes_before = server.received_bytes
+    with factor_client(server, scenario) as client:
+        start = time.perf_counter()
+        latencies = send_batches(client, batches)
+        duration = time.perf_counter() - start
+    wire_bytes = server.received_bytes - received_bytes_before
+
+    allocation_batches = batches[:max(len(batches) // 10, 1)]
+    peak_bytes = measure_allocated_bytes(server, scenario, allocation_batches)
+
+    return {
+        'events': event_count,
+        'events_per_second': event_count / duration,
+        'mb_per_second': event_count * scenario.event_size / duration / 1e6,
+        'wire_mb_per_second': wire_bytes / duration / 1e6,
+        'latency_p50_ms': percentile(latencies, 50) * 1000,
+        'latency_p99_ms': percentile(latencies, 99) * 1000,
+        'alloc_bytes_per_event': peak_bytes / (len(allocation_batches) * scenario.window_size),
+    }
+
+
+def run_benchmark(arguments, certificate=None):
+    results = {}
+    for tls in arguments.tls:
+        ssl_context = certificate.factor_server_context() if tls else None
+        with LumberjackServer(ssl_context=ssl_context) as server:
+            for event_size, window_size, compression_level in product(
+                    arguments.event_sizes, arguments.window_sizes, arguments.compression_levels):
+                scenario = Scenario(event_size, window_size, compression_level, tls)
+                result = run_scenario(server, arguments.events, scenario)
+                results[scenario.name] = result
+                print_result(scenario.name, result)
+            if server.errors:
+                raise RuntimeError(f'Benchmark server failed: {server.errors[0]}')
+    return results
+
+
+def factor_metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'format_version': RESULTS_FORMAT_VERSION,
+        'commit': commit,
+        'pylogbeat_version': pylogbeat.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def print_result(name, result):
+    print(
+        f'{name}: {result["events_per_second"]:,.0f} events/s, '
+        f'{result["mb_per_second"]:.1f} MB/s, '
+        f'p50 {result["latency_p50_ms"]:.2f} ms, p99 {result["latency_p99_ms"]:.2f} ms, '
+        f'{result["alloc_bytes_per_event"]:.0f} bytes allocated/event')
+
+
+def compare_results(baseline, current):
+    print(f'Baseline: {baseline["metadata"]["commit"]}, current: {current["metadata"]["commit"]}')
+    for name, result in current['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None:
+            continue
+        print(name)
+        for metric, value in result.items():
+            baseline_value = baseline_result.get(metric)
+            if not baseline_value or metric == 'events':
+                continue
+            change = (value - baseline_value) / baseline_value * 100
+            regression = change > 0 if metric in LOWER_IS_BETTER else change < 0
+            marker = ' (worse)' if regression else ''
+            print(
+                f'  {metric:>22}: {baseline_value:14.2f} -> {value:14.2f} '
+                f'{change:+7.1f}%{marker}')
+
+
+def parse_arguments():
+    def compression_level(value):
+        return None if value == 'off' else int(value)
+
+    def tls(value):
+        return value == 'on'
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--event-sizes', type=int, nargs='+', default=[256, 4096])
+    parser.add_argument('--window-sizes', type=int, nargs='+', default=[100, 2048])
+    parser.add_argument(
+        '--compression-levels', type=compression_level, nargs='+', default=[None, 1, 6],
+        help='zlib compression levels, "off" to disable compression')
+    parser.add_argument(
+        '--tls', type=tls, nargs='+', default=[False, True], help='"on" and/or "off"')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='compare the results against this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+
+    if any(arguments.tls) and not SelfSignedCertificate.is_available():
+        print('openssl not found, skipping the TLS scenarios', file=sys.stderr)
+        arguments.tls = [tls for tls in arguments.tls if not tls]
+
+    with SelfSignedCertificate() if any(arguments.tls) else nullcontext() as certificate:
+        results = {'metadata': factor_metadata(), 'results': run_benchmark(arguments, certificate)}
+
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+    if arguments.compare:
+        with open(arguments.compare, encoding='utf-8') as baseline_file:
+            compare_results(json.load(baseline_file), results)
+
+
+if __name__ == '__main__':
+    main()
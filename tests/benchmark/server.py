@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+"""
+Minimal Lumberjack v2 receiver standing in for Logstash or Beats during benchmarks
+"""
+
+from struct import Struct
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import zlib
+
+import pylogbeat
+
+
+_HEADER = Struct('>BB')
+_UINT32 = Struct('>I')
+_JSON_FRAME = Struct('>II')
+_ACK_FRAME = Struct('>BBI')
+
+
+class LumberjackServer:
+    """
+    Accept connections on a local port, decode all windows and acknowledge them
+
+    The server runs in background threads and only counts events and bytes, the events
+    themselves are discarded after decoding.
+    """
+
+    def __init__(self, host='127.0.0.1', ssl_context=None):
+        self._ssl_context = ssl_context
+        self._listener = socket.create_server((host, 0))
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+        self.host, self.port = self._listener.getsockname()[:2]
+        self.received_events = 0
+        self.received_bytes = 0
+        self.errors = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def start(self):
+        self._start_thread(self._accept_connections)
+
+    def close(self):
+        self._closed = True
+        try:
+            # closing alone does not wake up a thread blocked in accept()
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._listener.close()
+        for thread in self._threads:
+            thread.join(pylogbeat.TIMEOUT)
+
+    def _start_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _accept_connections(self):
+        while not self._closed:
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                return  # listener closed
+            self._start_thread(self._serve_connection, connection)
+
+    def _serve_connection(self, connection):
+        try:
+            if self._ssl_context is not None:
+                connection = self._ssl_context.wrap_socket(connection, server_side=True)
+            with connection, connection.makefile('rb') as stream:
+                while self._serve_window(connection, stream):
+                    pass
+        except (OSError, ValueError) as exc:
+            if not self._closed:
+                self.errors.append(exc)
+
+    def _serve_window(self, connection, stream):
+        header = stream.read(_HEADER.size)
+        if not header:
+            return False  # client closed the connection
+
+        frame_type = self._parse_header(header)
+        if frame_type != pylogbeat.FRAME_TYPE_WINDOW_SIZE:
+            raise ValueError(f'Expected window size frame, got "0x{frame_type:02X}"')
+        window_size = self._read_uint32(stream)
+        received_bytes = _HEADER.size + _UINT32.size
+
+        events = 0
+        last_sequence = 0
+        while events < window_size:
+            frame_type = self._parse_header(self._read_exactly(stream, _HEADER.size))
+            received_bytes += _HEADER.size
+            if frame_type == pylogbeat.FRAME_TYPE_COMPRESSED_FRAME:
+                length = self._read_uint32(stream)
+                payload = zlib.decompress(self._read_exactly(stream, length))
+                received_bytes += _UINT32.size + length
+                count, last_sequence = self._parse_json_frames(memoryview(payload))
+                events += count
+            elif frame_type == pylogbeat.FRAME_TYPE_JSON_FRAME:
+                last_sequence, length = _JSON_FRAME.unpack(
+                    self._read_exactly(stream, _JSON_FRAME.size))
+                self._read_exactly(stream, length)
+                received_bytes += _JSON_FRAME.size + length
+                events += 1
+            else:
+                raise ValueError(f'Unexpected frame type "0x{frame_type:02X}"')
+
+        # count before acknowledging, the client may look at the counters right after the ACK
+        with self._lock:
+            self.received_events += events
+            self.received_bytes += received_bytes
+        connection.sendall(_ACK_FRAME.pack(
+            pylogbeat.PROTOCOL_VERSION, pylogbeat.FRAME_TYPE_ACK, last_sequence))
+        return True
+
+    def _parse_json_frames(self, payload):
+        count = 0
+        last_sequence = 0
+        offset = 0
+        while offset < len(payload):
+            frame_type = self._parse_header(payload[offset:offset + _HEADER.size])
+            if frame_type != pylogbeat.FRAME_TYPE_JSON_FRAME:
+                raise ValueError(f'Unexpected compressed frame type "0x{frame_type:02X}"')
+            last_sequence, length = _JSON_FRAME.unpack_from(payload, offset + _HEADER.size)
+            offset += _HEADER.size + _JSON_FRAME.size + length
+            count += 1
+        return count, last_sequence
+
+    def _parse_header(self, header):
+        version, frame_type = _HEADER.unpack(header)
+        if version != pylogbeat.PROTOCOL_VERSION:
+            raise ValueError(f'Unsupported protocol version "0x{version:02X}"')
+        return frame_type
+
+    def _read_uint32(self, stream):
+        return _UINT32.unpack(self._read_exactly(stream, _UINT32.size))[0]
+
+    def _read_exactly(self, stream, size):
+        data = stream.read(size)
+        if len(data) != size:
+            raise ValueError('Connection closed within a frame')
+        return data
+
+
+class SelfSignedCertificate:
+    """
+    Create a temporary self-signed certificate for the TLS benchmarks using the openssl tool
+    """
+
+    def __init__(self):
+        self._directory = None
+        self.certfile = None
+        self.keyfile = None
+
+    @staticmethod
+    def is_available():
+        return shutil.which('openssl') is not None
+
+    def __enter__(self):
+        self._directory = tempfile.mkdtemp(prefix='pylogbeat-benchmark-')
+        self.certfile = os.path.join(self._directory, 'cert.pem')
+        self.keyfile = os.path.join(self._directory, 'key.pem')
+        subprocess.run(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+             '-subj', '/CN=localhost', '-keyout', self.keyfile, '-out', self.certfile],
+            check=True, capture_output=True)
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def factor_server_context(self):
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(self.certfile, self.keyfile)
+        return ssl_context
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+import socket
+
+from tests.base import BaseTestCase, mock
+import pylogbeat
+
+
+def ack_frame(sequence):
+    return pack('>BBI', pylogbeat.PROTOCOL_VERSION, pylogbeat.FRAME_TYPE_ACK, sequence)
+
+
+class AckReaderTest(BaseTestCase):
+
+    def test_short_reads(self):
+        mocked_socket = mock.MagicMock(spec=socket.socket)
+        data = ack_frame(1) + ack_frame(2)
+        self._mock_recv_into(mocked_socket, [data[:4], data[4:9], data[9:]])
+        reader = pylogbeat.AckReader()
+
+        frames = []
+        while reader.read(mocked_socket):
+            frames.extend(reader.frames())
+
+        self.assertEqual(frames, [(pylogbeat.FRAME_TYPE_ACK, 1), (pylogbeat.FRAME_TYPE_ACK, 2)])
+        self.assertEqual(len(reader), 0)
+
+    def test_incomplete_frame_is_moved_to_buffer_start(self):
+        reader = pylogbeat.AckReader(size=16)
+        reader.feed(ack_frame(1) + ack_frame(2) + ack_frame(3)[:3])
+        self.assertEqual([sequence for _, sequence in reader.frames()], [1, 2])
+
+        reader.feed(ack_frame(3)[3:] + ack_frame(4))
+
+        self.assertEqual([sequence for _, sequence in reader.frames()], [3, 4])
+
+    def test_unexpected_frame_type(self):
+        reader = pylogbeat.AckReader()
+        reader.feed(ack_frame(1) + b'2X')
+
+        self.assertEqual(list(reader.frames()), [(pylogbeat.FRAME_TYPE_ACK, 1), (ord('X'), None)])
+
+    def test_feed_exceeding_buffer(self):
+        reader = pylogbeat.AckReader(size=8)
+
+        with self.assertRaises(ValueError):
+            reader.feed(bytes(9))
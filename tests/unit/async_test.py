@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack, unpack
+import asyncio
+import json
+import unittest
+import zlib
+
+from tests.base import BaseTestCase
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+class AsyncClientTest(BaseTestCase, unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._received_events = []
+        self._ack_delay = 0
+        self._server = await asyncio.start_server(self._handle_connection, '127.0.0.1', 0)
+        self._port = self._server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                window_frame = await reader.readexactly(6)
+                self.assertEqual(window_frame[1:2], b'W')
+                compressed_header = await reader.readexactly(6)
+                compressed_length = unpack('>I', compressed_header[2:])[0]
+                payload = zlib.decompress(await reader.readexactly(compressed_length))
+                sequence = self._parse_json_frames(payload)
+                await asyncio.sleep(self._ack_delay)
+                writer.write(pack('>BBI', pylogbeat.PROTOCOL_VERSION, pylogbeat.FRAME_TYPE_ACK,
+                                  sequence))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    def _parse_json_frames(self, payload):
+        sequence = offset = 0
+        while offset < len(payload):
+            _, _, sequence, length = unpack('>BBII', payload[offset:offset + 10])
+            offset += 10
+            self._received_events.append(json.loads(payload[offset:offset + length]))
+            offset += length
+        return sequence
+
+    def _factor_client(self, **kwargs):
+        return pylogbeat.AsyncPyLogBeatClient('127.0.0.1', self._port, timeout=5, **kwargs)
+
+    async def test_send(self):
+        async with self._factor_client() as client:
+            await client.send([MESSAGE, MESSAGE])
+            self.assertEqual(client._last_ack, 2)
+            self.assertEqual(client.windows_in_flight, 0)
+
+        self.assertEqual(self._received_events, [MESSAGE, MESSAGE])
+
+    async def test_send_pipelined_with_concurrent_ack_receiver(self):
+        self._ack_delay = 0.01
+        client = self._factor_client(max_windows_in_flight=3, receive_acks_concurrently=True)
+        async with client:
+            for _ in range(5):
+                await client.send([MESSAGE])
+                self.assertLess(client.windows_in_flight, 3)
+            await client.wait_for_acks()
+            self.assertEqual(client._last_ack, 5)
+
+        self.assertEqual(len(self._received_events), 5)
+
+    async def test_concurrent_sends(self):
+        for receive_acks_concurrently in (False, True):
+            with self.subTest(receive_acks_concurrently=receive_acks_concurrently):
+                self._received_events = []
+                client = self._factor_client(
+                    max_windows_in_flight=2, window_size_max=3,
+                    receive_acks_concurrently=receive_acks_concurrently)
+                async with client:
+                    await asyncio.gather(*(
+                        client.send([{'task': task, 'index': index} for index in range(8)])
+                        for task in range(5)))
+                    await client.wait_for_acks()
+
+                    self.assertEqual(client.acked_events, 40)
+                    self.assertEqual(client.windows_in_flight, 0)
+
+                self.assertEqual(len(self._received_events), 40)
+
+    async def test_send_connection_closed_by_server(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = await asyncio.start_server(self._close_connection, '127.0.0.1', 0)
+        self._port = self._server.sockets[0].getsockname()[1]
+
+        client = self._factor_client()
+        try:
+            with self.assertRaises(pylogbeat.ConnectionException):
+                await client.send([MESSAGE])
+        finally:
+            await client.close()
+
+    async def _close_connection(self, reader, writer):
+        await reader.read(1)
+        writer.close()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from contextlib import redirect_stdout
+import io
+import unittest
+
+from tests.base import BaseTestCase
+from tests.benchmark.send_benchmark import compare_results, run_scenario, Scenario
+from tests.benchmark.server import LumberjackServer, SelfSignedCertificate
+
+
+class BenchmarkTest(BaseTestCase):
+
+    def _assert_scenario(self, server, compression_level, tls):
+        scenario = Scenario(
+            event_size=512, window_size=50, compression_level=compression_level, tls=tls)
+        result = run_scenario(server, 200, scenario)
+
+        self.assertEqual(result['events'], 200)
+        self.assertGreater(result['events_per_second'], 0)
+        self.assertLessEqual(result['latency_p50_ms'], result['latency_p99_ms'])
+        self.assertGreater(result['alloc_bytes_per_event'], 0)
+        self.assertEqual(server.errors, [])
+
+    def test_scenarios_without_tls(self):
+        with LumberjackServer() as server:
+            self._assert_scenario(server, compression_level=None, tls=False)
+            self._assert_scenario(server, compression_level=1, tls=False)
+            # the allocation run sends another tenth of the events
+            self.assertEqual(server.received_events, 2 * (200 + 50))
+
+    @unittest.skipUnless(SelfSignedCertificate.is_available(), 'openssl is not installed')
+    def test_scenario_with_tls(self):
+        with SelfSignedCertificate() as certificate:
+            with LumberjackServer(ssl_context=certificate.factor_server_context()) as server:
+                self._assert_scenario(server, compression_level=6, tls=True)
+
+    def test_compare_results(self):
+        baseline = {'metadata': {'commit': 'a'}, 'results': {'x': {'events_per_second': 100.0}}}
+        current = {'metadata': {'commit': 'b'}, 'results': {'x': {'events_per_second': 50.0}}}
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            compare_results(baseline, current)
+
+        self.assertIn('-50.0% (worse)', output.getvalue())
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+import threading
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT, SOCKET_TIMEOUT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+class MemoryBudgetTest(BaseTestCase):
+
+    def test_reserve_and_release(self):
+        budget = pylogbeat.MemoryBudget(100)
+
+        self.assertTrue(budget.reserve(60))
+        self.assertTrue(budget.reserve(40))
+        self.assertTrue(budget.exhausted)
+        budget.release(60)
+
+        self.assertEqual(budget.used_bytes, 40)
+        self.assertFalse(budget.exhausted)
+
+    def test_oversized_reservation_fits_only_alone(self):
+        budget = pylogbeat.MemoryBudget(100, policy=pylogbeat.OVERFLOW_DROP_NEWEST)
+
+        self.assertTrue(budget.reserve(150))
+        self.assertFalse(budget.reserve(150))
+        budget.release(150)
+        self.assertTrue(budget.reserve(150))
+
+    def test_drop(self):
+        budget = pylogbeat.MemoryBudget(100, policy=pylogbeat.OVERFLOW_DROP_NEWEST)
+        budget.reserve(80)
+
+        self.assertFalse(budget.reserve(30))
+        self.assertFalse(budget.reserve(25))
+
+        self.assertEqual(budget.used_bytes, 80)
+        self.assertEqual(budget.dropped_reservations, 2)
+        self.assertEqual(budget.dropped_bytes, 55)
+
+    def test_reject(self):
+        budget = pylogbeat.MemoryBudget(100, policy=pylogbeat.OVERFLOW_REJECT)
+        budget.reserve(80)
+
+        with self.assertRaises(pylogbeat.BudgetExceededException):
+            budget.reserve(30)
+        self.assertEqual(budget.used_bytes, 80)
+
+    def test_force(self):
+        budget = pylogbeat.MemoryBudget(100, policy=pylogbeat.OVERFLOW_REJECT)
+        budget.reserve(80)
+
+        self.assertTrue(budget.reserve(30, force=True))
+        self.assertEqual(budget.used_bytes, 110)
+
+    def test_block_times_out(self):
+        budget = pylogbeat.MemoryBudget(100, timeout=0.01)
+        budget.reserve(80)
+
+        with self.assertRaises(pylogbeat.BudgetExceededException):
+            budget.reserve(30)
+
+    def test_block_waits_for_release(self):
+        budget = pylogbeat.MemoryBudget(100, timeout=5)
+        budget.reserve(80)
+
+        timer = threading.Timer(0.05, budget.release, (80,))
+        timer.start()
+        try:
+            self.assertTrue(budget.reserve(30))
+        finally:
+            timer.join()
+        self.assertEqual(budget.used_bytes, 30)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            pylogbeat.MemoryBudget(0)
+        with self.assertRaises(ValueError):
+            pylogbeat.MemoryBudget(100, policy=pylogbeat.OVERFLOW_DROP_OLDEST)
+
+
+class ClientMemoryBudgetTest(BaseTestCase):
+
+    def _factor_client(self, memory_budget, max_windows_in_flight=4):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST,
+            port=SOCKET_PORT,
+            timeout=SOCKET_TIMEOUT,
+            use_logging=False,
+            max_windows_in_flight=max_windows_in_flight,
+            memory_budget=memory_budget)
+
+    def test_windows_in_flight_are_charged_until_acknowledged(self):
+        budget = pylogbeat.MemoryBudget(1024 * 1024)
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(budget)
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2A' + pack('>I', 1)])
+
+            client.send([MESSAGE])
+            client.send([MESSAGE])
+            window = client._socket.sendall.call_args_list[0][0][0]
+            self.assertEqual(budget.used_bytes, 2 * len(window))
+
+            client._read_ack()
+            self.assertEqual(budget.used_bytes, len(window))
+
+            client.close()
+            self.assertEqual(budget.used_bytes, 0)
+
+    def test_exhausted_budget_limits_windows_in_flight(self):
+        budget = pylogbeat.MemoryBudget(1)
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(budget)
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2A' + pack('>I', ack) for ack in (1, 2, 3)])
+
+            for _ in range(3):
+                client.send([MESSAGE])
+                # without room in the budget, send() waits for the ACK like without pipelining
+                self.assertEqual(client.windows_in_flight, 0)
+
+            self.assertEqual(client.acked_events, 3)
+            self.assertEqual(budget.used_bytes, 0)
+
+
+class BufferedMemoryBudgetTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._client = mock.MagicMock(spec=pylogbeat.PyLogBeatClient)
+        self._client.serializer = pylogbeat.factor_serializer()
+        self._sending = threading.Event()
+        self._blocked = threading.Event()
+        self._sent_batches = []
+
+        def send(batch):
+            self._sending.set()
+            self._blocked.wait(5)
+            self._sent_batches.append(list(batch))
+        self._client.send.side_effect = send
+
+    def _emit_while_sender_blocked(self, budget, events=4):
+        # the sender takes the first event and blocks, the others are charged while queued
+        buffered_client = pylogbeat.BufferedPyLogBeatClient(
+            self._client, max_batch_size=1, max_latency=60, memory_budget=budget)
+        try:
+            buffered_client.emit('{"event": 0}')
+            self.assertTrue(self._sending.wait(5))
+            results = [
+                buffered_client.emit(f'{{"event": {index}}}') for index in range(1, events + 1)]
+        finally:
+            self._blocked.set()
+            buffered_client.close()
+        return buffered_client, results
+
+    def test_drop(self):
+        budget = pylogbeat.MemoryBudget(25, policy=pylogbeat.OVERFLOW_DROP_NEWEST)
+
+        buffered_client, results = self._emit_while_sender_blocked(budget)
+
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(buffered_client.dropped_events, 2)
+        self.assertEqual(budget.dropped_reservations, 2)
+        self.assertEqual(budget.used_bytes, 0)
+        self.assertEqual(
+            self._sent_batches, [[b'{"event": 0}'], [b'{"event": 1}'], [b'{"event": 2}']])
+
+    def test_reject(self):
+        budget = pylogbeat.MemoryBudget(25, policy=pylogbeat.OVERFLOW_REJECT)
+
+        with self.assertRaises(pylogbeat.BudgetExceededException):
+            self._emit_while_sender_blocked(budget)
+        self.assertEqual(budget.used_bytes, 0)
+
+    def test_block(self):
+        budget = pylogbeat.MemoryBudget(12, timeout=5)
+        threading.Timer(0.05, self._blocked.set).start()
+
+        buffered_client, results = self._emit_while_sender_blocked(budget, events=2)
+
+        self.assertEqual(results, [True, True])
+        self.assertEqual(buffered_client.dropped_events, 0)
+        self.assertEqual(len(self._sent_batches), 3)
+        self.assertEqual(budget.used_bytes, 0)
+
+    def test_drop_oldest_releases_dropped_events(self):
+        budget = pylogbeat.MemoryBudget(1024)
+        buffered_client = pylogbeat.BufferedPyLogBeatClient(
+            self._client, max_batch_size=1, max_latency=60, queue_size=1,
+            overflow_policy=pylogbeat.OVERFLOW_DROP_OLDEST, memory_budget=budget)
+        try:
+            buffered_client.emit('{"event": 0}')
+            self.assertTrue(self._sending.wait(5))
+            for index in range(1, 4):
+                buffered_client.emit(f'{{"event": {index}}}')
+
+            self.assertEqual(buffered_client.dropped_oldest_events, 2)
+            self.assertEqual(budget.used_bytes, len(b'{"event": 3}'))
+        finally:
+            self._blocked.set()
+            buffered_client.close()
+        self.assertEqual(budget.used_bytes, 0)
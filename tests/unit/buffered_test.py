@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+import json
+import threading
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+class BufferedClientTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._client = mock.MagicMock(spec=pylogbeat.PyLogBeatClient)
+        self._client.serializer = pylogbeat.factor_serializer()
+        self._sent_batches = []
+        self._client.send.side_effect = lambda batch: self._sent_batches.append(list(batch))
+
+    def _factor_buffered_client(self, **kwargs):
+        kwargs.setdefault('max_latency', 60)
+        return pylogbeat.BufferedPyLogBeatClient(self._client, **kwargs)
+
+    def test_flush_on_batch_size(self):
+        with self._factor_buffered_client(max_batch_size=2) as buffered_client:
+            for _ in range(5):
+                buffered_client.emit(MESSAGE)
+            buffered_client.flush()
+
+        self.assertEqual([len(batch) for batch in self._sent_batches], [2, 2, 1])
+        self.assertEqual(json.loads(self._sent_batches[0][0]), MESSAGE)
+
+    def test_flush_on_batch_bytes(self):
+        with self._factor_buffered_client(max_batch_bytes=5) as buffered_client:
+            buffered_client.emit('{"a": 1}')
+            buffered_client.emit(b'{"b": 2}')
+            buffered_client.flush()
+
+        self.assertEqual(self._sent_batches, [[b'{"a": 1}'], [b'{"b": 2}']])
+
+    def test_flush_on_latency(self):
+        sent = threading.Event()
+        self._client.send.side_effect = lambda batch: sent.set()
+        buffered_client = self._factor_buffered_client(max_latency=0.01)
+        try:
+            buffered_client.emit(MESSAGE)
+            self.assertTrue(sent.wait(5))
+        finally:
+            buffered_client.close()
+
+    def test_close_drains_queue(self):
+        buffered_client = self._factor_buffered_client()
+        for _ in range(3):
+            buffered_client.emit(MESSAGE)
+        buffered_client.close()
+
+        self.assertEqual(sum(len(batch) for batch in self._sent_batches), 3)
+        self._client.wait_for_acks.assert_called_once_with()
+        self._client.close.assert_called_once_with()
+        with self.assertRaises(pylogbeat.ConnectionException):
+            buffered_client.emit(MESSAGE)
+
+    def test_close_timeout_leaves_the_client_to_the_sender(self):
+        sending = threading.Event()
+        blocked = threading.Event()
+        self._client.send.side_effect = lambda batch: sending.set() or blocked.wait(5)
+        buffered_client = self._factor_buffered_client()
+        buffered_client.emit(MESSAGE)
+        buffered_client.flush(0)
+        self.assertTrue(sending.wait(5))
+
+        buffered_client.close(timeout=0.01)
+
+        # the client is still in use by the sender thread
+        self._client.wait_for_acks.assert_not_called()
+        self._client.close.assert_not_called()
+        blocked.set()
+        buffered_client._sender.join(5)
+        self._client.wait_for_acks.assert_called_once_with()
+        self._client.close.assert_called_once_with()
+        self.assertEqual(buffered_client.failed_events, 0)
+
+    def test_emit_drops_events_when_queue_full(self):
+        blocked = threading.Event()
+        self._client.send.side_effect = lambda batch: blocked.wait(5)
+        buffered_client = self._factor_buffered_client(max_batch_size=1, queue_size=1)
+        try:
+            results = [buffered_client.emit(MESSAGE) for _ in range(5)]
+            self.assertIn(False, results)
+            self.assertEqual(buffered_client.dropped_events, results.count(False))
+        finally:
+            blocked.set()
+            buffered_client.close()
+
+    def _emit_while_sender_blocked(self, overflow_policy):
+        # the sender takes the first event and blocks, the others fill the queue
+        sending = threading.Event()
+        blocked = threading.Event()
+
+        def send(batch):
+            sending.set()
+            blocked.wait(5)
+            self._sent_batches.append(list(batch))
+        self._client.send.side_effect = send
+
+        buffered_client = self._factor_buffered_client(
+            max_batch_size=1, queue_size=2, overflow_policy=overflow_policy)
+        try:
+            buffered_client.emit('{"event": 0}')
+            self.assertTrue(sending.wait(5))
+            results = [buffered_client.emit(f'{{"event": {index}}}') for index in range(1, 5)]
+        finally:
+            blocked.set()
+            buffered_client.close()
+        return buffered_client, results
+
+    def test_overflow_drop_newest(self):
+        buffered_client, results = self._emit_while_sender_blocked(pylogbeat.OVERFLOW_DROP_NEWEST)
+
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(buffered_client.dropped_events, 2)
+        self.assertEqual(buffered_client.dropped_oldest_events, 0)
+        self.assertEqual(
+            self._sent_batches, [[b'{"event": 0}'], [b'{"event": 1}'], [b'{"event": 2}']])
+
+    def test_overflow_drop_oldest(self):
+        buffered_client, results = self._emit_while_sender_blocked(pylogbeat.OVERFLOW_DROP_OLDEST)
+
+        self.assertEqual(results, [True, True, True, True])
+        self.assertEqual(buffered_client.dropped_events, 2)
+        self.assertEqual(buffered_client.dropped_oldest_events, 2)
+        self.assertEqual(
+            self._sent_batches, [[b'{"event": 0}'], [b'{"event": 3}'], [b'{"event": 4}']])
+
+    def test_overflow_block(self):
+        blocked = threading.Event()
+
+        def send(batch):
+            blocked.wait(5)
+            self._sent_batches.append(list(batch))
+        self._client.send.side_effect = send
+        buffered_client = self._factor_buffered_client(
+            max_batch_size=1, queue_size=1, overflow_policy=pylogbeat.OVERFLOW_BLOCK)
+        try:
+            emitter = threading.Thread(
+                target=lambda: [buffered_client.emit(MESSAGE) for _ in range(4)])
+            emitter.start()
+            emitter.join(0.1)
+            # emit() waits for room in the queue instead of dropping events
+            self.assertTrue(emitter.is_alive())
+            blocked.set()
+            emitter.join(5)
+        finally:
+            blocked.set()
+            buffered_client.close()
+
+        self.assertEqual(len(self._sent_batches), 4)
+        self.assertEqual(buffered_client.dropped_events, 0)
+
+    def test_invalid_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            self._factor_buffered_client(overflow_policy='drop_all')
+
+    def test_send_failure_is_counted(self):
+        self._client.send.side_effect = pylogbeat.ConnectionException('no ACK')
+        with self._factor_buffered_client() as buffered_client:
+            buffered_client.emit(MESSAGE)
+            buffered_client.emit(MESSAGE)
+            buffered_client.flush()
+
+            self.assertEqual(buffered_client.failed_events, 2)
+
+    def test_encoding_failure_is_counted(self):
+        with self._factor_buffered_client() as buffered_client:
+            buffered_client.emit({'unserializable': object()})
+            buffered_client.emit(MESSAGE)
+
+            self.assertTrue(buffered_client.flush(5))
+            self.assertEqual(buffered_client.failed_events, 1)
+
+        self.assertEqual(len(self._sent_batches), 1)
+        self.assertEqual(json.loads(self._sent_batches[0][0]), MESSAGE)
+
+    def test_emit_template_event(self):
+        template = pylogbeat.EventTemplate({'type': 'test'}, self._client.serializer)
+        with self._factor_buffered_client() as buffered_client:
+            self.assertTrue(buffered_client.emit(template.event({'message': 'foo'})))
+            buffered_client.flush()
+
+        self.assertEqual(json.loads(self._sent_batches[0][0]), {'type': 'test', 'message': 'foo'})
+
+    def test_emit_invalid_event(self):
+        with self._factor_buffered_client() as buffered_client:
+            with self.assertRaises(TypeError):
+                buffered_client.emit(1)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT, SOCKET_TIMEOUT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+def frame_type(window):
+    # type of the frame following the window size frame
+    return window[pylogbeat._FRAME_HEADER.size + 1]
+
+
+class CompressionThresholdTest(BaseTestCase):
+
+    def _encode(self, elements, **kwargs):
+        encoder = pylogbeat.FrameEncoder(**kwargs)
+        for sequence, element in enumerate(elements, start=1):
+            encoder.add(sequence, element)
+        return encoder, encoder.take()
+
+    def _decode(self, window):
+        decoder = pylogbeat.FrameDecoder()
+        decoder.feed(window)
+        return [event for _, event in decoder.decode()]
+
+    def test_small_window_is_not_compressed(self):
+        _, window = self._encode([MESSAGE], compression_threshold=1024)
+
+        self.assertEqual(frame_type(window), pylogbeat.FRAME_TYPE_JSON_FRAME)
+        self.assertEqual(self._decode(window), [MESSAGE])
+
+    def test_large_window_is_compressed(self):
+        _, window = self._encode([MESSAGE] * 10, compression_threshold=1024)
+
+        self.assertEqual(frame_type(window), pylogbeat.FRAME_TYPE_COMPRESSED_FRAME)
+        self.assertEqual(self._decode(window), [MESSAGE] * 10)
+
+    def test_threshold_without_compression(self):
+        _, window = self._encode([MESSAGE], compression_enable=False, compression_threshold=1024)
+
+        self.assertEqual(self._decode(window), [MESSAGE])
+
+    def test_level_change_applies_to_next_window(self):
+        elements = [{'message': 'x' * 1000, 'index': index} for index in range(100)]
+        encoder, window = self._encode(elements, compression_level=0)
+
+        encoder.compression_level = 9
+        for sequence, element in enumerate(elements, start=1):
+            encoder.add(sequence, element)
+        next_window = encoder.take()
+
+        self.assertLess(len(next_window), len(window))
+
+
+class CompressionPolicyTest(BaseTestCase):
+
+    def test_raise_level_if_connection_is_the_bottleneck(self):
+        policy = pylogbeat.CompressionPolicy(level=1, max_level=2)
+
+        self.assertEqual(policy.update(10000, 3000, 0.001, 0.1), 2)
+        self.assertEqual(policy.update(10000, 3000, 0.001, 0.1), 2)
+        self.assertAlmostEqual(policy.ratio, 0.3)
+
+    def test_lower_level_if_compression_is_the_bottleneck(self):
+        policy = pylogbeat.CompressionPolicy(level=6)
+
+        self.assertEqual(policy.update(10000, 3000, 0.05, 0.05), 5)
+
+    def test_lower_level_if_compression_saves_little(self):
+        policy = pylogbeat.CompressionPolicy(level=6, min_level=5)
+
+        self.assertEqual(policy.update(10000, 9500, 0.01, 0.1), 5)
+        self.assertEqual(policy.update(10000, 9500, 0.01, 0.1), 5)
+
+    def test_keep_level_in_between(self):
+        policy = pylogbeat.CompressionPolicy(level=3)
+
+        self.assertEqual(policy.update(10000, 3000, 0.01, 0.09), 3)
+
+    def test_uncompressed_window_is_ignored(self):
+        policy = pylogbeat.CompressionPolicy(threshold=1024)
+
+        self.assertEqual(policy.update(100, 106, 0, 0.1), 1)
+        self.assertIsNone(policy.cpu_share)
+
+    def test_invalid_levels(self):
+        with self.assertRaises(ValueError):
+            pylogbeat.CompressionPolicy(level=5, max_level=4)
+
+
+class ClientCompressionPolicyTest(BaseTestCase):
+
+    def _factor_client(self, **kwargs):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST,
+            port=SOCKET_PORT,
+            timeout=SOCKET_TIMEOUT,
+            use_logging=False,
+            **kwargs)
+
+    def test_send(self):
+        # a connection which is always the bottleneck raises the level with each window
+        policy = pylogbeat.CompressionPolicy(
+            threshold=1024, cpu_share_low=1.0, cpu_share_high=1.0)
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(compression_policy=policy)
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2A' + pack('>I', ack) for ack in (1, 11)])
+
+            client.send([MESSAGE])
+            client.send([MESSAGE] * 10)
+
+            windows = [call[0][0] for call in client._socket.sendall.call_args_list]
+            self.assertEqual(frame_type(windows[0]), pylogbeat.FRAME_TYPE_JSON_FRAME)
+            self.assertEqual(frame_type(windows[1]), pylogbeat.FRAME_TYPE_COMPRESSED_FRAME)
+            snapshot = client.metrics.snapshot()
+            self.assertEqual(snapshot['windows_uncompressed'], 1)
+            self.assertEqual(snapshot['windows_compressed'], 1)
+            self.assertEqual(snapshot['compression_level'], 2)
+            self.assertLess(snapshot['compression_ratio'], 1)
+            self.assertEqual(client._frame_encoder.compression_level, 2)
+
+    def test_policy_requires_compression(self):
+        with self.assertRaises(ValueError):
+            self._factor_client(
+                compression_enable=False, compression_policy=pylogbeat.CompressionPolicy())
+
+    def test_pool_copies_policy(self):
+        policy = pylogbeat.CompressionPolicy()
+        pool = pylogbeat.PyLogBeatPoolClient(
+            [('host1', 5044), ('host2', 5044)], compression_policy=policy)
+
+        policies = [node.client._compression_policy for node in pool._nodes]
+        self.assertIsNot(policies[0], policies[1])
+        self.assertIsNot(policies[0], policy)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack, unpack
+import json
+import zlib
+
+from tests.base import BaseTestCase
+from tests.fixture import MESSAGE, MESSAGE_JSON
+import pylogbeat
+
+
+# pylint: disable-next=invalid-name
+JSON_SERIALIZER = pylogbeat.factor_serializer(library=pylogbeat.SERIALIZER_JSON)
+
+
+def encode_json_frame(sequence, element):
+    # reference implementation of a JSON frame as documented by the Beats protocol
+    if isinstance(element, dict):
+        payload = json.dumps(element).encode('utf-8')
+    elif isinstance(element, str):
+        payload = element.encode('utf-8')
+    else:
+        payload = element
+    return pack(f'>BBII{len(payload)}s', 0x32, 0x4A, sequence, len(payload), payload)
+
+
+class FrameEncoderTest(BaseTestCase):
+
+    def test_encoded_frames_match_reference(self):
+        elements = [MESSAGE, MESSAGE_JSON, MESSAGE_JSON.encode('utf-8'), {'unicode': 'äöü€'}]
+        encoder = pylogbeat.FrameEncoder(JSON_SERIALIZER, compression_enable=False)
+        for sequence, element in enumerate(elements, start=1):
+            encoder.add(sequence, element)
+
+        expected = b''.join(
+            encode_json_frame(sequence, element)
+            for sequence, element in enumerate(elements, start=1))
+        self.assertEqual(len(encoder), len(expected))
+        self.assertEqual(encoder.window_size, 4)
+        window = encoder.take()
+        self.assertEqual(window[:6], pack('>BBI', 0x32, 0x57, 4))
+        self.assertEqual(window[6:], expected)
+
+    def test_take_starts_new_buffer(self):
+        encoder = pylogbeat.FrameEncoder(JSON_SERIALIZER, compression_enable=False)
+        encoder.add(1, MESSAGE)
+        first = encoder.take()
+        encoder.add(2, MESSAGE)
+
+        self.assertEqual(first[6:], encode_json_frame(1, MESSAGE))
+        self.assertEqual(encoder.take()[6:], encode_json_frame(2, MESSAGE))
+        self.assertEqual(len(encoder), 0)
+        self.assertEqual(encoder.window_size, 0)
+
+    def test_compressed_frame(self):
+        # enough frames to feed the compressor in multiple chunks
+        elements = [MESSAGE] * 1000
+        encoder = pylogbeat.FrameEncoder(JSON_SERIALIZER)
+        for sequence, element in enumerate(elements, start=1):
+            encoder.add(sequence, element)
+        raw_size = len(encoder)
+        window = encoder.take()
+
+        self.assertEqual(unpack('>BBI', window[:6]), (0x32, 0x57, 1000))
+        compressed_frame = window[6:]
+        version, frame_type, length = unpack('>BBI', compressed_frame[:6])
+        self.assertEqual(version, pylogbeat.PROTOCOL_VERSION)
+        self.assertEqual(frame_type, pylogbeat.FRAME_TYPE_COMPRESSED_FRAME)
+        self.assertEqual(length, len(compressed_frame) - 6)
+        expected = b''.join(
+            encode_json_frame(sequence, element)
+            for sequence, element in enumerate(elements, start=1))
+        self.assertEqual(raw_size, len(expected))
+        self.assertEqual(zlib.decompress(compressed_frame[6:]), expected)
+        self.assertEqual(len(encoder), 0)
+
+    def test_compressed_frame_empty(self):
+        window = pylogbeat.FrameEncoder().take()
+
+        self.assertEqual(unpack('>BBI', window[:6]), (0x32, 0x57, 0))
+        self.assertEqual(zlib.decompress(window[12:]), b'')
+
+    def test_compression_level(self):
+        sizes = []
+        for compression_level in (0, 9):
+            encoder = pylogbeat.FrameEncoder(compression_level=compression_level)
+            for sequence in range(100):
+                encoder.add(sequence, MESSAGE)
+            sizes.append(len(encoder.take()))
+
+        self.assertGreater(sizes[0], sizes[1])
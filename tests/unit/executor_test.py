@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from struct import pack
+import pickle
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT, SOCKET_TIMEOUT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+class ExecutorTest(BaseTestCase):
+
+    def _factor_client(self, executor=None, encode_prefetch=None):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST,
+            port=SOCKET_PORT,
+            timeout=SOCKET_TIMEOUT,
+            use_logging=False,
+            serializer=pylogbeat.factor_serializer(library=pylogbeat.SERIALIZER_JSON),
+            window_size_min=3,
+            window_size_max=3,
+            executor=executor,
+            encode_prefetch=encode_prefetch)
+
+    def _send_and_collect_windows(self, client, elements):
+        with mock.patch('pylogbeat.socket.socket'):
+            client.connect()
+            acks = [*range(3, len(elements), 3), len(elements)]
+            self._mock_recv_into(client._socket, [b'2A' + pack('>I', ack) for ack in acks])
+
+            client.send(elements)
+
+            return [bytes(call[0][0]) for call in client._socket.sendall.call_args_list]
+
+    def _assert_windows_equal_inline_encoding(self, executor, encode_prefetch=None):
+        elements = [{'message': MESSAGE, 'index': index} for index in range(10)]
+        expected_windows = self._send_and_collect_windows(self._factor_client(), elements)
+
+        client = self._factor_client(executor=executor, encode_prefetch=encode_prefetch)
+        windows = self._send_and_collect_windows(client, elements)
+
+        self.assertEqual(len(windows), 4)
+        self.assertEqual(windows, expected_windows)
+        self.assertEqual(client.windows_in_flight, 0)
+        self.assertEqual(client.acked_events, 10)
+
+    def test_thread_pool_executor(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self._assert_windows_equal_inline_encoding(executor)
+
+    def test_thread_pool_executor_without_prefetch(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self._assert_windows_equal_inline_encoding(executor, encode_prefetch=1)
+
+    def test_process_pool_executor(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self._assert_windows_equal_inline_encoding(executor)
+
+    def test_metrics_match_inline_encoding(self):
+        elements = [{'message': MESSAGE, 'index': index} for index in range(10)]
+        inline_client = self._factor_client()
+        self._send_and_collect_windows(inline_client, elements)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            client = self._factor_client(executor=executor)
+            self._send_and_collect_windows(client, elements)
+
+        inline_snapshot = inline_client.metrics.snapshot()
+        snapshot = client.metrics.snapshot()
+        self.assertEqual(snapshot['raw_bytes'], inline_snapshot['raw_bytes'])
+        self.assertGreater(snapshot['raw_bytes'], 0)
+        self.assertEqual(snapshot['compress']['count'], 4)
+        self.assertGreater(snapshot['compress']['sum'], 0)
+
+    def test_encode_window(self):
+        client = self._factor_client()
+        client._sequence = 41
+        expected_window = client._factor_window([MESSAGE, MESSAGE])
+
+        window = pylogbeat.encode_window([MESSAGE, MESSAGE], 42, client.serializer)
+
+        self.assertEqual(window, expected_window)
+
+    def test_serializers_are_picklable(self):
+        libraries = [pylogbeat.SERIALIZER_JSON]
+        if pylogbeat.orjson is not None:
+            libraries.append(pylogbeat.SERIALIZER_ORJSON)
+        if pylogbeat.msgspec is not None:
+            libraries.append(pylogbeat.SERIALIZER_MSGSPEC)
+
+        for library in libraries:
+            with self.subTest(library=library):
+                serializer = pylogbeat.factor_serializer(library=library)
+                restored_serializer = pickle.loads(pickle.dumps(serializer))
+                self.assertEqual(restored_serializer({'a': 1}), serializer({'a': 1}))
+
+    def test_invalid_encode_prefetch(self):
+        with self.assertRaises(ValueError):
+            self._factor_client(encode_prefetch=0)
+
+    def test_invalid_element_index(self):
+        elements = [MESSAGE] * 4 + [None]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            client = self._factor_client(executor=executor)
+            with mock.patch('pylogbeat.socket.socket'):
+                client.connect()
+                self._mock_recv_into(client._socket, [b'2A' + pack('>I', 3)])
+
+                with self.assertRaisesRegex(TypeError, r'^Element 4 has type'):
+                    client.send(elements)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+import json
+import logging
+import time
+
+from tests.base import BaseTestCase, mock
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+class HandlerTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._client = mock.MagicMock(spec=pylogbeat.PyLogBeatClient)
+        self._client.serializer = pylogbeat.factor_serializer()
+        self._sent_events = []
+        self._client.send.side_effect = lambda batch: self._sent_events.extend(
+            json.loads(event) for event in batch)
+
+        self._handler = pylogbeat.PyLogBeatHandler(
+            self._client, service_name='my-service', static_fields={'environment': 'test'})
+        self._logger = logging.getLogger(f'pylogbeat.test.{self.id()}')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.DEBUG)
+        self._logger.addHandler(self._handler)
+
+    def tearDown(self):
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
+        super().tearDown()
+
+    def test_emit_sends_ecs_event(self):
+        self._logger.info('Hello %s', 'world', extra={'user_id': 42, 'request': object()})
+        self._handler.flush()
+
+        self.assertEqual(len(self._sent_events), 1)
+        event = self._sent_events[0]
+        self.assertEqual(event['message'], 'Hello world')
+        self.assertEqual(event['log']['level'], 'INFO')
+        self.assertEqual(event['log']['logger'], self._logger.name)
+        self.assertEqual(event['log']['origin']['function'], 'test_emit_sends_ecs_event')
+        self.assertEqual(event['ecs']['version'], pylogbeat.ECS_VERSION)
+        self.assertEqual(event['service'], {'name': 'my-service'})
+        self.assertEqual(event['environment'], 'test')
+        self.assertEqual(event['labels']['user_id'], 42)
+        self.assertTrue(event['labels']['request'].startswith('<object object'))
+        self.assertNotIn('error', event)
+
+    def test_exception(self):
+        try:
+            raise ValueError('broken')
+        except ValueError:
+            self._logger.exception('Failed')
+        self._handler.flush()
+
+        error = self._sent_events[0]['error']
+        self.assertEqual(error['type'], 'ValueError')
+        self.assertEqual(error['message'], 'broken')
+        self.assertIn('Traceback', error['stack_trace'])
+
+    def test_exc_info_without_exception(self):
+        self._logger.error('Failed', exc_info=True)
+        self._handler.flush()
+
+        self.assertEqual(len(self._sent_events), 1)
+        self.assertEqual(self._sent_events[0]['message'], 'Failed')
+        self.assertNotIn('error', self._sent_events[0])
+
+    def test_timestamp(self):
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'message', (), None)
+        record.created = 1544749287.123456
+        record.msecs = 123.456
+
+        event = self._handler.format_event(record)
+        record.created += 1
+        next_event = self._handler.format_event(record)
+
+        self.assertEqual(event['@timestamp'], '2018-12-14T01:01:27.123Z')
+        self.assertEqual(next_event['@timestamp'], '2018-12-14T01:01:28.123Z')
+
+    def test_template_is_not_modified(self):
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'message', (), None)
+        template = dict(self._handler._template)
+
+        self._handler.format_event(record)
+
+        self.assertEqual(self._handler._template, template)
+
+    def test_emit_does_not_block_on_slow_server(self):
+        self._client.send.side_effect = lambda batch: time.sleep(0.2)
+        handler = pylogbeat.PyLogBeatHandler(
+            self._client, queue_size=2, max_batch_size=1,
+            overflow_policy=pylogbeat.OVERFLOW_DROP_OLDEST)
+        self._logger.addHandler(handler)
+        try:
+            start = time.monotonic()
+            for _ in range(10):
+                self._logger.info('message')
+            self.assertLess(time.monotonic() - start, 0.2)
+            self.assertGreater(handler.dropped_events, 0)
+        finally:
+            self._logger.removeHandler(handler)
+            handler.close()
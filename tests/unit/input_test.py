@@ -17,7 +17,6 @@ class InputTest(BaseTestCase):
     # ----------------------------------------------------------------------
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._mock_ack_state = 'version'
         self._mock_ack_value = 3
 
     def _factor_client(self):
@@ -42,9 +41,9 @@ class InputTest(BaseTestCase):
             # calculate ACK
             value_len = len(valid_value)
             ack = f'\x00\x00\x00{chr(value_len)}'
-            # mock socket.recv(): version(2), frame type(A), ACK(1)
+            # mock socket.recv_into(): version(2), frame type(A), ACK(1)
             window_size_packed = [b'2', b'A', ack.encode('ascii')]
-            client._socket.recv.side_effect = window_size_packed
+            self._mock_recv_into(client._socket, window_size_packed)
             client.send(valid_value)
             client._socket.connect.assert_called_once_with((SOCKET_HOST, SOCKET_PORT))
 
@@ -106,3 +105,72 @@ class InputTest(BaseTestCase):
 
     def test_invalid_some_object_exception(self):
         self._test_invalid_input(TypeError())
+
+
+class ElementInputTest(BaseTestCase):
+
+    def _factor_client(self, **kwargs):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST,
+            port=SOCKET_PORT,
+            timeout=SOCKET_TIMEOUT,
+            use_logging=False,
+            **kwargs)
+
+    def test_invalid_element_index(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client()
+            client.connect()
+
+        elements = [MESSAGE] * 5 + [None]
+        with self.assertRaisesRegex(TypeError, r'^Element 5 has type "<class \'NoneType\'>"'):
+            client.send(elements)
+
+    def test_invalid_element_index_in_later_window(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(
+                window_size_min=2, window_size_max=2, max_windows_in_flight=4)
+            client.connect()
+
+            with self.assertRaisesRegex(TypeError, r'^Element 3 has type'):
+                client.send([MESSAGE, MESSAGE, MESSAGE, 42, MESSAGE])
+
+            # the first window has been sent, the invalid one is dropped completely
+            self.assertEqual(client._socket.sendall.call_count, 1)
+            self.assertEqual(client._sequence, 2)
+            self.assertEqual(len(client._frame_encoder), 0)
+
+    def test_unserializable_element_index(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client()
+            client.connect()
+
+        with self.assertRaisesRegex(TypeError, r'^Element 1 cannot be serialized'):
+            client.send([MESSAGE, {'foo': object()}])
+
+    def test_element_subclasses(self):
+        class CustomDict(dict):
+            pass
+
+        class CustomString(str):
+            pass
+
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client()
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2A\x00\x00\x00\x02'])
+
+            client.send([CustomDict(MESSAGE), CustomString(MESSAGE_JSON)])
+
+            self.assertEqual(client.acked_events, 2)
+
+    def test_validate_disabled(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(validate=False)
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2A\x00\x00\x00\x01'])
+
+            client.send((MESSAGE,))
+
+            self.assertEqual(client.metrics.snapshot()['validate']['count'], 0)
+            self.assertEqual(client.acked_events, 1)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT, SOCKET_TIMEOUT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+class MetricsTest(BaseTestCase):
+
+    def test_counters(self):
+        metrics = pylogbeat.Metrics()
+
+        metrics.increment('events_sent', 3)
+        metrics.increment('events_sent')
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['events_sent'], 4)
+        self.assertEqual(snapshot['reconnects'], 0)
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = pylogbeat.Metrics(buckets=(0.1, 1.0))
+
+        for value in (0.05, 0.1, 0.5, 2.0):
+            metrics.observe('ack_rtt', value)
+
+        histogram = metrics.snapshot()['ack_rtt']
+        self.assertEqual(histogram['count'], 4)
+        self.assertAlmostEqual(histogram['sum'], 2.65)
+        self.assertEqual(histogram['max'], 2.0)
+        self.assertEqual(histogram['buckets'], {0.1: 2, 1.0: 3, float('inf'): 4})
+
+    def test_unknown_metric(self):
+        metrics = pylogbeat.Metrics()
+
+        with self.assertRaises(KeyError):
+            metrics.increment('unknown')
+
+    def test_hooks(self):
+        metrics = pylogbeat.Metrics()
+        hook = mock.Mock()
+        metrics.add_hook(hook)
+
+        metrics.increment('windows_sent')
+        metrics.observe('write', 0.5)
+        metrics.remove_hook(hook)
+        metrics.increment('windows_sent')
+
+        self.assertEqual(
+            hook.call_args_list, [mock.call('windows_sent', 1), mock.call('write', 0.5)])
+
+
+class ClientMetricsTest(BaseTestCase):
+
+    def _factor_client(self, **kwargs):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST,
+            port=SOCKET_PORT,
+            timeout=SOCKET_TIMEOUT,
+            use_logging=False,
+            **kwargs)
+
+    def test_send(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client()
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2A' + pack('>I', 3)])
+
+            client.send([MESSAGE, MESSAGE, MESSAGE])
+
+            snapshot = client.metrics.snapshot()
+            window = client._socket.sendall.call_args[0][0]
+            self.assertEqual(snapshot['events_sent'], 3)
+            self.assertEqual(snapshot['windows_sent'], 1)
+            self.assertEqual(snapshot['events_acked'], 3)
+            self.assertEqual(snapshot['sent_bytes'], len(window))
+            self.assertEqual(snapshot['raw_bytes'], client._frame_encoder.encoded_bytes)
+            self.assertGreater(snapshot['raw_bytes'], 0)
+            for name in ('validate', 'encode', 'compress', 'write', 'ack_rtt', 'ack_wait'):
+                self.assertEqual(snapshot[name]['count'], 1, name)
+
+    def test_ack_failure(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client()
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2X' + pack('>I', 1)])
+
+            with self.assertRaises(pylogbeat.ConnectionException):
+                client.send([MESSAGE])
+
+            self.assertEqual(client.metrics.snapshot()['ack_failures'], 1)
+
+    def test_reconnects(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client()
+            client.connect()
+            client.close()
+            client.connect()
+
+            self.assertEqual(client.metrics.snapshot()['reconnects'], 1)
+
+    def test_shared_metrics(self):
+        metrics = pylogbeat.Metrics()
+        with mock.patch('pylogbeat.socket.socket'):
+            for _ in range(2):
+                client = self._factor_client(metrics=metrics, max_windows_in_flight=2)
+                client.connect()
+                client.send([MESSAGE])
+
+            self.assertEqual(metrics.snapshot()['events_sent'], 2)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.base import BaseTestCase
+from tests.benchmark.server import LumberjackServer
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+class MultiClientTest(BaseTestCase):
+
+    def _factor_client(self, server, connections=3, **kwargs):
+        return pylogbeat.PyLogBeatMultiClient(
+            server.host, server.port, connections=connections, timeout=pylogbeat.TIMEOUT,
+            window_size_min=10, window_size_max=10, **kwargs)
+
+    def test_windows_are_spread_over_connections(self):
+        elements = [{'message': MESSAGE, 'index': index} for index in range(95)]
+        with LumberjackServer() as server:
+            with self._factor_client(server) as client:
+                client.send(elements)
+                client.wait_for_acks()
+
+                self.assertEqual(client.acked_events, 95)
+                self.assertEqual(client.windows_in_flight, 0)
+                # each connection numbers its own events
+                sequences = [connection._sequence for connection in client._clients]
+                self.assertTrue(all(sequences), sequences)
+                self.assertEqual(sum(sequences), 95)
+
+            self.assertEqual(server.received_events, 95)
+            self.assertEqual(server.errors, [])
+
+    def test_send_waits_for_acks_without_pipelining(self):
+        with LumberjackServer() as server:
+            with self._factor_client(server) as client:
+                client.send([MESSAGE] * 40)
+
+                self.assertEqual(client.windows_in_flight, 0)
+                self.assertEqual(client.acked_events, 40)
+
+    def test_pipelined_connections(self):
+        with LumberjackServer() as server:
+            with self._factor_client(server, connections=2, max_windows_in_flight=2) as client:
+                for _ in range(5):
+                    client.send([MESSAGE] * 25)
+
+            self.assertEqual(server.received_events, 125)
+            self.assertEqual(client.acked_events, 125)
+
+    def test_idle_connection_is_preferred(self):
+        with LumberjackServer() as server:
+            client = self._factor_client(server, connections=2)
+            client.connect()
+            busy_client, idle_client = client._clients
+            busy_client._windows_in_flight.append(pylogbeat._Window(1, 1))
+            try:
+                self.assertIs(client._wait_for_idle_client(), idle_client)
+                self.assertIs(client._wait_for_idle_client(), idle_client)
+            finally:
+                busy_client._windows_in_flight.clear()
+                client.close()
+
+    def test_invalid_element_index(self):
+        with LumberjackServer() as server:
+            with self._factor_client(server, validate=False) as client:
+                with self.assertRaisesRegex(TypeError, r'^Element 12 has type'):
+                    client.send([MESSAGE] * 12 + [None])
+
+    def test_invalid_connections(self):
+        with self.assertRaises(ValueError):
+            pylogbeat.PyLogBeatMultiClient('localhost', 5044, connections=0)
+
+    def test_executor_is_not_supported(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with self.assertRaises(ValueError):
+                pylogbeat.PyLogBeatMultiClient('localhost', 5044, executor=executor)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT, SOCKET_TIMEOUT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+class PipelineTest(BaseTestCase):
+
+    def _factor_client(self, max_windows_in_flight):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST,
+            port=SOCKET_PORT,
+            timeout=SOCKET_TIMEOUT,
+            use_logging=False,
+            max_windows_in_flight=max_windows_in_flight)
+
+    def _factor_ack_responses(self, *acks):
+        return [b'2A' + pack('>I', ack) for ack in acks]
+
+    def test_send_returns_without_ack_while_window_slot_free(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(max_windows_in_flight=3)
+            client.connect()
+
+            client.send([MESSAGE, MESSAGE])
+            client.send([MESSAGE])
+
+            client._socket.recv_into.assert_not_called()
+            self.assertEqual(client.windows_in_flight, 2)
+
+    def test_send_waits_when_window_limit_reached(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(max_windows_in_flight=2)
+            client.connect()
+            self._mock_recv_into(client._socket, self._factor_ack_responses(2))
+
+            client.send([MESSAGE, MESSAGE])
+            client.send([MESSAGE])
+
+            # the first window has been acknowledged, the second one is still outstanding
+            self.assertEqual(client.windows_in_flight, 1)
+
+    def test_ack_of_later_window_releases_preceding_windows(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(max_windows_in_flight=4)
+            client.connect()
+            self._mock_recv_into(client._socket, self._factor_ack_responses(5))
+
+            client.send([MESSAGE, MESSAGE])
+            client.send([MESSAGE, MESSAGE])
+            client.send([MESSAGE])
+            client.wait_for_acks()
+
+            self.assertEqual(client.windows_in_flight, 0)
+
+    def test_partial_ack(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(max_windows_in_flight=4)
+            client.connect()
+            # first a partial ACK for the second window, then the final ACK
+            self._mock_recv_into(client._socket, self._factor_ack_responses(3, 4))
+
+            client.send([MESSAGE, MESSAGE])
+            client.send([MESSAGE, MESSAGE])
+            client._read_ack()
+
+            self.assertEqual(client.windows_in_flight, 1)
+            self.assertEqual(client._windows_in_flight[0].acked, 1)
+
+            client.wait_for_acks()
+            self.assertEqual(client.windows_in_flight, 0)
+
+    def test_send_window_does_not_wait_for_ack(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(max_windows_in_flight=1)
+
+            totals = client.send_window([MESSAGE, MESSAGE])
+
+            self.assertEqual(totals.events, 2)
+            self.assertEqual(client.windows_in_flight, 1)
+            self.assertFalse(client.window_slot_available())
+            client._socket.recv_into.assert_not_called()
+
+            self._mock_recv_into(client._socket, self._factor_ack_responses(2))
+            client.receive_acks()
+
+            self.assertTrue(client.window_slot_available())
+            self.assertEqual(client.acked_events, 2)
+
+    def test_ack_not_matching_any_window_is_ignored(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(max_windows_in_flight=2)
+            client.connect()
+            self._mock_recv_into(client._socket, self._factor_ack_responses(7, 1))
+
+            client.send([MESSAGE])
+            client.wait_for_acks()
+
+            self.assertEqual(client._last_ack, 1)
+            self.assertEqual(client.windows_in_flight, 0)
+
+    def test_window_contains_sequence_across_wraparound(self):
+        # sequence numbers wrap from SEQUENCE_MAX to 1
+        window = pylogbeat._Window(last_sequence=1, size=3)
+
+        self.assertTrue(window.contains(pylogbeat.SEQUENCE_MAX - 1))
+        self.assertTrue(window.contains(pylogbeat.SEQUENCE_MAX))
+        self.assertTrue(window.contains(1))
+        self.assertFalse(window.contains(2))
+        self.assertFalse(window.contains(pylogbeat.SEQUENCE_MAX - 2))
+
+    def test_sequence_wraparound_skips_zero(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client(max_windows_in_flight=1)
+            client.connect()
+            client._sequence = pylogbeat.SEQUENCE_MAX - 1
+            self._mock_recv_into(client._socket, self._factor_ack_responses(2))
+
+            client.send([MESSAGE, MESSAGE, MESSAGE])
+
+            self.assertEqual(client._sequence, 2)
+            self.assertEqual(client.acked_events, 3)
+
+    def test_invalid_max_windows_in_flight(self):
+        with self.assertRaises(ValueError):
+            self._factor_client(max_windows_in_flight=0)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from collections import deque
+import time
+
+from tests.base import BaseTestCase, mock
+from tests.benchmark.server import LumberjackServer
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+ENDPOINTS = [('node1', 5044), ('node2', 5044), ('node3', 5044)]
+
+
+class FakeClient:
+    # the ACK of each window arrives `ack_delay` seconds after sending it
+
+    def __init__(self, host, _port, max_windows_in_flight=1, **_kwargs):
+        self.name = host
+        self.window_size = 10
+        self.max_windows_in_flight = max_windows_in_flight
+        self.acked_events = 0
+        self.sent_windows = []
+        self.send_error = None
+        self.ack_error = None
+        self.ack_delay = 0
+        self.partial_ack = None
+        self.close = mock.Mock(side_effect=self._close)
+        self._windows = deque()
+
+    @property
+    def windows_in_flight(self):
+        return len(self._windows)
+
+    @property
+    def unacked_events(self):
+        return sum(size for size, _ in self._windows)
+
+    @property
+    def acked_elements(self):
+        elements = [element for window in self.sent_windows for element in window]
+        return elements[:self.acked_events]
+
+    def connect(self):
+        pass
+
+    def _close(self):
+        self._windows.clear()
+
+    def wait_for_acks(self):
+        self._windows.clear()
+
+    def window_slot_available(self):
+        return len(self._windows) < self.max_windows_in_flight
+
+    def send_window(self, elements, _first_index=0):
+        if self.send_error is not None:
+            raise self.send_error
+        self.sent_windows.append(list(elements))
+        self.add_window_in_flight(len(elements))
+
+    def add_window_in_flight(self, size):
+        self._windows.append([size, time.monotonic() + self.ack_delay])
+
+    def ack_arrived(self):
+        return self._windows[0][1] <= time.monotonic()
+
+    def receive_acks(self):
+        if self.partial_ack is not None:
+            # acknowledge only the leading events of the window, then fail
+            self._windows[0][0] -= self.partial_ack
+            self.acked_events += self.partial_ack
+            raise ConnectionResetError()
+        if self.ack_error is not None:
+            raise self.ack_error
+        self.acked_events += self._windows.popleft()[0]
+
+
+class PoolTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('pylogbeat._select_clients_with_acks', self._select_clients_with_acks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _select_clients_with_acks(clients, _timeout):
+        # like the selector, wait until the ACK of any of the clients arrived
+        while not (ready := [client for client in clients if client.ack_arrived()]):
+            time.sleep(0.001)
+        return ready
+
+    def _factor_pool(self, **kwargs):
+        with mock.patch('pylogbeat.PyLogBeatClient', FakeClient):
+            return pylogbeat.PyLogBeatPoolClient(ENDPOINTS, **kwargs)
+
+    def _clients(self, pool):
+        return [node.client for node in pool._nodes]
+
+    def _assert_all_acknowledged(self, pool, elements):
+        acked_elements = [
+            element for client in self._clients(pool) for element in client.acked_elements]
+        self.assertCountEqual(acked_elements, elements)
+
+    def test_round_robin(self):
+        pool = self._factor_pool()
+        for _ in range(6):
+            pool.send([MESSAGE])
+
+        for client in self._clients(pool):
+            self.assertEqual(len(client.sent_windows), 2)
+
+    def test_windows_of_one_send_are_spread(self):
+        pool = self._factor_pool()
+        elements = list(range(100))
+
+        pool.send(elements)
+
+        window_counts = [len(client.sent_windows) for client in self._clients(pool)]
+        self.assertEqual(window_counts, [4, 3, 3])
+        self._assert_all_acknowledged(pool, elements)
+        self.assertEqual(sum(client.windows_in_flight for client in self._clients(pool)), 0)
+
+    def test_least_pending(self):
+        pool = self._factor_pool(
+            strategy=pylogbeat.POOL_STRATEGY_LEAST_PENDING, max_windows_in_flight=4)
+        client1, client2, client3 = self._clients(pool)
+        # windows of other senders sharing the connections
+        for client, windows in ((client1, 3), (client3, 2)):
+            for _ in range(windows):
+                client.add_window_in_flight(1)
+
+        pool.send(list(range(20)))
+
+        self.assertEqual(len(client1.sent_windows), 0)
+        self.assertEqual(len(client2.sent_windows), 2)
+        self.assertEqual(len(client3.sent_windows), 0)
+
+    def test_failed_node_is_taken_out_of_rotation(self):
+        pool = self._factor_pool(failure_backoff=30)
+        client1, client2, client3 = self._clients(pool)
+        client1.send_error = ConnectionRefusedError()
+
+        for _ in range(4):
+            pool.send([MESSAGE])
+
+        # the window which failed on the first node has been sent to the next one
+        client1.close.assert_called_once_with()
+        self.assertEqual(len(client2.sent_windows) + len(client3.sent_windows), 4)
+        self.assertEqual(pool.available_endpoints, ENDPOINTS[1:])
+
+    def test_failed_node_acknowledged_part_of_the_events(self):
+        pool = self._factor_pool()
+        client1, client2, client3 = self._clients(pool)
+        client1.partial_ack = 3
+        elements = list(range(30))
+
+        pool.send(elements)
+
+        self.assertEqual(client1.acked_elements, [0, 1, 2])
+        # only the events not acknowledged by the failed node are sent again
+        resent_window = [3, 4, 5, 6, 7, 8, 9]
+        self.assertIn(resent_window, client2.sent_windows + client3.sent_windows)
+        self._assert_all_acknowledged(pool, elements)
+
+    def test_failover_with_set(self):
+        pool = self._factor_pool()
+        client1 = self._clients(pool)[0]
+        client1.ack_error = pylogbeat.ConnectionException('no ACK')
+        elements = {f'message {index}' for index in range(25)}
+
+        pool.send(elements)
+
+        self._assert_all_acknowledged(pool, elements)
+
+    def test_node_back_in_rotation_after_backoff(self):
+        pool = self._factor_pool(failure_backoff=30)
+        client1 = self._clients(pool)[0]
+        client1.send_error = pylogbeat.ConnectionException('no ACK')
+
+        with mock.patch('pylogbeat.time.monotonic', return_value=1000):
+            pool.send([MESSAGE])
+        with mock.patch('pylogbeat.time.monotonic', return_value=1031):
+            self.assertEqual(pool.available_endpoints, ENDPOINTS)
+
+    def test_slow_node_is_taken_out_of_rotation(self):
+        pool = self._factor_pool(slow_threshold=0.05)
+        client1 = self._clients(pool)[0]
+        client1.ack_delay = 0.1
+
+        pool.send(list(range(30)))
+
+        self.assertEqual(pool.available_endpoints, ENDPOINTS[1:])
+        self.assertEqual(len(client1.sent_windows), 1)
+
+    def test_all_nodes_failed(self):
+        pool = self._factor_pool()
+        for client in self._clients(pool):
+            client.send_error = OSError('unreachable')
+
+        with self.assertRaisesRegex(pylogbeat.ConnectionException, 'unreachable'):
+            pool.send([MESSAGE])
+        self.assertEqual(pool.available_endpoints, [])
+
+    def test_invalid_sequence(self):
+        pool = self._factor_pool()
+
+        with self.assertRaises(TypeError):
+            pool.send(MESSAGE)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            pylogbeat.PyLogBeatPoolClient([])
+        with self.assertRaises(ValueError):
+            pylogbeat.PyLogBeatPoolClient(ENDPOINTS, strategy='random')
+
+
+class PoolServerTest(BaseTestCase):
+
+    def test_windows_are_spread_over_servers(self):
+        with LumberjackServer() as server1, LumberjackServer() as server2:
+            endpoints = [(server1.host, server1.port), (server2.host, server2.port)]
+            with pylogbeat.PyLogBeatPoolClient(
+                    endpoints, timeout=pylogbeat.TIMEOUT, window_size_min=10,
+                    window_size_max=10) as pool:
+                pool.send([MESSAGE] * 100)
+
+        self.assertEqual(server1.received_events, 50)
+        self.assertEqual(server2.received_events, 50)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import SOCKET_HOST, SOCKET_PORT, SOCKET_TIMEOUT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+def decode_windows(calls):
+    decoder = pylogbeat.FrameDecoder()
+    for call in calls:
+        decoder.feed(bytes(call[0][0]))
+    return list(decoder.decode())
+
+
+class RetryPolicyTest(BaseTestCase):
+
+    def test_delay(self):
+        policy = pylogbeat.RetryPolicy(backoff=0.1, max_backoff=0.3, jitter=False)
+
+        self.assertEqual([policy.delay(attempt) for attempt in range(4)], [0.1, 0.2, 0.3, 0.3])
+
+    def test_delay_with_jitter(self):
+        policy = pylogbeat.RetryPolicy(backoff=1.0)
+
+        for attempt in range(5):
+            self.assertLessEqual(0, policy.delay(attempt))
+            self.assertLessEqual(policy.delay(attempt), 2 ** attempt)
+
+    def test_give_up(self):
+        policy = pylogbeat.RetryPolicy(max_attempts=2, deadline=1.0)
+
+        self.assertFalse(policy.give_up(1, 0.5, 0.4))
+        self.assertTrue(policy.give_up(1, 0.5, 0.6))
+        self.assertTrue(policy.give_up(2, 0, 0))
+
+    def test_invalid_max_attempts(self):
+        with self.assertRaises(ValueError):
+            pylogbeat.RetryPolicy(max_attempts=0)
+
+
+class RetryTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._elements = [{'index': index} for index in range(3)]
+
+    def _factor_client(self, **kwargs):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST,
+            port=SOCKET_PORT,
+            timeout=SOCKET_TIMEOUT,
+            use_logging=False,
+            retry_policy=pylogbeat.RetryPolicy(max_attempts=2, jitter=False),
+            **kwargs)
+
+    def _factor_ack_responses(self, *acks):
+        return [ack if isinstance(ack, bytes) else b'2A' + pack('>I', ack) for ack in acks]
+
+    def test_resend_not_acknowledged_events(self):
+        with mock.patch('pylogbeat.socket.socket'), mock.patch('pylogbeat.time.sleep') as sleep:
+            client = self._factor_client()
+            client.connect()
+            # partial ACK, then the connection is closed
+            self._mock_recv_into(client._socket, self._factor_ack_responses(1, b'', 3))
+
+            client.send(self._elements)
+
+            sleep.assert_called_once_with(0.1)
+            calls = client._socket.sendall.call_args_list
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(
+                decode_windows(calls[1:]), [(2, self._elements[1]), (3, self._elements[2])])
+            self.assertEqual(client.acked_events, 3)
+            self.assertEqual(client.windows_in_flight, 0)
+            snapshot = client.metrics.snapshot()
+            self.assertEqual(snapshot['events_resent'], 2)
+            self.assertEqual(snapshot['reconnects'], 1)
+            self.assertEqual(snapshot['ack_failures'], 1)
+
+    def test_resend_after_failed_write(self):
+        with mock.patch('pylogbeat.socket.socket'), mock.patch('pylogbeat.time.sleep'):
+            client = self._factor_client()
+            client.connect()
+            client._socket.sendall.side_effect = [ConnectionResetError(), None]
+            self._mock_recv_into(client._socket, self._factor_ack_responses(3))
+
+            client.send(self._elements)
+
+            calls = client._socket.sendall.call_args_list
+            self.assertEqual(decode_windows(calls[1:]), list(enumerate(self._elements, 1)))
+            self.assertEqual(client.acked_events, 3)
+
+    def test_resend_pipelined_windows(self):
+        with mock.patch('pylogbeat.socket.socket'), mock.patch('pylogbeat.time.sleep'):
+            client = self._factor_client(max_windows_in_flight=3)
+            client.connect()
+            self._mock_recv_into(client._socket, self._factor_ack_responses(2, b'', 4))
+
+            client.send(self._elements[:2])
+            client.send(self._elements[2:] + [{'index': 3}])
+            client.wait_for_acks()
+
+            # the first window was acknowledged before the connection failed
+            calls = client._socket.sendall.call_args_list
+            self.assertEqual(
+                decode_windows(calls[2:]), [(3, self._elements[2]), (4, {'index': 3})])
+            self.assertEqual(client.acked_events, 4)
+
+    def test_give_up(self):
+        with mock.patch('pylogbeat.socket.socket') as socket_mock, \
+                mock.patch('pylogbeat.time.sleep') as sleep:
+            client = self._factor_client()
+            client.connect()
+            socket_mock.return_value.connect.side_effect = ConnectionRefusedError()
+            self._mock_recv_into(client._socket, [])
+
+            with self.assertRaises(ConnectionRefusedError):
+                client.send(self._elements)
+
+            self.assertEqual(sleep.call_count, 2)
+            self.assertEqual(client.windows_in_flight, 0)
+
+    def test_first_connect_is_retried(self):
+        with mock.patch('pylogbeat.socket.socket') as socket_mock, \
+                mock.patch('pylogbeat.time.sleep') as sleep:
+            socket_mock.return_value.connect.side_effect = [ConnectionRefusedError(), None]
+            self._mock_recv_into(socket_mock.return_value, self._factor_ack_responses(3))
+            client = self._factor_client()
+
+            client.send(self._elements)
+
+            sleep.assert_called_once_with(0.1)
+            self.assertEqual(socket_mock.return_value.sendall.call_count, 1)
+            self.assertEqual(client.acked_events, 3)
+
+    def test_resend_across_sequence_wraparound(self):
+        with mock.patch('pylogbeat.socket.socket'), mock.patch('pylogbeat.time.sleep'):
+            client = self._factor_client()
+            client.connect()
+            client._sequence = pylogbeat.SEQUENCE_MAX - 2
+            self._mock_recv_into(
+                client._socket, self._factor_ack_responses(pylogbeat.SEQUENCE_MAX, b'', 1))
+
+            client.send(self._elements)
+
+            calls = client._socket.sendall.call_args_list
+            self.assertEqual(decode_windows(calls[1:]), [(1, self._elements[2])])
+            self.assertEqual(client.acked_events, 3)
+
+    def test_resend_streamed_window(self):
+        with mock.patch('pylogbeat.socket.socket'), mock.patch('pylogbeat.time.sleep'):
+            client = self._factor_client()
+            client.connect()
+            self._mock_recv_into(client._socket, self._factor_ack_responses(2, b'', 3))
+
+            totals = client.send_iter(iter(self._elements), window_bytes=1024)
+
+            calls = client._socket.sendall.call_args_list
+            self.assertEqual(decode_windows(calls[1:]), [(3, self._elements[2])])
+            self.assertEqual(totals.events, 3)
@@ -20,7 +20,6 @@ class SendTest(BaseTestCase):
     # ----------------------------------------------------------------------
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._mock_ack_state = 'version'
         self._mock_ack_value = 3
 
     def test_send_success(self):
@@ -29,9 +28,9 @@ class SendTest(BaseTestCase):
                 client = self._factor_client()
                 client.connect()
 
-                # mock socket.recv(): version(2), frame type(A), ACK(2)
+                # mock socket.recv_into(): version(2), frame type(A), ACK(2) in separate reads
                 window_size_packed = [b'2', b'A', b'\x00\x00\x00\x02']
-                client._socket.recv.side_effect = window_size_packed
+                self._mock_recv_into(client._socket, window_size_packed)
 
                 client.send([MESSAGE, MESSAGE])
 
@@ -39,12 +38,17 @@ class SendTest(BaseTestCase):
                 client._socket.settimeout.assert_called_once_with(SOCKET_TIMEOUT)
                 # window size (replace frame type by 'W')
                 window_size_packed[1] = b'W'
-                client._socket.send.assert_any_call(b''.join(window_size_packed))
+                self._assert_window_size_sent(client, b''.join(window_size_packed))
                 # logger
                 self._mocked_logger.log.assert_any_call(logging.DEBUG, 'Sent window size: 2')
                 self._mocked_logger.log.assert_any_call(logging.DEBUG, 'Received ACK: 2')
                 self._mocked_logger.reset_mock()
 
+    def _assert_window_size_sent(self, client, window_size_packed):
+        # the window size frame is sent together with the payload
+        sent_window = client._socket.sendall.call_args[0][0]
+        self.assertEqual(bytes(sent_window[:6]), window_size_packed)
+
     def _factor_client(self):
         return pylogbeat.PyLogBeatClient(
             host=SOCKET_HOST,
@@ -63,9 +67,9 @@ class SendTest(BaseTestCase):
                 client = self._factor_client()
                 client.connect()
 
-                # mock socket.recv(): version(2), frame type(A), ACK(2)
+                # mock socket.recv_into(): version(2), frame type(X), ACK(2)
                 window_size_packed = [b'2', b'X', b'\x00\x00\x00\x02']
-                client._socket.recv.side_effect = window_size_packed
+                self._mock_recv_into(client._socket, window_size_packed)
 
                 with self.assertRaises(pylogbeat.ConnectionException):
                     client.send([MESSAGE, MESSAGE])
@@ -74,7 +78,7 @@ class SendTest(BaseTestCase):
                 client._socket.settimeout.assert_called_once_with(SOCKET_TIMEOUT)
                 # window size (replace frame type by 'W')
                 window_size_packed[1] = b'W'
-                client._socket.send.assert_any_call(b''.join(window_size_packed))
+                self._assert_window_size_sent(client, b''.join(window_size_packed))
                 # logger
                 self._mocked_logger.log.assert_any_call(logging.DEBUG, 'Sent window size: 2')
                 self._mocked_logger.log.assert_any_call(
@@ -89,9 +93,9 @@ class SendTest(BaseTestCase):
                 client = self._factor_client()
                 client.connect()
 
-                # mock socket.recv(): empty response
+                # mock socket.recv_into(): empty response
                 window_size_packed = [None, None, None]
-                client._socket.recv.side_effect = window_size_packed
+                self._mock_recv_into(client._socket, window_size_packed)
 
                 with self.assertRaises(pylogbeat.ConnectionException):
                     client.send([MESSAGE, MESSAGE])
@@ -99,7 +103,7 @@ class SendTest(BaseTestCase):
                 client._socket.connect.assert_called_once_with((SOCKET_HOST, SOCKET_PORT))
                 client._socket.settimeout.assert_called_once_with(SOCKET_TIMEOUT)
                 window_size_packed = [b'2', b'W', b'\x00\x00\x00\x02']
-                client._socket.send.assert_any_call(b''.join(window_size_packed))
+                self._assert_window_size_sent(client, b''.join(window_size_packed))
                 # logger
                 self._mocked_logger.log.assert_any_call(logging.DEBUG, 'Sent window size: 2')
                 self._mocked_logger.log.assert_any_call(
@@ -115,32 +119,36 @@ class SendTest(BaseTestCase):
                 client.connect()
                 # mock the socket to send multiple ACK responses with some wrong ACK sequences
                 # and finally the correct one to test waiting for the correct ACK sequence
-                client._socket.recv.side_effect = self._simulate_recv_ack_responses
+                self._mock_recv_into(client._socket, self._simulate_ack_responses())
 
                 client.send([MESSAGE, MESSAGE])
 
                 client._socket.connect.assert_called_once_with((SOCKET_HOST, SOCKET_PORT))
                 client._socket.settimeout.assert_called_once_with(SOCKET_TIMEOUT)
-                if hasattr(client._socket.recv, 'assert_called'):
-                    # current pypy3 is 3.5 and so doesn't have assert_called()
-                    client._socket.recv.assert_called()
+                self.assertEqual(client._socket.recv_into.call_count, 7)
                 # window size (replace frame type by 'W')
                 window_size_packed = [b'2', b'W', b'\x00\x00\x00\x02']
-                client._socket.send.assert_any_call(b''.join(window_size_packed))
+                self._assert_window_size_sent(client, b''.join(window_size_packed))
                 # logger
                 self._mocked_logger.log.assert_any_call(logging.DEBUG, 'Sent window size: 2')
                 self._mocked_logger.reset_mock()
 
-    def _simulate_recv_ack_responses(self, read_length):
-        if self._mock_ack_state == 'version' and read_length == 1:
-            self._mock_ack_state = 'frame_type'
-            return b'2'
-        if self._mock_ack_state == 'frame_type' and read_length == 1:
-            self._mock_ack_state = 'ack'
-            return b'A'
-        if self._mock_ack_state == 'ack' and read_length == 4:
-            self._mock_ack_state = 'version'
+    def _simulate_ack_responses(self):
+        # wrong ACK sequences 4 to 9 and finally the correct one
+        while True:
             self._mock_ack_value = 2 if self._mock_ack_value == 9 else self._mock_ack_value + 1
-            return pack('>I', self._mock_ack_value)
+            yield b'2A' + pack('>I', self._mock_ack_value)
+
+    def test_send_multiple_acks_in_one_read(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            client = self._factor_client()
+            client.connect()
+            # keep alive ACK, partial ACK and final ACK received at once
+            responses = [b'2A\x00\x00\x00\x00' b'2A\x00\x00\x00\x01' b'2A\x00\x00\x00\x02']
+            self._mock_recv_into(client._socket, responses)
+
+            client.send([MESSAGE, MESSAGE])
 
-        return b''
+            client._socket.recv_into.assert_called_once()
+            self.assertEqual(client._last_ack, 2)
+            self.assertEqual(client.windows_in_flight, 0)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from datetime import datetime, timezone
+import json
+import unittest
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+TIMESTAMP = datetime(2018, 12, 4, 1, 1, 27)
+
+
+def isoformat_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Type {type(value)} is not serializable')
+
+
+def epoch_default(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    raise TypeError(f'Type {type(value)} is not serializable')
+
+
+class SerializerTest(BaseTestCase):
+
+    def _test_serializer(self, library):
+        serializer = pylogbeat.factor_serializer(isoformat_default, library=library)
+        message = dict(MESSAGE, **{'@timestamp': TIMESTAMP})
+
+        serialized = serializer(message)
+
+        self.assertIsInstance(serialized, bytes)
+        self.assertEqual(json.loads(serialized)['@timestamp'], '2018-12-04T01:01:27')
+        self.assertEqual(json.loads(serialized)['message'], MESSAGE['message'])
+
+    def test_json(self):
+        self._test_serializer(pylogbeat.SERIALIZER_JSON)
+
+    @unittest.skipIf(pylogbeat.orjson is None, 'orjson is not installed')
+    def test_orjson(self):
+        self._test_serializer(pylogbeat.SERIALIZER_ORJSON)
+
+    @unittest.skipIf(pylogbeat.msgspec is None, 'msgspec is not installed')
+    def test_msgspec(self):
+        self._test_serializer(pylogbeat.SERIALIZER_MSGSPEC)
+
+    def _serialize_with_epoch_default(self, library):
+        serializer = pylogbeat.factor_serializer(epoch_default, library=library)
+        timestamp = TIMESTAMP.replace(tzinfo=timezone.utc)
+        return json.loads(serializer({'@timestamp': timestamp}))['@timestamp']
+
+    def test_default_formats_datetime(self):
+        libraries = [pylogbeat.SERIALIZER_JSON]
+        if pylogbeat.orjson is not None:
+            libraries.append(pylogbeat.SERIALIZER_ORJSON)
+
+        for library in libraries:
+            with self.subTest(library=library):
+                self.assertEqual(self._serialize_with_epoch_default(library), 1543885287)
+
+    @unittest.skipIf(pylogbeat.msgspec is None, 'msgspec is not installed')
+    def test_msgspec_serializes_datetime_natively(self):
+        timestamp = self._serialize_with_epoch_default(pylogbeat.SERIALIZER_MSGSPEC)
+
+        self.assertEqual(timestamp, '2018-12-04T01:01:27Z')
+
+    def test_msgspec_is_not_chosen_with_default(self):
+        with mock.patch.object(pylogbeat, 'orjson', new=None):
+            serializer = pylogbeat.factor_serializer(epoch_default)
+
+        # json separates with spaces, msgspec does not
+        self.assertEqual(serializer({'a': 1}), b'{"a": 1}')
+
+    def test_fallback_to_json(self):
+        with mock.patch.object(pylogbeat, 'orjson', new=None):
+            with mock.patch.object(pylogbeat, 'msgspec', new=None):
+                serializer = pylogbeat.factor_serializer()
+
+        self.assertEqual(serializer({'a': 1}), b'{"a": 1}')
+
+    def test_unknown_library(self):
+        with self.assertRaises(ValueError):
+            pylogbeat.factor_serializer(library='pickle')
+
+    def test_client_uses_custom_serializer(self):
+        serializer = mock.Mock(return_value=b'{}')
+        client = pylogbeat.PyLogBeatClient(
+            SOCKET_HOST, SOCKET_PORT, serializer=serializer, compression_enable=False)
+
+        payload = client._factor_window([MESSAGE, '{}'])
+
+        serializer.assert_called_once_with(MESSAGE)
+        self.assertEqual(client.serializer, serializer)
+        self.assertTrue(payload.endswith(b'{}'))
+
+    def test_client_json_default(self):
+        client = pylogbeat.PyLogBeatClient(
+            SOCKET_HOST, SOCKET_PORT, json_default=isoformat_default)
+
+        self.assertIn(b'2018-12-04T01:01:27', client.serializer({'@timestamp': TIMESTAMP}))
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+import asyncio
+import unittest
+
+from tests.base import BaseTestCase
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+def encode_window(elements, first_sequence=1, compression_enable=True):
+    return bytes(pylogbeat.encode_window(
+        elements, first_sequence, pylogbeat.factor_serializer(),
+        compression_enable=compression_enable))
+
+
+class FrameDecoderTest(BaseTestCase):
+
+    def _decode(self, decoder, data):
+        decoder.feed(data)
+        return list(decoder.decode())
+
+    def test_decode_compressed_window(self):
+        decoder = pylogbeat.FrameDecoder()
+
+        events = self._decode(decoder, encode_window([MESSAGE, {'a': 1}]))
+
+        self.assertEqual(events, [(1, MESSAGE), (2, {'a': 1})])
+        self.assertEqual(decoder.window_remaining, 0)
+        self.assertEqual(len(decoder), 0)
+
+    def test_decode_uncompressed_window(self):
+        decoder = pylogbeat.FrameDecoder()
+
+        data = encode_window([MESSAGE, '{"c": 3}'], compression_enable=False)
+
+        events = self._decode(decoder, data)
+
+        self.assertEqual(events, [(1, MESSAGE), (2, {'c': 3})])
+
+    def test_decode_byte_by_byte(self):
+        for compression_enable in (True, False):
+            with self.subTest(compression_enable=compression_enable):
+                decoder = pylogbeat.FrameDecoder()
+                data = encode_window([MESSAGE] * 3, 7, compression_enable)
+                data += encode_window([{'b': 2}], 10, compression_enable)
+
+                events = []
+                for index in range(len(data)):
+                    events.extend(self._decode(decoder, data[index:index + 1]))
+
+                self.assertEqual(events, [(7, MESSAGE), (8, MESSAGE), (9, MESSAGE), (10, {'b': 2})])
+                self.assertEqual(decoder.window_remaining, 0)
+                self.assertEqual(len(decoder), 0)
+
+    def test_window_remaining(self):
+        decoder = pylogbeat.FrameDecoder()
+        data = encode_window([MESSAGE, MESSAGE], compression_enable=False)
+        first_frame_end = 6 + pylogbeat._JSON_FRAME_HEADER.size + len(
+            pylogbeat.factor_serializer()(MESSAGE))
+
+        events = self._decode(decoder, data[:first_frame_end])
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(decoder.window_remaining, 1)
+
+    def test_custom_deserializer(self):
+        decoder = pylogbeat.FrameDecoder(deserializer=bytes)
+
+        events = self._decode(decoder, encode_window(['{"a": 1}']))
+
+        self.assertEqual(events, [(1, b'{"a": 1}')])
+
+    def test_invalid_protocol_version(self):
+        decoder = pylogbeat.FrameDecoder()
+
+        with self.assertRaises(ValueError):
+            self._decode(decoder, b'1W\x00\x00\x00\x01')
+
+    def test_unexpected_frame_type(self):
+        decoder = pylogbeat.FrameDecoder()
+
+        with self.assertRaises(ValueError):
+            self._decode(decoder, b'2A\x00\x00\x00\x01')
+
+    def test_json_frame_outside_of_window(self):
+        decoder = pylogbeat.FrameDecoder()
+
+        with self.assertRaises(ValueError):
+            self._decode(decoder, encode_window([MESSAGE], compression_enable=False)[6:])
+
+
+class ServerTest(BaseTestCase, unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._batches = []
+        self._callback_exception = None
+
+    def _callback(self, events):
+        if self._callback_exception is not None:
+            raise self._callback_exception
+        self._batches.append(events)
+
+    def _factor_server(self, callback=None, **kwargs):
+        return pylogbeat.PyLogBeatServer(
+            '127.0.0.1', 0, callback or self._callback, use_logging=True, **kwargs)
+
+    def _factor_client(self, server, **kwargs):
+        port = server.sockets[0].getsockname()[1]
+        return pylogbeat.AsyncPyLogBeatClient('127.0.0.1', port, timeout=5, **kwargs)
+
+    async def test_receive_windows(self):
+        async with self._factor_server() as server:
+            async with self._factor_client(server) as client:
+                await client.send([MESSAGE, MESSAGE])
+                await client.send([{'a': 1}])
+                self.assertEqual(client.acked_events, 3)
+
+        self.assertEqual(self._batches, [[MESSAGE, MESSAGE], [{'a': 1}]])
+
+    async def test_receive_uncompressed_windows_from_multiple_clients(self):
+        async with self._factor_server() as server:
+            async with self._factor_client(server, compression_enable=False) as client1:
+                async with self._factor_client(server) as client2:
+                    await client1.send([MESSAGE])
+                    await client2.send([MESSAGE])
+
+        self.assertEqual(self._batches, [[MESSAGE], [MESSAGE]])
+
+    async def test_batch_size_sends_partial_acks(self):
+        async with self._factor_server(batch_size=2) as server:
+            async with self._factor_client(server) as client:
+                await client.send([MESSAGE] * 5)
+                self.assertEqual(client.acked_events, 5)
+
+        self.assertEqual([len(batch) for batch in self._batches], [2, 2, 1])
+
+    async def test_coroutine_callback(self):
+        async def callback(events):
+            await asyncio.sleep(0)
+            self._batches.append(events)
+
+        async with self._factor_server(callback=callback) as server:
+            async with self._factor_client(server) as client:
+                await client.send([MESSAGE])
+
+        self.assertEqual(self._batches, [[MESSAGE]])
+
+    async def test_callback_exception_closes_connection(self):
+        self._callback_exception = RuntimeError('storage unavailable')
+
+        with self.assertLogs(pylogbeat.LOGGER, 'ERROR'):
+            async with self._factor_server() as server:
+                client = self._factor_client(server)
+                try:
+                    with self.assertRaises(pylogbeat.ConnectionException):
+                        await client.send([MESSAGE])
+                    self.assertEqual(client.acked_events, 0)
+                finally:
+                    await client.close()
+
+    async def test_close_finishes_open_connections(self):
+        server = self._factor_server()
+        await server.start()
+        client = self._factor_client(server)
+        try:
+            await client.send([MESSAGE])
+
+            await server.close()
+
+            self.assertEqual(asyncio.all_tasks(), {asyncio.current_task()})
+        finally:
+            await client.close()
+        self.assertEqual(self._batches, [[MESSAGE]])
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            self._factor_server(batch_size=0)
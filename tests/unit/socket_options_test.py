@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+import socket
+import unittest
+
+from tests.base import BaseTestCase, mock
+from tests.benchmark.server import LumberjackServer
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+def factor_closed_port():
+    # a port nobody listens on, connections to it are refused
+    with socket.create_server(('127.0.0.1', 0)) as listener:
+        return listener.getsockname()[1]
+
+
+class SocketOptionsTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._server = LumberjackServer()
+        self._server.start()
+
+    def tearDown(self):
+        self._server.close()
+        super().tearDown()
+
+    def _factor_client(self, client_class=pylogbeat.PyLogBeatClient, **kwargs):
+        return client_class(
+            self._server.host, self._server.port, timeout=5,
+            socket_options=pylogbeat.SocketOptions(**kwargs))
+
+    def test_options_are_applied(self):
+        with self._factor_client(
+                send_buffer_size=64 * 1024, keepalive=True, keepalive_idle=30,
+                keepalive_interval=5, keepalive_count=3) as client:
+            client.send([MESSAGE])
+
+            sock = client._socket
+            self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+            self.assertGreaterEqual(
+                sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF), 64 * 1024)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                self.assertEqual(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE), 30)
+            self.assertEqual(sock.gettimeout(), 5)
+
+        self.assertEqual(self._server.received_events, 1)
+
+    def test_next_address_is_tried_if_connection_fails(self):
+        addresses = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', factor_closed_port())),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', (self._server.host, self._server.port)),
+        ]
+        with mock.patch('pylogbeat.socket.getaddrinfo', return_value=addresses):
+            with self._factor_client() as client:
+                client.send([MESSAGE])
+
+                self.assertEqual(client._socket.getpeername()[1], self._server.port)
+
+    def test_all_addresses_fail(self):
+        address = (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', factor_closed_port()))
+        with mock.patch('pylogbeat.socket.getaddrinfo', return_value=[address] * 2):
+            client = self._factor_client()
+
+            with self.assertRaises(ConnectionRefusedError):
+                client.connect()
+
+    def test_idle_connection_is_reopened(self):
+        with self._factor_client(idle_timeout=10) as client:
+            client.send([MESSAGE])
+            client.send([MESSAGE])
+            self.assertEqual(client.metrics.snapshot()['reconnects'], 0)
+
+            client._last_activity -= 11
+            client.send([MESSAGE])
+
+            self.assertEqual(client.metrics.snapshot()['reconnects'], 1)
+        self.assertEqual(self._server.received_events, 3)
+
+    def test_interleave_address_families(self):
+        addresses = [
+            (socket.AF_INET6, 'a'), (socket.AF_INET6, 'b'), (socket.AF_INET, 'c'),
+            (socket.AF_INET6, 'd')]
+
+        interleaved = list(pylogbeat._interleave_address_families(addresses))
+
+        self.assertEqual([address[1] for address in interleaved], ['a', 'c', 'b', 'd'])
+
+
+class AsyncSocketOptionsTest(BaseTestCase, unittest.IsolatedAsyncioTestCase):
+
+    async def test_options_are_applied(self):
+        with LumberjackServer() as server:
+            client = pylogbeat.AsyncPyLogBeatClient(
+                server.host, server.port, timeout=5,
+                socket_options=pylogbeat.SocketOptions(keepalive=True))
+            async with client:
+                await client.send([MESSAGE])
+
+                sock = client._writer.get_extra_info('socket')
+                self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+                self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+
+    async def test_options_are_applied_before_connecting(self):
+        applied_to_connected_socket = []
+        apply = pylogbeat.SocketOptions.apply
+
+        def apply_and_record(options, sock):
+            try:
+                sock.getpeername()
+                applied_to_connected_socket.append(True)
+            except OSError:
+                applied_to_connected_socket.append(False)
+            apply(options, sock)
+
+        with LumberjackServer() as server:
+            client = pylogbeat.AsyncPyLogBeatClient(
+                server.host, server.port, timeout=5,
+                socket_options=pylogbeat.SocketOptions(receive_buffer_size=65536))
+            with mock.patch.object(pylogbeat.SocketOptions, 'apply', apply_and_record):
+                async with client:
+                    await client.send([MESSAGE])
+
+            # buffer sizes only affect the TCP window scaling if set before connecting
+            self.assertEqual(applied_to_connected_socket, [False])
+            self.assertEqual(server.received_events, 1)
@@ -46,6 +46,18 @@ class SocketTest(BaseTestCase):
 
                 ssl_mock.create_default_context.assert_not_called()
 
+    def test_failed_connect_does_not_keep_socket(self):
+        with mock.patch('pylogbeat.socket.socket') as socket_mock:
+            socket_mock.return_value.connect.side_effect = ConnectionRefusedError()
+            client = self._factor_client(ssl_enable=False)
+
+            with self.assertRaises(ConnectionRefusedError):
+                client.send(['{}'])
+
+            self.assertIsNone(client._socket)
+            socket_mock.return_value.close.assert_called_once_with()
+            socket_mock.return_value.shutdown.assert_not_called()
+
     def _factor_client(self, ssl_enable, ssl_verify=True, timeout=None):
         return pylogbeat.PyLogBeatClient(
             host=SOCKET_HOST,
@@ -79,7 +91,8 @@ class SocketTest(BaseTestCase):
                     SSL_CERTFILE, SSL_KEYFILE)
                 default_context_mock.wrap_socket.assert_called_once_with(
                     mocked_socket,
-                    server_side=False)
+                    server_side=False,
+                    session=None)
 
     def test_socket_connect_with_ssl_verify_false(self):
         with mock.patch('pylogbeat.socket.socket') as socket_mock:
@@ -102,7 +115,8 @@ class SocketTest(BaseTestCase):
                     SSL_CERTFILE, SSL_KEYFILE)
                 default_context_mock.wrap_socket.assert_called_once_with(
                     mocked_socket,
-                    server_side=False)
+                    server_side=False,
+                    session=None)
 
     def test_socket_close(self):
         with mock.patch.object(pylogbeat, 'LOGGER', new=self._mocked_logger):
@@ -117,3 +131,23 @@ class SocketTest(BaseTestCase):
                 # close already closed socket
                 client.close()
                 self.assertIsNone(client._socket)
+
+    def test_send_buffer(self):
+        client = self._factor_client(ssl_enable=False)
+        client._socket = mock.MagicMock(spec=socket.socket)
+
+        written_bytes = client._send_buffer(b'window')
+
+        client._socket.sendall.assert_called_once_with(b'window')
+        self.assertEqual(written_bytes, 6)
+
+    def test_send_buffer_ssl_records(self):
+        client = self._factor_client(ssl_enable=True)
+        client._socket = mock.MagicMock(spec=ssl.SSLSocket)
+        window = bytes(40000)
+
+        written_bytes = client._send_buffer(window)
+
+        segment_sizes = [len(call[0][0]) for call in client._socket.sendall.call_args_list]
+        self.assertEqual(segment_sizes, [16384, 16384, 7232])
+        self.assertEqual(written_bytes, 40000)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+import json
+import os
+import tempfile
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+class SpoolTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._directory.cleanup)
+        self._client = mock.MagicMock(spec=pylogbeat.PyLogBeatClient)
+        self._client.serializer = pylogbeat.factor_serializer()
+        self._client.acked_events = 0
+        self._sent_events = []
+        self._connection_down = False
+        self._acked_before_failure = 0
+        self._client.send.side_effect = self._simulate_send
+
+    def _simulate_send(self, elements):
+        if self._connection_down:
+            self._client.acked_events += self._acked_before_failure
+            raise ConnectionRefusedError()
+        self._sent_events.extend(json.loads(bytes(element)) for element in elements)
+        self._client.acked_events += len(elements)
+
+    def _factor_spooled_client(self, **kwargs):
+        spooled_client = pylogbeat.SpooledPyLogBeatClient(
+            self._client, self._directory.name, **kwargs)
+        self.addCleanup(spooled_client.close)
+        return spooled_client
+
+    def _segment_files(self):
+        return sorted(
+            filename for filename in os.listdir(self._directory.name)
+            if filename.endswith('.segment'))
+
+    def test_send(self):
+        spooled_client = self._factor_spooled_client()
+
+        self.assertTrue(spooled_client.send([MESSAGE, json.dumps(MESSAGE)]))
+
+        self.assertEqual(self._sent_events, [MESSAGE, MESSAGE])
+        self.assertEqual(spooled_client.pending_events, 0)
+
+    def test_replay_after_restart(self):
+        self._connection_down = True
+        spooled_client = self._factor_spooled_client()
+        self.assertFalse(spooled_client.send([{'id': 1}, {'id': 2}]))
+        self.assertEqual(spooled_client.pending_events, 2)
+        spooled_client.close()
+
+        self._connection_down = False
+        spooled_client = self._factor_spooled_client()
+        self.assertEqual(spooled_client.pending_events, 2)
+        self.assertTrue(spooled_client.flush())
+
+        self.assertEqual(self._sent_events, [{'id': 1}, {'id': 2}])
+        self.assertEqual(spooled_client.pending_events, 0)
+
+    def test_partially_acknowledged_events_are_not_replayed(self):
+        self._connection_down = True
+        self._acked_before_failure = 2
+        spooled_client = self._factor_spooled_client()
+        spooled_client.send([{'id': 1}, {'id': 2}, {'id': 3}])
+        self.assertEqual(spooled_client.pending_events, 1)
+
+        self._connection_down = False
+        spooled_client.flush()
+
+        self.assertEqual(self._sent_events, [{'id': 3}])
+
+    def test_segment_rotation_and_compaction(self):
+        self._connection_down = True
+        spooled_client = self._factor_spooled_client(segment_size=100)
+        for index in range(5):
+            spooled_client.send([{'id': index, 'padding': 'x' * 80}])
+        self.assertEqual(len(self._segment_files()), 6)
+
+        self._connection_down = False
+        spooled_client.flush()
+
+        self.assertEqual([event['id'] for event in self._sent_events], list(range(5)))
+        # acknowledged segments are removed, only the empty active segment remains
+        self.assertEqual(len(self._segment_files()), 1)
+
+    def test_partially_written_record_is_truncated(self):
+        self._connection_down = True
+        spooled_client = self._factor_spooled_client()
+        spooled_client.send([{'id': 1}])
+        spooled_client.close()
+        segment_path = os.path.join(self._directory.name, self._segment_files()[-1])
+        with open(segment_path, 'ab') as segment_file:
+            segment_file.write(b'\x00\x00\x00\x10{"id"')
+
+        self._connection_down = False
+        spooled_client = self._factor_spooled_client()
+        spooled_client.flush()
+
+        self.assertEqual(self._sent_events, [{'id': 1}])
+
+    def test_max_bytes(self):
+        self._connection_down = True
+        record_size = 4 + len(self._client.serializer({'id': 1}))
+        spooled_client = self._factor_spooled_client(max_bytes=2 * record_size)
+        spooled_client.send([{'id': 1}, {'id': 2}])
+
+        with self.assertRaises(pylogbeat.SpoolFullException):
+            spooled_client.send([{'id': 3}])
+        self.assertEqual(spooled_client.pending_events, 2)
+        self.assertEqual(spooled_client._spool.pending_bytes, 2 * record_size)
+
+        # the pending events are sent to make room
+        self._connection_down = False
+        self.assertTrue(spooled_client.send([{'id': 3}]))
+        self.assertEqual([event['id'] for event in self._sent_events], [1, 2, 3])
+        self.assertEqual(spooled_client._spool.pending_bytes, 0)
+
+    def test_pending_bytes_after_restart(self):
+        self._connection_down = True
+        self._acked_before_failure = 1
+        spooled_client = self._factor_spooled_client()
+        spooled_client.send([{'id': 1}, {'id': 2}])
+        pending_bytes = spooled_client._spool.pending_bytes
+        spooled_client.close()
+
+        spooled_client = self._factor_spooled_client()
+
+        self.assertEqual(pending_bytes, 4 + len(self._client.serializer({'id': 2})))
+        self.assertEqual(spooled_client._spool.pending_bytes, pending_bytes)
+
+    def test_invalid_max_bytes(self):
+        with self.assertRaises(ValueError):
+            pylogbeat.DiskSpool(self._directory.name, max_bytes=0)
+
+    def test_send_invalid_element(self):
+        spooled_client = self._factor_spooled_client()
+
+        with self.assertRaises(TypeError):
+            spooled_client.send([MESSAGE, 1])
+        self.assertEqual(spooled_client.pending_events, 0)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT, SOCKET_TIMEOUT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+class SendIterTest(BaseTestCase):
+
+    def _factor_client(self, **kwargs):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST,
+            port=SOCKET_PORT,
+            timeout=SOCKET_TIMEOUT,
+            use_logging=False,
+            compression_enable=False,
+            **kwargs)
+
+    def _send_iter(self, client, elements, acks, **kwargs):
+        with mock.patch('pylogbeat.socket.socket'):
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2A' + pack('>I', ack) for ack in acks])
+
+            totals = client.send_iter(elements, **kwargs)
+
+            windows = [call[0][0] for call in client._socket.sendall.call_args_list]
+            return totals, windows
+
+    def _window_sizes(self, windows):
+        return [pylogbeat._FRAME_HEADER.unpack_from(window)[2] for window in windows]
+
+    def test_generator_by_window_size(self):
+        client = self._factor_client()
+        elements = (MESSAGE for _ in range(7))
+
+        totals, windows = self._send_iter(client, elements, [3, 6, 7], window_size=3)
+
+        self.assertEqual(self._window_sizes(windows), [3, 3, 1])
+        self.assertEqual(totals, pylogbeat.SendTotals(7, 3, sum(len(window) for window in windows)))
+        self.assertEqual(client.acked_events, 7)
+
+    def test_generator_by_window_bytes(self):
+        client = self._factor_client()
+        frame_size = pylogbeat._JSON_FRAME_HEADER.size + len(pylogbeat.factor_serializer()(MESSAGE))
+        elements = iter([MESSAGE] * 5)
+
+        totals, windows = self._send_iter(
+            client, elements, [2, 4, 5], window_size=100, window_bytes=2 * frame_size)
+
+        self.assertEqual(self._window_sizes(windows), [2, 2, 1])
+        self.assertEqual(totals.events, 5)
+        self.assertEqual(totals.windows, 3)
+
+    def test_generator_is_consumed_lazily(self):
+        client = self._factor_client()
+        consumed = []
+
+        def generate():
+            for index in range(4):
+                consumed.append(index)
+                yield MESSAGE
+
+        with mock.patch('pylogbeat.socket.socket'):
+            client.connect()
+
+            def sendall(_window):
+                sent_windows.append(len(consumed))
+            sent_windows = []
+            client._socket.sendall.side_effect = sendall
+            self._mock_recv_into(client._socket, [b'2A' + pack('>I', ack) for ack in (2, 4)])
+
+            client.send_iter(generate(), window_size=2)
+
+        # each window is sent before the following messages are produced
+        self.assertEqual(sent_windows, [2, 4])
+
+    def test_empty_iterable(self):
+        client = self._factor_client()
+
+        totals, windows = self._send_iter(client, iter([]), [], window_bytes=100)
+
+        self.assertEqual(totals, pylogbeat.SendTotals(0, 0, 0))
+        self.assertEqual(windows, [])
+
+    def test_invalid_element_by_window_bytes(self):
+        client = self._factor_client()
+
+        with self.assertRaisesRegex(TypeError, r'^Element 2 has type'):
+            self._send_iter(client, iter([MESSAGE, MESSAGE, None]), [], window_bytes=10 ** 6)
+
+        self.assertEqual(client._sequence, 0)
+        self.assertEqual(len(client._frame_encoder), 0)
+
+    def test_aborted_stream_discards_incomplete_window(self):
+        client = self._factor_client(max_windows_in_flight=2)
+
+        def generate():
+            yield MESSAGE
+            yield MESSAGE
+            raise RuntimeError('cursor closed')
+
+        with self.assertRaises(RuntimeError):
+            self._send_iter(client, generate(), [], window_size=10, window_bytes=10 ** 6)
+
+        self.assertEqual(client._sequence, 0)
+        self.assertEqual(client._frame_encoder.window_size, 0)
+
+    def test_invalid_arguments(self):
+        client = self._factor_client()
+
+        with self.assertRaises(ValueError):
+            client.send_iter([MESSAGE], window_size=0)
+        with self.assertRaises(ValueError):
+            client.send_iter([MESSAGE], window_bytes=0)
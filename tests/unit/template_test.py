@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+import json
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT, SOCKET_TIMEOUT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+STATIC_FIELDS = ('@version', 'host', 'logsource', 'pid', 'program', 'type')
+
+
+class EventTemplateTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._serializer = pylogbeat.factor_serializer(library=pylogbeat.SERIALIZER_JSON)
+        self._template = pylogbeat.EventTemplate(
+            {name: MESSAGE[name] for name in STATIC_FIELDS}, self._serializer)
+        self._fields = {name: value for name, value in MESSAGE.items() if name not in STATIC_FIELDS}
+
+    def _decode(self, elements, compression_enable=True):
+        encoder = pylogbeat.FrameEncoder(self._serializer, compression_enable=compression_enable)
+        for sequence, element in enumerate(elements, start=1):
+            encoder.add(sequence, element)
+        decoder = pylogbeat.FrameDecoder()
+        decoder.feed(encoder.take())
+        return [event for _, event in decoder.decode()]
+
+    def test_frame_encoder(self):
+        for compression_enable in (True, False):
+            with self.subTest(compression_enable=compression_enable):
+                events = self._decode(
+                    [self._template.event(self._fields), MESSAGE], compression_enable)
+
+                self.assertEqual(events, [MESSAGE, MESSAGE])
+
+    def test_encode(self):
+        encoded = self._template.event(self._fields).encode(self._serializer)
+
+        self.assertEqual(json.loads(encoded), MESSAGE)
+
+    def test_empty_fields(self):
+        event = self._template.event({})
+
+        self.assertEqual(self._decode([event]), [self._template.static_fields])
+        self.assertEqual(bytes(event.encode(self._serializer)), self._template.encoded)
+
+    def test_static_fields_use_serializer_default(self):
+        serializer = pylogbeat.factor_serializer(default=lambda value: 'default')
+
+        template = pylogbeat.EventTemplate({'created': object()}, serializer)
+
+        self.assertEqual(json.loads(template.encoded), {'created': 'default'})
+
+    def test_empty_template(self):
+        template = pylogbeat.EventTemplate({}, self._serializer)
+
+        self.assertEqual(self._decode([template.event(self._fields)]), [self._fields])
+        self.assertEqual(json.loads(template.event(self._fields).encode(self._serializer)),
+                         self._fields)
+
+    def test_invalid_fields(self):
+        with self.assertRaises(TypeError):
+            self._template.event(['message'])
+
+    def test_unserializable_fields(self):
+        client = pylogbeat.PyLogBeatClient(
+            SOCKET_HOST, SOCKET_PORT, timeout=SOCKET_TIMEOUT, serializer=self._serializer)
+        elements = [self._template.event(self._fields), self._template.event({'a': object()})]
+
+        with mock.patch('pylogbeat.socket.socket'):
+            client.connect()
+            with self.assertRaisesRegex(TypeError, r'^Element 1 cannot be serialized'):
+                client.send(elements)
+
+    def test_send(self):
+        client = pylogbeat.PyLogBeatClient(
+            SOCKET_HOST, SOCKET_PORT, timeout=SOCKET_TIMEOUT, serializer=self._serializer,
+            compression_enable=False)
+
+        with mock.patch('pylogbeat.socket.socket'):
+            client.connect()
+            self._mock_recv_into(client._socket, [b'2A' + pack('>I', 2)])
+            client.send([self._template.event(self._fields)] * 2)
+
+            window = bytes(client._socket.sendall.call_args[0][0])
+        decoder = pylogbeat.FrameDecoder()
+        decoder.feed(window)
+        self.assertEqual(list(decoder.decode()), [(1, MESSAGE), (2, MESSAGE)])
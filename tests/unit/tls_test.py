@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+import socket
+import ssl
+import unittest
+
+from tests.base import BaseTestCase, mock
+from tests.benchmark.server import LumberjackServer, SelfSignedCertificate
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+
+
+class SSLContextTest(BaseTestCase):
+
+    def _factor_client(self, **kwargs):
+        return pylogbeat.PyLogBeatClient(
+            host=SOCKET_HOST, port=SOCKET_PORT, ssl_enable=True, use_logging=True, **kwargs)
+
+    def test_context_is_reused_on_reconnect(self):
+        with mock.patch('pylogbeat.socket.socket'):
+            with mock.patch('pylogbeat.ssl') as ssl_mock:
+                ssl_mock.create_default_context.return_value = mock.MagicMock(
+                    spec=ssl.SSLContext)
+                client = self._factor_client()
+                client.connect()
+                client.close()
+                client.connect()
+
+                ssl_mock.create_default_context.assert_called_once()
+                self.assertEqual(client.metrics.snapshot()['handshake']['count'], 2)
+
+    def test_prebuilt_context(self):
+        ssl_context = mock.MagicMock(spec=ssl.SSLContext)
+        with mock.patch('pylogbeat.socket.socket') as socket_mock:
+            with mock.patch('pylogbeat.ssl') as ssl_mock:
+                client = self._factor_client(ssl_context=ssl_context)
+                client.connect()
+
+                ssl_mock.create_default_context.assert_not_called()
+                ssl_context.wrap_socket.assert_called_once_with(
+                    socket_mock.return_value, server_side=False, session=None)
+
+    def test_failed_handshake_closes_plain_socket(self):
+        ssl_context = mock.MagicMock(spec=ssl.SSLContext)
+        ssl_context.wrap_socket.side_effect = ssl.SSLError('wrong version number')
+        plain_socket = mock.MagicMock(spec=socket.socket)
+        with mock.patch('pylogbeat.socket.socket', return_value=plain_socket) as socket_mock:
+            client = self._factor_client(ssl_context=ssl_context)
+
+            with self.assertRaises(ssl.SSLError):
+                client.connect()
+            client.close()
+
+            self.assertIsNone(client._socket)
+            socket_mock.return_value.close.assert_called_once_with()
+
+    def test_failed_handshake_fails_over_in_pool(self):
+        ssl_context = mock.MagicMock(spec=ssl.SSLContext)
+        ssl_context.wrap_socket.side_effect = ssl.SSLError('wrong version number')
+        with mock.patch('pylogbeat.socket.socket', return_value=mock.MagicMock(spec=socket.socket)):
+            pool = pylogbeat.PyLogBeatPoolClient(
+                [('host1', 5044), ('host2', 5044)], ssl_enable=True, ssl_context=ssl_context)
+
+            with self.assertRaisesRegex(pylogbeat.ConnectionException, 'no endpoint available'):
+                pool.send([MESSAGE])
+
+            self.assertEqual(pool.available_endpoints, [])
+
+    def test_failed_handshake_while_reconnecting(self):
+        broken_socket = mock.MagicMock()
+        broken_socket.sendall.side_effect = ConnectionResetError('reset by peer')
+        resumed_socket = mock.MagicMock()
+        self._mock_recv_into(resumed_socket, [b'2A' + pack('>I', 1)])
+        ssl_context = mock.MagicMock(spec=ssl.SSLContext)
+        ssl_context.wrap_socket.side_effect = [
+            broken_socket, ssl.SSLError('handshake failed'), resumed_socket]
+        with mock.patch('pylogbeat.socket.socket', return_value=mock.MagicMock(spec=socket.socket)):
+            with mock.patch('pylogbeat.time.sleep'):
+                client = self._factor_client(
+                    ssl_context=ssl_context,
+                    retry_policy=pylogbeat.RetryPolicy(max_attempts=3, jitter=False))
+
+                client.send([MESSAGE])
+
+        self.assertEqual(client.acked_events, 1)
+        self.assertEqual(ssl_context.wrap_socket.call_count, 3)
+        resumed_socket.sendall.assert_called_once()
+
+    def test_pool_shares_context(self):
+        with mock.patch('pylogbeat.ssl') as ssl_mock:
+            pool = pylogbeat.PyLogBeatPoolClient(
+                [('host1', 5044), ('host2', 5044)], ssl_enable=True, ssl_verify=False)
+
+            ssl_mock.create_default_context.assert_called_once_with(cafile=None)
+            contexts = {id(node.client._factor_ssl_context()) for node in pool._nodes}
+            self.assertEqual(len(contexts), 1)
+
+
+@unittest.skipUnless(SelfSignedCertificate.is_available(), 'openssl is not installed')
+class SessionResumptionTest(BaseTestCase):
+
+    def test_reconnect_resumes_session(self):
+        with SelfSignedCertificate() as certificate:
+            with LumberjackServer(ssl_context=certificate.factor_server_context()) as server:
+                ssl_context = pylogbeat.factor_ssl_context(ssl_verify=False)
+                client = pylogbeat.PyLogBeatClient(
+                    server.host, server.port, timeout=5, ssl_enable=True,
+                    ssl_context=ssl_context)
+                for _ in range(3):
+                    with client:
+                        client.send([MESSAGE])
+
+                snapshot = client.metrics.snapshot()
+                self.assertEqual(server.received_events, 3)
+                self.assertEqual(snapshot['tls_resumptions'], 2)
+                self.assertEqual(snapshot['handshake']['count'], 3)
+                self.assertEqual(snapshot['connect']['count'], 3)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# This software may be modified and distributed under the terms
+# of the Apache License, Version 2.0 license.  See the LICENSE file for details.
+
+from struct import pack
+
+from tests.base import BaseTestCase, mock
+from tests.fixture import MESSAGE, SOCKET_HOST, SOCKET_PORT
+import pylogbeat
+
+
+# pylint: disable=protected-access
+# pylint: disable=no-member
+
+
+class WindowTest(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._sent_window_sizes = []
+
+    def _factor_client(self, **kwargs):
+        client = pylogbeat.PyLogBeatClient(host=SOCKET_HOST, port=SOCKET_PORT, **kwargs)
+        with mock.patch('pylogbeat.socket.socket'):
+            client.connect()
+        self._mock_recv_into(client._socket, self._simulate_ack_responses(client))
+        return client
+
+    def _simulate_ack_responses(self, client):
+        # answer each read with an ACK for the last sent sequence
+        while True:
+            yield b'2A' + pack('>I', client._sequence)
+
+    def _record_window_size(self, client):
+        original_send_window = client._send_window
+
+        def send_window(window):
+            self._sent_window_sizes.append(client._window_size)
+            original_send_window(window)
+        client._send_window = send_window
+
+    def test_send_splits_into_windows_and_grows(self):
+        client = self._factor_client(window_size_max=30)
+        self._record_window_size(client)
+
+        client.send([MESSAGE] * 100)
+
+        self.assertEqual(self._sent_window_sizes, [10, 15, 22, 30, 23])
+        self.assertEqual(client._sequence, 100)
+        self.assertEqual(client.window_size, 30)
+
+    def test_send_set_is_split(self):
+        client = self._factor_client(window_size_max=2)
+        self._record_window_size(client)
+
+        client.send({'{"a": 1}', '{"b": 2}', '{"c": 3}'})
+
+        self.assertEqual(self._sent_window_sizes, [2, 1])
+
+    def test_window_does_not_grow_if_not_used_completely(self):
+        client = self._factor_client()
+
+        client.send([MESSAGE] * 5)
+
+        self.assertEqual(client.window_size, pylogbeat.WINDOW_SIZE_INITIAL)
+
+    def test_slow_ack_shrinks_window(self):
+        client = self._factor_client(window_size_min=3, window_slow_ack_threshold=10)
+
+        with mock.patch('pylogbeat.time.monotonic', side_effect=[0, 11, 20, 31]):
+            client.send([MESSAGE] * 15)
+
+        self.assertEqual(client.window_size, 3)
+
+    def test_partial_ack_shrinks_window(self):
+        window_size = pylogbeat._AdaptiveWindowSize(
+            minimum=1, maximum=100, slow_ack_threshold=10)
+        window = pylogbeat._Window(last_sequence=10, size=10)
+
+        self.assertFalse(window.acknowledge(5))
+        self.assertTrue(window.acknowledge(10))
+        window_size.update(window, ack_duration=0.1)
+
+        self.assertEqual(window_size.current, 5)
+
+    def test_invalid_window_size_bounds(self):
+        with self.assertRaises(ValueError):
+            pylogbeat.PyLogBeatClient(SOCKET_HOST, SOCKET_PORT, window_size_min=0)
+        with self.assertRaises(ValueError):
+            pylogbeat.PyLogBeatClient(
+                SOCKET_HOST, SOCKET_PORT, window_size_min=10, window_size_max=5)